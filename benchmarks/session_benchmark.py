@@ -0,0 +1,77 @@
+"""
+Requests per second against the stand-in back-end, with a new HTTP session
+per request (the transport before `Service` owned a pooled session) and
+with the service's shared keep-alive session.
+
+    python benchmarks/session_benchmark.py --requests 2000 --threads 1 8
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import stand_in_server  # noqa: E402
+
+from labeler_client.helpers import get_request  # noqa: E402
+from labeler_client.service import Service  # noqa: E402
+
+
+def requests_per_second(path, num_requests, num_threads, session):
+    def call(_):
+        response = get_request(path, json={"uuid_list": []}, session=session)
+        if response.status_code != 200:
+            raise Exception(response.text)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        list(executor.map(call, range(num_requests)))
+    return num_requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added by the server"
+    )
+    args = parser.parse_args()
+
+    server = stand_in_server.start(latency=args.latency)
+    service = Service(
+        host="http://127.0.0.1",
+        port=server.server_address[1],
+        project="bench",
+        token="bench",
+        pool_size=max(args.threads),
+    )
+    path = service.get_service_endpoint("get_view_record")
+    rows = []
+    try:
+        for num_threads in args.threads:
+            before = requests_per_second(path, args.requests, num_threads, None)
+            after = requests_per_second(
+                path, args.requests, num_threads, service.session
+            )
+            rows.append((num_threads, before, after))
+    finally:
+        service.close()
+        server.shutdown()
+
+    print(
+        "{:>8} {:>16} {:>16} {:>8}".format("threads", "new session/s", "pooled/s", "x")
+    )
+    for num_threads, before, after in rows:
+        print(
+            "{:>8} {:>16.0f} {:>16.0f} {:>8.1f}".format(
+                num_threads, before, after, after / before
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+In-memory stand-in for the labeler back-end, for client benchmarks.
+
+It implements the few endpoints the benchmarks call, over keep-alive
+HTTP/1.1, so that what is measured is the client and its transport rather
+than a real database. Run it on its own with
+
+    python benchmarks/stand_in_server.py --port 5000 --records 10000
+
+or start it in-process with `start()`.
+"""
+
+import argparse
+import json
+import socket
+import threading
+import time
+import uuid as uuid_lib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+VERSION = "stand-in"
+
+
+class StandInState:
+    """
+    Records, annotations and request log shared by all handler threads.
+    """
+
+    def __init__(self, num_records=0, latency=0.0):
+        self.lock = threading.Lock()
+        self.latency = latency
+        self.calls = []
+        self.annotations = {}
+        self.records = [
+            {
+                "uuid": str(uuid_lib.UUID(int=i + 1)),
+                "record_id": str(i),
+                "record_content": "text {}".format(i),
+            }
+            for i in range(num_records)
+        ]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def __send(self, body, status=200):
+        body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def __handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length)) if length else {}
+        # paths look like /<project>/<route>
+        path = self.path.split("?")[0]
+        route = "/" + "/".join(path.split("/")[2:])
+        state = self.state
+        with state.lock:
+            state.calls.append((self.command, route))
+        if state.latency:
+            time.sleep(state.latency)
+
+        if "url_check" in self.path:
+            return self.__send({"version": VERSION})
+        if route == "/auth/users/authenticate":
+            return self.__send({"username": "bench", "user_id": "bench"})
+        records = {record["uuid"]: record for record in state.records}
+        if route == "/data/search":
+            skip, limit = payload.get("skip", 0), payload.get("limit", 10)
+            found = [record["uuid"] for record in state.records]
+            return self.__send(found[skip : skip + limit])
+        if route == "/view/record":
+            return self.__send(
+                [records[u] for u in payload.get("uuid_list", []) if u in records]
+            )
+        if route == "/annotations" and self.command == "GET":
+            return self.__send(
+                [
+                    {
+                        "uuid": u,
+                        "data": records[u]["record_content"],
+                        "annotation_list": state.annotations.get(u, []),
+                    }
+                    for u in payload.get("uuid_list", [])
+                    if u in records
+                ]
+            )
+        if route == "/annotations/batch":
+            result = []
+            with state.lock:
+                for annotation in payload.get("annotation_list", []):
+                    record_uuid = annotation["record_uuid"]
+                    state.annotations[record_uuid] = [annotation]
+                    result.append(
+                        {"uuid": record_uuid, "annotation_uuid": "a-" + record_uuid}
+                    )
+            return self.__send(result)
+        if route == "/data" and self.command == "POST":
+            column_mapping = payload["column_mapping"]
+            with state.lock:
+                for row in payload.get("df_dict", []):
+                    state.records.append(
+                        {
+                            "uuid": str(uuid_lib.uuid4()),
+                            "record_id": str(row[column_mapping["id"]]),
+                            "record_content": row[column_mapping["content"]],
+                        }
+                    )
+            return self.__send("Imported {}".format(len(payload.get("df_dict", []))))
+        return self.__send({"error": "not found: {}".format(route)}, 404)
+
+    do_GET = do_POST = do_PUT = do_DELETE = __handle
+
+
+def start(host="127.0.0.1", port=0, num_records=0, latency=0.0):
+    """
+    Serve a fresh stand-in back-end from a daemon thread.
+
+    Returns
+    -------
+    server : ThreadingHTTPServer
+        `server.server_address[1]` is the bound port and `server.state` the
+        shared `StandInState`. Stop it with `server.shutdown()`.
+    """
+    state = StandInState(num_records=num_records, latency=latency)
+    handler = type("Handler", (StandInHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--records", type=int, default=0)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added to each response"
+    )
+    args = parser.parse_args()
+    server = start(args.host, args.port, args.records, args.latency)
+    print("Serving on http://{}:{}/<project>".format(*server.server_address))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,101 @@
+"""
+Per-record lookups and label updates on a cached Subset of 10k and 100k
+records: `get_annotation_by_uuid` + `set_annotations` for every record, as
+`Controller.run_job` and `Service.submit_annotations` do, next to the
+linear scans they replaced.
+
+    python benchmarks/subset_index_benchmark.py --sizes 10000 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from labeler_client.subset import Subset  # noqa: E402
+
+
+class OfflineService:
+    """
+    The part of `Service` a cached Subset uses for local label updates.
+    """
+
+    def get_annotator(self):
+        return {"user_id": "bench"}
+
+
+def make_annotation_list(num_records):
+    return [
+        {
+            "uuid": "u{}".format(i),
+            "data": "text {}".format(i),
+            "annotation_list": [{"annotator": "other", "labels_record": []}],
+        }
+        for i in range(num_records)
+    ]
+
+
+def linear_scan(annotation_list, uuid_list, labels):
+    # get_annotation_by_uuid and set_annotations before the uuid index
+    for uuid in uuid_list:
+        next((a for a in annotation_list if a["uuid"] == uuid), None)
+        for datapoint in annotation_list:
+            if datapoint["uuid"] == uuid:
+                for annotation in datapoint["annotation_list"]:
+                    if annotation["annotator"] == "bench":
+                        annotation.update(labels)
+                        break
+                else:
+                    datapoint["annotation_list"].append(
+                        {"annotator": "bench", **labels}
+                    )
+                break
+
+
+def indexed(subset, uuid_list, labels):
+    for uuid in uuid_list:
+        subset.get_annotation_by_uuid(uuid)
+        subset.set_annotations(uuid, labels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument(
+        "--sample",
+        type=int,
+        default=2000,
+        help="records timed for the linear scan, projected to the full subset",
+    )
+    args = parser.parse_args()
+    labels = {"labels_record": [{"label_name": "sentiment", "label_value": ["pos"]}]}
+
+    print("{:>8} {:>14} {:>18}".format("records", "indexed (s)", "linear scan (s)"))
+    for num_records in args.sizes:
+        annotation_list = make_annotation_list(num_records)
+        uuid_list = [datapoint["uuid"] for datapoint in annotation_list]
+        subset = Subset(OfflineService(), uuid_list)
+        subset._Subset__set_my_annotation_list(make_annotation_list(num_records))
+
+        start = time.perf_counter()
+        indexed(subset, uuid_list, labels)
+        indexed_seconds = time.perf_counter() - start
+
+        # a full quadratic pass takes minutes at 100k; time an evenly spread
+        # sample and scale it up
+        sample = uuid_list[:: max(num_records // args.sample, 1)]
+        start = time.perf_counter()
+        linear_scan(annotation_list, sample, labels)
+        linear_seconds = (time.perf_counter() - start) * num_records / len(sample)
+
+        print(
+            "{:>8} {:>14.3f} {:>18.1f}".format(
+                num_records, indexed_seconds, linear_seconds
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
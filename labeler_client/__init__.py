@@ -9,6 +9,7 @@ version = Path(_VERSION_PATH).read_text().strip()
 print("labeler-client: " + version)
 
 from .admin import Admin
+from .async_service import AsyncService
 from .authentication import Authentication
 from .controller import Controller
 from .prompt import PromptTemplate
@@ -1,17 +1,26 @@
 import pydash
 
 from labeler_client.authentication import Authentication
-from labeler_client.constants import DNS_NAME
+from labeler_client.constants import DEFAULT_POOL_SIZE, DNS_NAME
 from labeler_client.helpers import (
     delete_request,
     get_request,
     post_request,
     put_request,
+    requests_retry_session,
 )
 
 
 class Admin:
-    def __init__(self, host=None, project="base", token=None, port=5000, auth=None):
+    def __init__(
+        self,
+        host=None,
+        project="base",
+        token=None,
+        port=5000,
+        auth=None,
+        pool_size=DEFAULT_POOL_SIZE,
+    ):
         if pydash.is_empty(project):
             raise Exception("Project cannot be None or empty.")
         if pydash.is_empty(token) and pydash.is_empty(auth):
@@ -21,10 +30,26 @@ class Admin:
         self.port = port
         self.auth: Authentication = auth
         self.host = host
-        response = get_request(path=self.__get_path() + "?url_check=1", timeout=5)
+        self.pool_size = pool_size
+        self.session = requests_retry_session(pool_size=pool_size)
+        response = get_request(
+            path=self.__get_path() + "?url_check=1", timeout=5, session=self.session
+        )
         if response.status_code != 200:
             raise Exception(response.text)
 
+    def close(self):
+        """
+        Close the shared HTTP session and release pooled connections.
+        """
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def __get_token(self):
         """
         Get token. If authentication object is used to initialize
@@ -66,7 +91,9 @@ class Admin:
         """
         payload = self.get_base_payload()
         payload.update({"active": active})
-        response = get_request(path=f"{self.__get_path()}/invitations", json=payload)
+        response = get_request(
+            path=f"{self.__get_path()}/invitations", json=payload, session=self.session
+        )
         if response.status_code == 200:
             return response.json()
         else:
@@ -83,7 +110,9 @@ class Admin:
         """
         payload = self.get_base_payload()
         response = get_request(
-            path=f"{self.__get_path()}/invitations/{invitation_code}", json=payload
+            path=f"{self.__get_path()}/invitations/{invitation_code}",
+            json=payload,
+            session=self.session,
         )
         if response.status_code == 200:
             return response.json()
@@ -100,7 +129,9 @@ class Admin:
         """
         payload = self.get_base_payload()
         payload.update({"id": id})
-        response = put_request(path=f"{self.__get_path()}/invitations", json=payload)
+        response = put_request(
+            path=f"{self.__get_path()}/invitations", json=payload, session=self.session
+        )
         if response.status_code == 200:
             return response.json()
         else:
@@ -116,7 +147,9 @@ class Admin:
         """
         payload = self.get_base_payload()
         payload.update({"id": id})
-        response = delete_request(path=f"{self.__get_path()}/invitations", json=payload)
+        response = delete_request(
+            path=f"{self.__get_path()}/invitations", json=payload, session=self.session
+        )
         if response.status_code == 200:
             return response.json()
         else:
@@ -139,7 +172,9 @@ class Admin:
         """
         payload = self.get_base_payload()
         payload.update({"code": code, "role_code": role_code, "single_use": single_use})
-        response = post_request(path=f"{self.__get_path()}/invitations", json=payload)
+        response = post_request(
+            path=f"{self.__get_path()}/invitations", json=payload, session=self.session
+        )
         if response.status_code == 200:
             return response.json()
         else:
@@ -0,0 +1,233 @@
+import copy
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from labeler_client.constants import MAX_PAYLOAD_BYTES
+from labeler_client.helpers import bounded_imap, chunk_by_payload_size
+
+
+class AnnotationBuffer:
+    """
+    Write-behind buffer for the annotations of a subset. `set_annotations`
+    updates the subset cache right away and queues the record; a background
+    thread submits queued records once `batch_size` of them are waiting or
+    the oldest has waited `flush_interval` seconds. Repeated changes to a
+    record before it is sent are coalesced into one upload.
+
+    Attributes
+    ----------
+    __service : Service
+        Connected backend service
+    __subset : Subset
+        Subset whose cache the buffered annotations are written to.
+    __pending : dict
+        Queued payload items (`record_uuid`, `labels`) by record uuid.
+    __in_flight : int
+        Number of records taken from the queue and not yet submitted.
+    errors : list
+        `{"uuid": ..., "error": ...}` entries of failed records, kept when no
+        `on_error` callback is given.
+    """
+
+    def __init__(
+        self,
+        service,
+        subset,
+        batch_size=500,
+        flush_interval=5.0,
+        max_pending=5000,
+        max_workers=2,
+        on_error=None,
+    ):
+        """
+        Init function
+
+        Parameters
+        -------
+        service : Service
+            Service-class object identifying the connected
+            backend service and corresponding data storage
+        subset : Subset
+            Subset the annotations belong to.
+        batch_size : int
+            Number of queued records that triggers a flush.
+        flush_interval : float
+            Maximum number of seconds a record waits in the queue.
+        max_pending : int
+            Maximum number of queued and in-flight records. `set_annotations`
+            blocks while the limit is reached.
+        max_workers : int
+            Number of requests in flight during a flush.
+        on_error : callable, optional
+            Called from the flushing thread with the list of
+            `{"uuid": ..., "error": ...}` entries of each failed flush.
+        """
+        if max_pending < batch_size:
+            raise Exception("max_pending cannot be smaller than batch_size.")
+        self.__service = service
+        self.__subset = subset
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_workers = max_workers
+        self.errors = []
+        self.__on_error = on_error if on_error is not None else self.errors.extend
+        self.__pending = {}
+        self.__oldest = None
+        self.__in_flight = 0
+        self.__closed = False
+        self.__condition = threading.Condition()
+        # serializes flushes, so a flush() returning means everything queued
+        # before it has been submitted
+        self.__flush_lock = threading.Lock()
+        # serializes the first load of the subset cache, which is done
+        # outside `__condition` as it sends a request
+        self.__load_lock = threading.Lock()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def set_annotations(self, uuid=None, labels=None):
+        """
+        Set the annotation of a record in the subset (see
+        `Subset.set_annotations`) and queue it for submission. Blocks while
+        `max_pending` records are queued or in flight.
+
+        Returns
+        -------
+        labels : dict
+            Updated labels for uuid annotated by user
+        """
+        with self.__load_lock:
+            in_subset = self.__subset.get_annotation_by_uuid(uuid) is not None
+        with self.__condition:
+            if self.__closed:
+                raise Exception("Annotation buffer is closed.")
+            while (
+                uuid not in self.__pending
+                and len(self.__pending) + self.__in_flight >= self.max_pending
+            ):
+                self.__condition.wait()
+                if self.__closed:
+                    raise Exception("Annotation buffer is closed.")
+            # the subset cache is loaded, so this does not send a request
+            labels = self.__subset.set_annotations(uuid, labels)
+            if not in_subset:
+                # record is not part of the subset; nothing to submit
+                return labels
+            if not self.__pending:
+                self.__oldest = time.monotonic()
+            self.__pending[uuid] = {
+                "record_uuid": uuid,
+                "labels": copy.deepcopy(labels),
+            }
+            # wake the flusher to start the flush_interval timer or to flush
+            if len(self.__pending) == 1 or len(self.__pending) >= self.batch_size:
+                self.__condition.notify_all()
+        return labels
+
+    def pending_count(self):
+        """
+        Number of records queued or in flight.
+        """
+        with self.__condition:
+            return len(self.__pending) + self.__in_flight
+
+    def flush(self):
+        """
+        Submit all queued records and wait until every record queued before
+        the call has been submitted (or reported as failed).
+        """
+        while True:
+            with self.__condition:
+                if not self.__pending:
+                    break
+            self.__flush_once()
+        # wait for a flush started by the background thread
+        with self.__flush_lock:
+            pass
+
+    def close(self):
+        """
+        Flush the queue and stop the background thread.
+        """
+        if self.__closed:
+            return
+        self.flush()
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+        self.__thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while not self.__closed:
+                    if len(self.__pending) >= self.batch_size:
+                        break
+                    timeout = None
+                    if self.__pending:
+                        timeout = self.__oldest + self.flush_interval - time.monotonic()
+                        if timeout <= 0:
+                            break
+                    self.__condition.wait(timeout)
+                if self.__closed:
+                    return
+            self.__flush_once()
+
+    def __flush_once(self):
+        with self.__flush_lock:
+            with self.__condition:
+                items = list(self.__pending.values())
+                self.__pending = {}
+                self.__oldest = None
+                self.__in_flight = len(items)
+            if not items:
+                return
+            submitted = []
+            errors = []
+            try:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    for uuid_list, error in bounded_imap(
+                        executor,
+                        self.__post_chunk,
+                        chunk_by_payload_size(items, max_bytes=MAX_PAYLOAD_BYTES),
+                        self.max_workers,
+                    ):
+                        if error is None:
+                            submitted += uuid_list
+                        else:
+                            errors += [
+                                {"uuid": uuid, "error": error} for uuid in uuid_list
+                            ]
+            finally:
+                with self.__condition:
+                    self.__in_flight = 0
+                    # records changed again while in flight stay dirty
+                    self.__subset.clear_dirty(
+                        [uuid for uuid in submitted if uuid not in self.__pending]
+                    )
+                    self.__condition.notify_all()
+            if errors:
+                try:
+                    self.__on_error(errors)
+                except Exception:
+                    # keep the flushing thread alive for blocked producers
+                    self.errors.extend(errors)
+
+    def __post_chunk(self, chunk):
+        """
+        Post one chunk of payload items. Returns the chunk uuids and None, or
+        the error message if the chunk was rejected.
+        """
+        uuid_list = [item["record_uuid"] for item in chunk]
+        result, submitted = self.__service._post_annotations(chunk, uuid_list)
+        if submitted:
+            return uuid_list, None
+        return uuid_list, result[0]["error"]
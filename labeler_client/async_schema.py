@@ -0,0 +1,54 @@
+from labeler_client.helpers import async_get_request, async_post_request
+
+
+class AsyncSchema:
+    """
+    Asyncio counterpart of `Schema`. Every method is a coroutine and
+    shares the `httpx.AsyncClient` of the owning `AsyncService`.
+
+    Attributes
+    ----------
+    __service : AsyncService
+        AsyncService object for the connected project.
+    """
+
+    def __init__(self, service):
+        self.__service = service
+
+    async def set_schemas(self, schemas=None):
+        """
+        See `Schema.set_schemas`.
+        """
+        payload = self.__service.get_base_payload()
+        payload["schemas"] = schemas
+        path = self.__service.get_service_endpoint("set_schemas")
+        response = await async_post_request(self.__service.client, path, json=payload)
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception(response.text)
+
+    async def value(self, active=None):
+        """
+        See `Schema.value`.
+        """
+        payload = self.__service.get_base_payload()
+        payload["active"] = active
+        path = self.__service.get_service_endpoint("get_schemas")
+        response = await async_get_request(self.__service.client, path, json=payload)
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception(response.text)
+
+    async def get_active_schemas(self):
+        """
+        Get the active schema for the project.
+        """
+        return await self.value(active=True)
+
+    async def get_history(self):
+        """
+        Get the full history of project schema
+        """
+        return await self.value(active=False)
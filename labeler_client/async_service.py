@@ -0,0 +1,545 @@
+import asyncio
+import math
+
+import httpx
+import pandas as pd
+import pydash
+from tqdm import tqdm
+
+from labeler_client.authentication import Authentication
+from labeler_client.async_schema import AsyncSchema
+from labeler_client.async_statistic import AsyncStatistic
+from labeler_client.async_subset import AsyncSubset
+from labeler_client.constants import (DEFAULT_LIST_LIMIT, DNS_NAME,
+                                      HTTPX_LIMITS, REQUEST_TIMEOUT_SECONDS,
+                                      SERVICE_ENDPOINTS)
+from labeler_client.helpers import (async_get_request, async_post_request,
+                                    chunk_by_payload_size,
+                                    filter_import_columns, is_connect_error,
+                                    search_filter, summarize_import)
+
+
+class AsyncService:
+    """
+    Asyncio counterpart of `Service`. All requests go through one shared
+    `httpx.AsyncClient` bounded by `HTTPX_LIMITS`, so calls can be awaited
+    concurrently from a running event loop without blocking it.
+
+    Use as an async context manager, which also checks the connection:
+    ```python
+    async with AsyncService(host=host, project=project, token=token) as service:
+        subset = await service.search(keyword="delicious")
+        records = await subset.get_view_record()
+    ```
+
+    `show` stays on `Service`, as the UI is rendered synchronously, and
+    `deprecate_submit_annotations` has no counterpart: `submit_annotations`
+    replaces it.
+    """
+
+    def __init__(
+        self,
+        host=None,
+        project=None,
+        token=None,
+        auth=None,
+        port=5000,
+        limits=HTTPX_LIMITS,
+    ):
+        """
+        Init function. No request is sent until `connect` is awaited.
+
+        Parameters
+        -------
+        host : str, optional
+            Host IP address for the back-end service to connect to.
+            If None, connects to Megagon-hosted service.
+        project : str
+            Project name. The name needs to be unique within the host
+            domain.
+        token : str
+            User's authentication token.
+        auth : Authentication
+            [Megagon-only] Labeler-ui authentication object.
+            Can be skipped if valid token is provided.
+        limits : httpx.Limits, optional
+            Connection limits of the shared client.
+        """
+        if pydash.is_empty(project):
+            raise Exception("Project cannot be None or empty.")
+        if pydash.is_empty(token) and pydash.is_empty(auth):
+            raise Exception("At least 1 authentication method is required.")
+        self.project = project
+        self.token = token
+        self.port = port
+        self.auth: Authentication = auth
+        self.host = host
+        self.user = None
+        self.version = None
+        self.client = httpx.AsyncClient(
+            limits=limits, timeout=REQUEST_TIMEOUT_SECONDS
+        )
+
+    async def connect(self):
+        """
+        Check the connection to the project and fetch the service version.
+        """
+        response = await async_get_request(
+            self.client, path=self.get_service_endpoint() + "?url_check=1", timeout=5
+        )
+        if response.status_code == 200:
+            self.version = pydash.objects.get(response.json(), "version", None)
+        else:
+            raise Exception(response.text)
+        return self
+
+    async def close(self):
+        """
+        Close the shared client and release pooled connections.
+        """
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def get_version(self):
+        return self.version
+
+    def __get_token(self):
+        """
+        Get token. If authentication object is used to initialize
+        the service object, retrieve corresponding user token.
+        """
+        try:
+            if not pydash.is_empty(self.token):
+                return self.token
+            elif not pydash.is_empty(self.auth):
+                return self.auth.get_token()
+        except:
+            pass
+        return None
+
+    def get_service_endpoint(self, key=None):
+        """
+        See `Service.get_service_endpoint`.
+        """
+        dns_name = DNS_NAME
+        if self.host is not None:
+            dns_name = self.host
+        return (
+            f"{dns_name}:{self.port}/" + self.project + SERVICE_ENDPOINTS.get(key, "")
+        )
+
+    def get_base_payload(self):
+        """
+        Get the base payload for any REST request which includes the authentication token.
+        """
+        return {"token": self.__get_token()}
+
+    def get_project_info(self):
+        return {"id": self.get_service_endpoint(), "project_name": self.project}
+
+    def get_schemas(self):
+        """
+        Get the AsyncSchema object for the project.
+        """
+        return AsyncSchema(service=self)
+
+    def get_statistics(self):
+        """
+        Get the AsyncStatistic object for the project.
+        """
+        return AsyncStatistic(service=self)
+
+    async def get_users_by_uids(self, uids: list = []):
+        """
+        See `Service.get_users_by_uids`.
+        """
+        if len(uids) > 0:
+            path = self.get_service_endpoint("get_users_by_uids")
+            payload = self.get_base_payload()
+            payload.update({"uids": uids})
+            response = await async_get_request(self.client, path, json=payload)
+            if response.status_code == 200:
+                return response.json()
+            else:
+                raise Exception(response.text)
+        return {}
+
+    async def get_annotator(self):
+        """
+        See `Service.get_annotator`.
+        """
+        if pydash.is_empty(self.user):
+            token = self.token
+            if self.auth is not None:
+                token = self.auth.get_token()
+            if not pydash.is_empty(token):
+                path = self.get_service_endpoint("get_user")
+                payload = self.get_base_payload()
+                response = await async_post_request(self.client, path, json=payload)
+                if response.status_code == 200:
+                    parsed_result = response.json()
+                else:
+                    raise Exception(response.text)
+            self.user = {
+                "name": parsed_result.get("username"),
+                "user_id": parsed_result.get("user_id"),
+            }
+        return self.user
+
+    async def search(
+        self,
+        limit=DEFAULT_LIST_LIMIT,
+        skip=0,
+        uuid_list=None,
+        keyword=None,
+        regex=None,
+        record_metadata_condition=None,
+        annotator_list=None,
+        label_condition=None,
+        label_metadata_condition=None,
+        verification_condition=None,
+    ):
+        """
+        See `Service.search`.
+
+        Returns
+        -------
+        subset : AsyncSubset
+            Subset meeting the search conditions.
+        """
+        payload = self.get_base_payload()
+        payload.update(
+            search_filter(
+                limit=limit,
+                skip=skip,
+                uuid_list=uuid_list,
+                keyword=keyword,
+                regex=regex,
+                record_metadata_condition=record_metadata_condition,
+                annotator_list=annotator_list,
+                label_condition=label_condition,
+                label_metadata_condition=label_metadata_condition,
+                verification_condition=verification_condition,
+            )
+        )
+        path = self.get_service_endpoint("search")
+        response = await async_get_request(self.client, path, json=payload)
+        if response.status_code == 200:
+            return AsyncSubset(data_uuids=response.json(), service=self)
+        else:
+            raise Exception(response.text)
+
+    async def search_by_job(
+        self,
+        limit=DEFAULT_LIST_LIMIT,
+        skip=0,
+        uuid_list=None,
+        keyword=None,
+        regex=None,
+        record_metadata_condition=None,
+        job_id=None,
+        label_condition=None,
+        label_metadata_condition=None,
+        verification_condition=None,
+    ):
+        ret = await self.search(
+            limit=limit,
+            skip=skip,
+            uuid_list=uuid_list,
+            keyword=keyword,
+            regex=regex,
+            record_metadata_condition=record_metadata_condition,
+            annotator_list=[job_id],
+            label_condition=label_condition,
+            label_metadata_condition=label_metadata_condition,
+            verification_condition=verification_condition,
+        )
+        return AsyncSubset(data_uuids=ret.get_uuid_list(), service=self, job_id=job_id)
+
+    async def submit_annotations(self, subset=None, uuid_list=[]):
+        """
+        See `Service.submit_annotations`.
+        """
+        if pydash.is_empty(subset):
+            raise Exception("Subset can not be None.")
+        payload = self.get_base_payload()
+        annotator_user_id = (await self.get_annotator())["user_id"]
+        annotation_list = []
+
+        for uuid in uuid_list:
+            annotation_data = await subset.get_annotation_by_uuid(uuid)
+            if annotation_data is not None:
+                own = list(
+                    filter(
+                        lambda annotation: annotation["annotator"] == annotator_user_id,
+                        annotation_data["annotation_list"],
+                    )
+                )
+                own_annotation = {
+                    "record_uuid": uuid,
+                    "labels": {} if len(own) == 0 else own[0],
+                }
+                annotation_list.append(own_annotation)
+
+        if annotation_list:
+            payload.update({"annotation_list": annotation_list})
+            path = self.get_service_endpoint("submit_annotations_batch")
+            try:
+                response = await async_post_request(self.client, path, json=payload)
+                if response.status_code == 200:
+                    return response.json()
+                else:
+                    return [{"uuid": uuid, "error": response.text} for uuid in uuid_list]
+            except httpx.TimeoutException:
+                return [
+                    {"uuid": uuid, "error": "408 Request Timeout"} for uuid in uuid_list
+                ]
+            except Exception as e:
+                return [{"uuid": uuid, "error": str(e)} for uuid in uuid_list]
+
+    async def get_reconciliation_data(self, uuid_list=[]):
+        """
+        See `Service.get_reconciliation_data`. Batches are requested
+        concurrently and merged in order.
+        """
+        if pydash.is_empty(uuid_list):
+            return []
+
+        async def get_batch(uuids):
+            payload = self.get_base_payload()
+            payload.update({"uuid_list": uuids})
+            response = await async_get_request(
+                self.client,
+                self.get_service_endpoint("get_reconciliation_data"),
+                json=payload,
+            )
+            if response.status_code == 200:
+                return response.json()
+            else:
+                raise Exception(response.text)
+
+        batches = await asyncio.gather(
+            *[get_batch(uuids) for uuids in chunk_by_payload_size(uuid_list)]
+        )
+        return [item for batch in batches for item in batch]
+
+    async def import_data_url(self, url="", file_type=None, column_mapping={}):
+        """
+        See `Service.import_data_url`.
+        """
+        payload = self.get_base_payload()
+        payload.update(
+            {"url": url, "file_type": file_type, "column_mapping": column_mapping}
+        )
+        path = self.get_service_endpoint("post_data")
+        response = await async_post_request(self.client, path, json=payload)
+        if response.status_code == 200:
+            return response.text
+        else:
+            raise Exception(response.text)
+
+    async def import_data_df(
+        self,
+        df,
+        column_mapping={},
+        chunk_size=1000,
+        max_concurrency=4,
+        max_retries=2,
+        return_summary=False,
+    ):
+        """
+        See `Service.import_data_df`. Up to `max_concurrency` chunks are
+        uploaded at a time.
+        """
+        if not isinstance(df, pd.DataFrame):
+            raise Exception("df needs to be a valid pandas dataframe")
+        df, column_mapping = filter_import_columns(df, column_mapping)
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def upload(start):
+            chunk = df.iloc[start : start + chunk_size]
+            async with semaphore:
+                response_text, error = await self.__import_chunk(
+                    chunk, column_mapping, max_retries
+                )
+            tq.update(len(chunk))
+            return start, len(chunk), response_text, error
+
+        with tqdm(total=len(df), leave=True, desc="Rows imported:") as tq:
+            results = await asyncio.gather(
+                *[upload(start) for start in range(0, len(df), chunk_size)]
+            )
+        return summarize_import(results, return_summary)
+
+    async def __import_chunk(self, chunk, column_mapping, max_retries):
+        """
+        See `Service.__import_chunk`: the chunk is only re-sent when it
+        cannot have been imported. Returns `(response_text, error)`.
+        """
+        payload = self.get_base_payload()
+        payload.update(
+            {
+                "file_type": "DF",
+                "df_dict": chunk.to_dict(orient="records"),
+                "column_mapping": column_mapping,
+            }
+        )
+        path = self.get_service_endpoint("post_data")
+        error = None
+        for _ in range(max_retries + 1):
+            try:
+                response = await async_post_request(self.client, path, json=payload)
+            except Exception as e:
+                error = str(e)
+                if is_connect_error(e):
+                    continue
+                break
+            if response.status_code == 200:
+                return response.text, None
+            error = response.text
+            if response.status_code != 503:
+                break
+        return None, error
+
+    async def export(self):
+        """
+        See `Service.export`.
+        """
+        payload = self.get_base_payload()
+        path = self.get_service_endpoint("export_data")
+        response = await async_get_request(self.client, path, json=payload)
+        if response.status_code == 200:
+            return pd.DataFrame(
+                response.json(),
+                columns=[
+                    "data_id",
+                    "content",
+                    "annotator",
+                    "label_name",
+                    "label_value",
+                ],
+            )
+        else:
+            raise Exception(response.text)
+
+    async def set_verification_data(self, verify_list=[]):
+        """
+        See `Service.set_verification_data`. Items are sent concurrently;
+        results keep the order of `verify_list`, and failed items are
+        reported as `{"uuid": ..., "error": ...}` without failing the others.
+        """
+        items = [
+            {
+                "uuid": each["uuid"],
+                "labels": each["labels"],
+                "label_level": each["labels"][0]["label_level"],
+                "label_name": each["labels"][0]["label_name"],
+                "annotator_id": each["annotator_id"],
+            }
+            for each in verify_list
+        ]
+        return await asyncio.gather(
+            *[self.__post_label_item("set_verification_data", item) for item in items]
+        )
+
+    async def set_reconciliation_data(self, recon_list=[]):
+        """
+        See `Service.set_reconciliation_data`. Items are sent concurrently;
+        results keep the order of `recon_list`, and failed items are
+        reported as `{"uuid": ..., "error": ...}` without failing the others.
+        """
+        items = [
+            {
+                "uuid": each["uuid"],
+                "labels": each["labels"],
+                "annotator": "reconciliation",
+            }
+            for each in recon_list
+        ]
+        return await asyncio.gather(
+            *[
+                self.__post_label_item("set_reconciliation_data", item)
+                for item in items
+            ]
+        )
+
+    async def __post_label_item(self, key, item):
+        """
+        Post one label item to the per-record `key` endpoint. Returns the
+        back-end result, or `{"uuid": ..., "error": ...}` if it failed.
+        """
+        payload = self.get_base_payload()
+        payload.update(item)
+        path = self.get_service_endpoint(key).format(uuid=item["uuid"])
+        try:
+            response = await async_post_request(self.client, path, json=payload)
+        except Exception as e:
+            return {"uuid": item["uuid"], "error": str(e)}
+        if response.status_code == 200:
+            return response.json()
+        else:
+            return {"uuid": item["uuid"], "error": response.text}
+
+    async def __batch_update_metadata(self, meta_name, metadata_list):
+        payload = self.get_base_payload()
+        payload.update(
+            {
+                "record_meta_name": meta_name,
+                "metadata_list": metadata_list,
+            }
+        )
+        path = self.get_service_endpoint("batch_update_metadata")
+        response = await async_post_request(self.client, path, json=payload)
+        if response.status_code == 200:
+            return response.text
+        else:
+            raise Exception(response.text)
+
+    async def set_metadata(self, meta_name, func, batch_size=500):
+        """
+        See `Service.set_metadata`. `func` runs in a worker thread so the
+        event loop is not blocked by metadata computation.
+        """
+        n = (await self.get_statistics().get_label_progress())["total"]
+        set_count = 0
+        batch_number = math.ceil(float(n) / batch_size)
+
+        with tqdm(
+            total=batch_number, leave=True, desc="Metadata batches processed:"
+        ) as tq:
+            for i in range(batch_number):
+                s = await self.search(limit=batch_size, skip=i * batch_size)
+                data_batch = await s.get_view_record()
+                values = await asyncio.to_thread(
+                    lambda: [func(item["record_content"]) for item in data_batch]
+                )
+                for item, value in zip(data_batch, values):
+                    item["value"] = value
+
+                res = await self.__batch_update_metadata(meta_name, data_batch)
+                set_count += int(res)
+                tq.update()
+        return f"Set metadata '{meta_name}' for {set_count} data record{'s' if set_count > 1 else ''}."
+
+    async def get_assignment(self, annotator=None, latest_only=False):
+        """
+        See `Service.get_assignment`.
+        """
+        payload = self.get_base_payload()
+        payload["annotator"] = annotator
+        payload["latest_only"] = latest_only
+        path = self.get_service_endpoint("get_assignment")
+        response = await async_get_request(self.client, path, json=payload)
+
+        unique_assignments = set({})
+        if response.status_code == 200:
+            for res in response.json():
+                unique_assignments.update(res["uuid_list"])
+            return AsyncSubset(data_uuids=list(unique_assignments), service=self)
+        else:
+            raise Exception(response.text)
@@ -0,0 +1,314 @@
+import json
+
+import pydash
+
+from labeler_client.helpers import async_get_request, async_post_request
+
+
+class AsyncSubset:
+    """
+    Asyncio counterpart of `Subset`. Network calls are coroutines sharing the
+    `httpx.AsyncClient` of the owning `AsyncService`. Since `__init__` cannot
+    await, the annotation cache is loaded on first use instead of at
+    construction time.
+
+    Attributes
+    ----------
+    __data_uuids : list
+        List of unique identifiers of data records in the subset.
+    __service : AsyncService
+        Connected backend service
+    __my_annotation_list : list
+        Local cache of the record and annotation view of the subset owned by
+        the annotator. None until first loaded.
+    """
+
+    def __init__(self, service, data_uuids=[], job_id=None):
+        """
+        Init function
+
+        Parameters
+        -------
+        service : AsyncService
+            AsyncService-class object identifying the connected
+            backend service and corresponding data storage
+        data_uuids : list
+            List of data uuid's to be included in the subset
+        """
+        self.__data_uuids = data_uuids
+        self.__service = service
+        self.job_id = job_id
+        self.annotator_id = job_id
+        self.__my_annotation_list = None
+
+    async def get_annotator_id(self):
+        """
+        Get the annotator owning the subset cache, resolving the service
+        owner on first call.
+        """
+        if self.annotator_id is None:
+            self.annotator_id = (await self.__service.get_annotator())["user_id"]
+        return self.annotator_id
+
+    def get_uuid_list(self):
+        """
+        Get list of unique identifiers for all records in the subset.
+
+        Returns
+        -------
+        __data_uuids : list
+            List of data uuids included in Subset
+        """
+        return self.__data_uuids
+
+    async def __get_annotation_list(self, annotator_list: list = None):
+        """
+        See `Subset.__get_annotation_list`.
+        """
+        annotator_id = await self.get_annotator_id()
+        payload = self.__service.get_base_payload()
+        update_cache = (
+            True
+            if len(annotator_list) == 1 and annotator_list[0] == annotator_id
+            else False
+        )
+        payload.update(
+            {"uuid_list": self.__data_uuids, "annotator_list": annotator_list}
+        )
+        path = self.__service.get_service_endpoint("get_annotations")
+        response = await async_get_request(self.__service.client, path, json=payload)
+        if response.status_code == 200:
+            ret = response.json()
+            if update_cache:
+                self.__my_annotation_list = ret
+            return ret
+        else:
+            raise Exception(response.text)
+
+    async def __get_my_annotation_list(self):
+        if self.__my_annotation_list is None:
+            await self.__get_annotation_list(
+                annotator_list=[await self.get_annotator_id()]
+            )
+        return self.__my_annotation_list
+
+    async def value(self, annotator_list: list = None):
+        """
+        See `Subset.value`.
+        """
+        if annotator_list is None:
+            return await self.__get_my_annotation_list()
+        else:
+            return await self.__get_annotation_list(annotator_list=annotator_list)
+
+    async def get_verification_annotations(
+        self,
+        label_name=None,
+        label_level=None,
+        annotator: str = None,
+        verifiers: list = None,
+        verified_status: str = None,
+    ):
+        if pydash.is_empty(label_name):
+            raise Exception("label_name cannot be None or empty.")
+        if pydash.is_empty(label_level):
+            raise Exception("label_level cannot be None or empty.")
+        payload = self.__service.get_base_payload()
+        payload.update(
+            {
+                "uuid_list": self.__data_uuids,
+                "label_name": label_name,
+                "label_level": label_level,
+                "annotator": annotator,
+                "verifier_filter": verifiers,
+                "status_filter": verified_status,
+            }
+        )
+        path = self.__service.get_service_endpoint("get_view_verification")
+        response = await async_get_request(self.__service.client, path, json=payload)
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception(response.text)
+
+    async def get_view_record(
+        self,
+        record_id=None,
+        record_content=None,
+        record_meta_names=None,
+    ):
+        payload = self.__service.get_base_payload()
+        payload.update({"uuid_list": self.__data_uuids})
+        if record_id:
+            payload.update({"record_id": record_id})
+        if record_content:
+            payload.update({"record_content": record_content})
+        if record_meta_names:
+            payload.update({"record_meta_names": record_meta_names})
+        path = self.__service.get_service_endpoint("get_view_record")
+        response = await async_get_request(self.__service.client, path, json=payload)
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception(response.text)
+
+    async def get_view_annotation(
+        self,
+        annotator_list=None,
+        label_names=None,
+        label_meta_names=None,
+    ):
+        payload = self.__service.get_base_payload()
+        payload.update({"uuid_list": self.__data_uuids})
+        if annotator_list is not None:
+            payload.update({"annotator_list": annotator_list})
+        if label_names is not None:
+            payload.update({"label_names": label_names})
+        if label_meta_names is not None:
+            payload.update({"label_meta_names": label_meta_names})
+        path = self.__service.get_service_endpoint("get_view_annotation")
+        response = await async_get_request(self.__service.client, path, json=payload)
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception(response.text)
+
+    async def get_view_verification(
+        self,
+        label_name=None,
+        label_level=None,
+        annotator=None,
+        verifier_filter=None,
+        status_filter=None,
+    ):
+        payload = self.__service.get_base_payload()
+        payload.update({"uuid_list": self.__data_uuids})
+        if label_name is not None:
+            payload.update({"label_name": label_name})
+        if label_level is not None:
+            payload.update({"label_level": label_level})
+        if annotator is not None:
+            payload.update({"annotator": annotator})
+        if verifier_filter is not None:
+            payload.update({"verifier_filter": verifier_filter})
+        if status_filter is not None:
+            payload.update({"status_filter": status_filter})
+
+        path = self.__service.get_service_endpoint("get_view_verification")
+        response = await async_get_request(self.__service.client, path, json=payload)
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception(response.text)
+
+    async def get_annotation_by_uuid(self, uuid):
+        """
+        See `Subset.get_annotation_by_uuid`.
+        """
+        for annotation in await self.__get_my_annotation_list():
+            if annotation["uuid"] == uuid:
+                return annotation
+        return None
+
+    async def set_annotations(self, uuid=None, labels=None):
+        """
+        See `Subset.set_annotations`. Only the local cache is updated; use
+        `AsyncService.submit_annotations` to persist.
+        """
+        if pydash.is_empty(uuid):
+            raise Exception("UUID can not be None.")
+        elif pydash.is_empty(labels):
+            raise Exception(
+                f"Labels can not be None. For clearing annotations, use {{}}."
+            )
+        annotator_user_id = await self.get_annotator_id()
+        my_annotation_list = await self.__get_my_annotation_list()
+        labels["annotator"] = annotator_user_id
+        added = False
+        index = -1
+        for datapoint_idx, datapoint in enumerate(my_annotation_list):
+            if datapoint["uuid"] == uuid:
+                index = datapoint_idx
+                for annotation_idx, annotation in enumerate(
+                    datapoint["annotation_list"]
+                ):
+                    if annotation["annotator"] == annotator_user_id:
+                        added = True
+                        my_annotation_list[datapoint_idx]["annotation_list"][
+                            annotation_idx
+                        ] = labels
+        if not added and index != -1 and index < len(my_annotation_list):
+            my_annotation_list[index]["annotation_list"].append(labels)
+        return labels
+
+    async def get_reconciliation_data(self, uuid_list=None):
+        """
+        See `Subset.get_reconciliation_data`.
+        """
+        if uuid_list is None:
+            uuid_list = self.__data_uuids
+        return await self.__service.get_reconciliation_data(uuid_list=uuid_list)
+
+    async def suggest_similar(self, meta_name, limit=3):
+        """
+        See `Subset.suggest_similar`.
+        """
+        payload = self.__service.get_base_payload()
+        payload.update(
+            {"uuid_list": self.__data_uuids, "meta_name": meta_name, "limit": limit}
+        )
+        path = self.__service.get_service_endpoint("suggest_similar_annotations")
+        response = await async_get_request(self.__service.client, path, json=payload)
+        if response.status_code == 200:
+            suggested_uuids = list(set(json.loads(response.text)))
+            return AsyncSubset(service=self.__service, data_uuids=suggested_uuids)
+        else:
+            raise Exception(response.text)
+
+    async def assign(self, annotator):
+        """
+        See `Subset.assign`.
+        """
+        if pydash.is_empty(annotator):
+            raise Exception("Annotator cannot be None or empty.")
+        payload = self.__service.get_base_payload()
+        payload.update(
+            {
+                "subset_uuid_list": self.__data_uuids,
+                "annotator": annotator,
+            }
+        )
+        path = self.__service.get_service_endpoint("get_assignment")
+        response = await async_post_request(self.__service.client, path, json=payload)
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception(response.text)
+
+    # overlading subset operation with set algebra
+    def __or__(self, other):
+        return AsyncSubset(
+            service=self.__service,
+            data_uuids=list(set(self.get_uuid_list()) | set(other.get_uuid_list())),
+        )
+
+    def union(self, other):
+        return AsyncSubset.__or__(self, other)
+
+    def __and__(self, other):
+        return AsyncSubset(
+            service=self.__service,
+            data_uuids=list(set(self.get_uuid_list()) & set(other.get_uuid_list())),
+        )
+
+    def intersection(self, other):
+        return AsyncSubset.__and__(self, other)
+
+    def __sub__(self, other):
+        return AsyncSubset(
+            service=self.__service,
+            data_uuids=list(set(self.get_uuid_list()) - set(other.get_uuid_list())),
+        )
+
+    def difference(self, other):
+        return AsyncSubset.__sub__(self, other)
@@ -7,16 +7,22 @@ import time
 import webbrowser
 
 import pydash
-import requests
 import websockets
 from websockets import exceptions as ws_exceptions
 
-from labeler_client.constants import DNS_NAME
-from labeler_client.helpers import get_request, post_request
+from labeler_client.constants import DEFAULT_POOL_SIZE, DNS_NAME
+from labeler_client.helpers import get_request, post_request, requests_retry_session
 
 
 class Authentication:
-    def __init__(self, host=None, project="base", token=None, port=5000):
+    def __init__(
+        self,
+        host=None,
+        project="base",
+        token=None,
+        port=5000,
+        pool_size=DEFAULT_POOL_SIZE,
+    ):
         if not pydash.is_empty(host) and pydash.is_empty(project):
             raise Exception("Project cannot be None or empty.")
         self.host = host
@@ -29,7 +35,11 @@ class Authentication:
             self.project = "base"
         if not pydash.is_empty(project):
             self.project = project
-        response = get_request(path=self.__get_path() + "?url_check=1", timeout=5)
+        self.pool_size = pool_size
+        self.session = requests_retry_session(pool_size=pool_size)
+        response = get_request(
+            path=self.__get_path() + "?url_check=1", timeout=5, session=self.session
+        )
         if response.status_code != 200:
             raise Exception(response.text)
         self.__WEB_PORT = 52235
@@ -44,6 +54,7 @@ class Authentication:
                 "username": username,
                 "password": password,
             },
+            session=self.session,
         )
 
     def __start_servers(self):
@@ -98,6 +109,7 @@ class Authentication:
                                     "username": username,
                                     "password": password,
                                 },
+                                session=self.session,
                             )
                             if response.status_code == 200:
                                 response = self.__signin(username, password)
@@ -165,7 +177,9 @@ class Authentication:
             if true, return job tokens only
         """
         payload = {"token": self.token, "job": job}
-        response = get_request(f"{self.__get_path()}/tokens", json=payload)
+        response = get_request(
+            f"{self.__get_path()}/tokens", json=payload, session=self.session
+        )
         if response.status_code == 200:
             return response.json()
         else:
@@ -191,7 +205,7 @@ class Authentication:
             "expiration_duration": expiration_duration,
             "job": job,
         }
-        response = requests.post(f"{self.__get_path()}/tokens", json=payload)
+        response = self.session.post(f"{self.__get_path()}/tokens", json=payload)
         if response.status_code == 200:
             return response.json()
         else:
@@ -207,12 +221,24 @@ class Authentication:
         """
         payload = {"token": self.token}
         payload.update({"ids": ids})
-        response = requests.delete(f"{self.__get_path()}/tokens", json=payload)
+        response = self.session.delete(f"{self.__get_path()}/tokens", json=payload)
         if response.status_code == 200:
             return response.json()
         else:
             raise Exception(response.text)
 
+    def close(self):
+        """
+        Close the shared HTTP session and release pooled connections.
+        """
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def __set_token(self, token):
         if token == "":
             token = None
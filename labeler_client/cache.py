@@ -0,0 +1,253 @@
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from labeler_client.constants import (
+    DISK_CACHE_MAX_BYTES,
+    DISK_CACHE_PATH,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_TTL_SECONDS,
+)
+
+
+class DiskCache:
+    """
+    SQLite-backed store of JSON values keyed by namespace and record uuid,
+    each tagged with the record version it was fetched at. Entries are
+    evicted least recently used first once the stored values exceed
+    `max_bytes`. A new database file is readable by its owner only.
+
+    Attributes
+    ----------
+    path : str
+        Location of the SQLite database file.
+    max_bytes : int
+        Upper bound on the total size of the stored values.
+    """
+
+    def __init__(self, path=None, max_bytes=DISK_CACHE_MAX_BYTES):
+        """
+        Init function
+
+        Parameters
+        -------
+        path : str, optional
+            Location of the SQLite database file, created if missing.
+            Defaults to `~/.cache/labeler_client/cache.sqlite3`.
+        max_bytes : int
+            Upper bound on the total size of the stored values.
+        """
+        self.path = os.path.expanduser(path or DISK_CACHE_PATH)
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        if not os.path.exists(self.path):
+            # cached values hold record content; keep them private to the
+            # user (SQLite gives its journal files the same permissions)
+            os.close(os.open(self.path, os.O_WRONLY | os.O_CREAT, 0o600))
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self.__connection:
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT NOT NULL,"
+                " uuid TEXT NOT NULL,"
+                " version TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " accessed REAL NOT NULL,"
+                " PRIMARY KEY (namespace, uuid))"
+            )
+            self.__connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)"
+            )
+
+    def get_many(self, namespace, uuid_list):
+        """
+        Look up cached values.
+
+        Returns
+        -------
+        entries : dict
+            `(version, value)` by uuid, for the uuids found in the cache.
+        """
+        entries = {}
+        with self.__lock:
+            for start in range(0, len(uuid_list), 500):
+                uuids = uuid_list[start : start + 500]
+                placeholders = ",".join("?" * len(uuids))
+                rows = self.__connection.execute(
+                    "SELECT uuid, version, value FROM entries"
+                    f" WHERE namespace = ? AND uuid IN ({placeholders})",
+                    [namespace, *uuids],
+                )
+                for uuid, version, value in rows:
+                    entries[uuid] = (version, json.loads(value))
+            if entries:
+                now = time.time()
+                with self.__connection:
+                    self.__connection.executemany(
+                        "UPDATE entries SET accessed = ?"
+                        " WHERE namespace = ? AND uuid = ?",
+                        [(now, namespace, uuid) for uuid in entries],
+                    )
+        return entries
+
+    def put_many(self, namespace, items):
+        """
+        Store values, replacing older versions, then evict entries beyond
+        `max_bytes`.
+
+        Parameters
+        -------
+        namespace : str
+            Key prefix, e.g. the project and view the values belong to.
+        items : list
+            `(uuid, version, value)` tuples; values must be JSON-serializable.
+        """
+        now = time.time()
+        rows = []
+        for uuid, version, value in items:
+            encoded = json.dumps(value)
+            rows.append((namespace, uuid, str(version), encoded, len(encoded), now))
+        if not rows:
+            return
+        with self.__lock:
+            with self.__connection:
+                self.__connection.executemany(
+                    "INSERT OR REPLACE INTO entries"
+                    " (namespace, uuid, version, value, size, accessed)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self.__evict()
+
+    def __evict(self):
+        (total,) = self.__connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        victims = []
+        for namespace, uuid, size in self.__connection.execute(
+            "SELECT namespace, uuid, size FROM entries ORDER BY accessed"
+        ):
+            victims.append((namespace, uuid))
+            excess -= size
+            if excess <= 0:
+                break
+        self.__connection.executemany(
+            "DELETE FROM entries WHERE namespace = ? AND uuid = ?", victims
+        )
+
+    def size(self):
+        """
+        Total size in bytes of the stored values.
+        """
+        with self.__lock:
+            (total,) = self.__connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return total
+
+    def clear(self, namespace=None):
+        """
+        Remove all entries, or only those of `namespace`.
+        """
+        with self.__lock:
+            with self.__connection:
+                if namespace is None:
+                    self.__connection.execute("DELETE FROM entries")
+                else:
+                    self.__connection.execute(
+                        "DELETE FROM entries WHERE namespace = ?", [namespace]
+                    )
+
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
+
+
+class ResponseCache:
+    """
+    In-memory LRU cache of read responses with a time-to-live. Values are
+    copied in and out, so callers may modify what they get. `invalidate`
+    drops every entry and also discards responses of requests that were
+    already running when it was called.
+
+    Attributes
+    ----------
+    max_entries : int
+        Maximum number of cached responses.
+    ttl : float
+        Seconds a response stays valid.
+    hits : int
+        Number of lookups served from the cache.
+    misses : int
+        Number of lookups that had to query the back-end.
+    """
+
+    def __init__(
+        self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl=RESPONSE_CACHE_TTL_SECONDS
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+        self.__generation = 0
+        self.__lock = threading.Lock()
+
+    def get_or_fetch(self, key, fetch):
+        """
+        Return the cached value of `key`, or call `fetch()` and cache its
+        result.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            if entry is not None:
+                del self.__entries[key]
+            self.misses += 1
+            generation = self.__generation
+        value = fetch()
+        with self.__lock:
+            # skip responses that may predate a write made while fetching
+            if generation == self.__generation:
+                self.__entries[key] = (
+                    time.monotonic() + self.ttl,
+                    copy.deepcopy(value),
+                )
+                self.__entries.move_to_end(key)
+                while len(self.__entries) > self.max_entries:
+                    self.__entries.popitem(last=False)
+        return value
+
+    def invalidate(self):
+        """
+        Drop all cached responses.
+        """
+        with self.__lock:
+            self.__entries.clear()
+            self.__generation += 1
+
+    def stats(self):
+        """
+        Hit and miss counters and current number of entries.
+        """
+        with self.__lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.__entries),
+            }
@@ -0,0 +1,199 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+from labeler_client.constants import LLM_CHECKPOINT_DIR
+
+
+class JobCheckpoint:
+    """
+    Append-only journal of an LLM annotation job. The first line holds the
+    job parameters; later lines record the job credentials, and LLM
+    responses, extracted annotations and submissions to the backend batch
+    by batch as they happen. Each line is flushed to disk when written, so
+    a job interrupted at any point can be resumed from its journal (see
+    `Controller.resume_job`). A submission is journaled before it is sent
+    and again once the backend confirms it; if the job stops in between,
+    the batch is in doubt and is submitted again on resume. The file is
+    readable by its owner only, as it holds the job token.
+
+    Attributes
+    ----------
+    path : str
+        Location of the journal file.
+    params : dict
+        Job parameters given when the journal was created.
+    job_uuid : str
+        Job the annotations are submitted as, None until created.
+    job_token : str
+        Access token of the job, None until created.
+    responses : dict
+        (response, metadata) by uuid of the records answered in the journal
+        when it was opened.
+    annotations : dict
+        Extracted labels by uuid of the records annotated in the journal when
+        it was opened.
+    submitted_uuids : set
+        Uuids of the records whose annotations were submitted.
+    in_doubt_uuids : set
+        Uuids of the records whose submission was sent but not confirmed.
+    annotation_uuid_list : list
+        Uuids of the submitted annotations, without duplicates.
+    """
+
+    def __init__(self, path):
+        """
+        Init function
+
+        Parameters
+        -------
+        path : str
+            Location of an existing journal file.
+        """
+        self.path = os.path.expanduser(path)
+        self.params = None
+        self.job_uuid = None
+        self.job_token = None
+        self.responses = {}
+        self.annotations = {}
+        self.submitted_uuids = set()
+        self.in_doubt_uuids = set()
+        self.annotation_uuid_list = []
+        # members of annotation_uuid_list, to keep it free of duplicates
+        self.__annotation_uuids = set()
+        self.__load()
+        if self.params is None:
+            raise Exception("{} is not a job checkpoint.".format(path))
+        self.__lock = threading.Lock()
+        self.__file = open(self.path, "a", encoding="utf-8")
+
+    @classmethod
+    def create(cls, params, directory=None):
+        """
+        Start the journal of a new job.
+
+        Parameters
+        -------
+        params : dict
+            JSON-serializable job parameters.
+        directory : str, optional
+            Directory of the journal file, by default
+            `~/.cache/labeler_client/jobs`.
+
+        Returns
+        -------
+        checkpoint : JobCheckpoint
+        """
+        directory = os.path.expanduser(directory or LLM_CHECKPOINT_DIR)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(
+            directory,
+            "{}-{}.jsonl".format(time.strftime("%Y%m%d-%H%M%S"), uuid.uuid4().hex[:8]),
+        )
+        descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with open(descriptor, "w", encoding="utf-8") as journal:
+            journal.write(json.dumps({"type": "job", "params": params}) + "\n")
+        return cls(path)
+
+    def __load(self):
+        valid_end = 0
+        with open(self.path, "rb") as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # torn write of an interrupted job
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                valid_end += len(line)
+                self.__apply(entry)
+                if entry["type"] == "responses":
+                    for record_uuid, response, metadata in entry["responses"]:
+                        self.responses[record_uuid] = (response, metadata)
+                elif entry["type"] == "annotations":
+                    for record_uuid, label in entry["annotations"]:
+                        self.annotations[record_uuid] = label
+        if valid_end < os.path.getsize(self.path):
+            with open(self.path, "r+b") as journal:
+                journal.truncate(valid_end)
+
+    def __apply(self, entry):
+        # responses and annotations are only read back when the journal is
+        # opened, so a running job does not keep them all in memory
+        if entry["type"] == "job":
+            self.params = entry["params"]
+        elif entry["type"] == "job_created":
+            self.job_uuid = entry["job_uuid"]
+            self.job_token = entry["job_token"]
+        elif entry["type"] == "submitting":
+            self.in_doubt_uuids.update(entry["uuid_list"])
+        elif entry["type"] == "submitted":
+            self.submitted_uuids.update(entry["uuid_list"])
+            self.in_doubt_uuids.difference_update(entry["uuid_list"])
+            # a batch re-submitted after an interruption may name the same
+            # annotations again
+            for annotation_uuid in entry["annotation_uuid_list"]:
+                if annotation_uuid not in self.__annotation_uuids:
+                    self.__annotation_uuids.add(annotation_uuid)
+                    self.annotation_uuid_list.append(annotation_uuid)
+
+    def __write(self, entry):
+        with self.__lock:
+            self.__apply(entry)
+            self.__file.write(json.dumps(entry) + "\n")
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+
+    def set_job(self, job_uuid, job_token):
+        """
+        Record the job the annotations are submitted as.
+        """
+        self.__write(
+            {"type": "job_created", "job_uuid": job_uuid, "job_token": job_token}
+        )
+
+    def add_responses(self, responses):
+        """
+        Record (uuid, response, metadata) tuples returned by the LLM.
+        """
+        if responses:
+            self.__write({"type": "responses", "responses": responses})
+
+    def add_annotations(self, annotations):
+        """
+        Record (uuid, label) annotations extracted from responses.
+        """
+        if annotations:
+            self.__write({"type": "annotations", "annotations": annotations})
+
+    def add_submitting(self, uuid_list):
+        """
+        Record that the annotations of `uuid_list` are about to be submitted.
+        """
+        self.__write({"type": "submitting", "uuid_list": uuid_list})
+
+    def add_submitted(self, uuid_list, annotation_uuid_list):
+        """
+        Record that the annotations of `uuid_list` were submitted.
+        """
+        self.__write(
+            {
+                "type": "submitted",
+                "uuid_list": uuid_list,
+                "annotation_uuid_list": annotation_uuid_list,
+            }
+        )
+
+    def close(self):
+        with self.__lock:
+            self.__file.close()
+
+    def remove(self):
+        """
+        Close and delete the journal once the job is persisted.
+        """
+        self.close()
+        os.remove(self.path)
@@ -7,6 +7,7 @@ SERVICE_ENDPOINTS = {
     "batch_update_metadata": "/data/metadata",
     "suggest_similar_annotations": "/annotations/suggest_similar",
     "export_data": "/data/export",
+    "get_data_versions": "/data/versions",
     "get_schemas": "/schemas",
     "set_schemas": "/schemas",
     "get_assignment": "/assignments",
@@ -14,6 +15,8 @@ SERVICE_ENDPOINTS = {
     "get_reconciliation_data": "/reconciliations",
     "set_reconciliation_data": "/annotations/{uuid}/labels",
     "set_verification_data": "/verifications/{uuid}/labels",
+    "set_reconciliation_data_batch": "/annotations/labels/batch",
+    "set_verification_data_batch": "/verifications/labels/batch",
     "get_user": "/auth/users/authenticate",
     "get_users_by_uids": "/auth/users/uids",
     "get_label_progress": "/statistics/label/progress",
@@ -28,6 +31,7 @@ SERVICE_ENDPOINTS = {
     "set_job": "/agents/{agent_uuid}/jobs/{job_uuid}",
     "add_metadata_to_label": "/data/label_metadata", # change later
     "search": "/data/search", 
+    "search_compound": "/data/search/compound",
     "get_view_record": "/view/record",
     "get_view_annotation": "/view/annotation",
     "get_view_verification": "/view/verifications",
@@ -39,8 +43,22 @@ NO_TIMEOUT_ENDPOINTS = {
     "get": [SERVICE_ENDPOINTS["suggest_similar_annotations"]],
 }
 DEFAULT_LIST_LIMIT = 10
+EXPORT_COLUMNS = ["data_id", "content", "annotator", "label_name", "label_value"]
 REQUEST_TIMEOUT_SECONDS = 10
 DNS_NAME = "https://labeler.megagon.ai"
 HTTPX_LIMITS = httpx.Limits(max_connections=(9 + 1))
+DEFAULT_POOL_SIZE = 10
+# upper bounds for one request body when a uuid list is split into batches
+MAX_PAYLOAD_BYTES = 256 * 1024
+MAX_BATCH_ITEMS = 2000
+DEFAULT_FETCH_WORKERS = 4
+DISK_CACHE_PATH = "~/.cache/labeler_client/cache.sqlite3"
+DISK_CACHE_MAX_BYTES = 512 * 1024 * 1024
+RESPONSE_CACHE_MAX_ENTRIES = 256
+RESPONSE_CACHE_TTL_SECONDS = 60
+LLM_CACHE_PATH = "~/.cache/labeler_client/llm_responses.sqlite3"
+LLM_CACHE_MAX_BYTES = 256 * 1024 * 1024
+LLM_CACHE_MODES = ["read_write", "read_only", "off"]
+LLM_CHECKPOINT_DIR = "~/.cache/labeler_client/jobs"
 VALID_PROVIDERS = {"openai": ["chat"]}
 FUZZY_THRESHOLD = 0.6
@@ -1,6 +1,9 @@
 import json
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
+from labeler_client.checkpoint import JobCheckpoint
 from labeler_client.constants import VALID_PROVIDERS
 from labeler_client.helpers import get_request, post_request
 from labeler_client.llm_jobs import OpenAIJob
@@ -58,7 +61,7 @@ class Controller:
             }
         )
         path = self.__service.get_service_endpoint("get_agents")
-        response = get_request(path, json=payload)
+        response = get_request(path, json=payload, session=self.__service.session)
         if response.status_code == 200:
             return response.json()
         else:
@@ -91,7 +94,7 @@ class Controller:
             }
         )
         path = self.__service.get_service_endpoint("get_jobs")
-        response = get_request(path, json=payload)
+        response = get_request(path, json=payload, session=self.__service.session)
         if response.status_code == 200:
             return response.json()
         else:
@@ -118,7 +121,7 @@ class Controller:
         path = self.__service.get_service_endpoint("get_jobs_of_agent").format(
             agent_uuid=agent_uuid
         )
-        response = get_request(path, json=payload)
+        response = get_request(path, json=payload, session=self.__service.session)
         if response.status_code == 200:
             return response.json()
         else:
@@ -151,7 +154,7 @@ class Controller:
             }
         )
         path = self.__service.get_service_endpoint("register_agent")
-        response = post_request(path, json=payload)
+        response = post_request(path, json=payload, session=self.__service.session)
         if response.status_code == 200:
             return response.json()
         else:
@@ -190,7 +193,9 @@ class Controller:
         path = self.__service.get_service_endpoint("set_job").format(
             agent_uuid=agent_uuid, job_uuid=job_uuid
         )
-        response = post_request(path, json=payload)
+        response = post_request(path, json=payload, session=self.__service.session)
+        # job annotations were written through the job's own service
+        self.__service.invalidate_response_cache()
         if response.status_code == 200:
             return response.json()
         else:
@@ -308,9 +313,19 @@ class Controller:
         num_retrials=2,
         label_meta_names=[],
         fuzzy_extraction=False,
+        max_concurrency=1,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        cache="off",
+        checkpoint_dir=None,
+        submit_batch_size=500,
     ):
         """
         Creates, runs, and persists an LLM annotation job with given agent and subset.
+        Records stream through prompt generation, LLM calls, extraction and
+        submission, so annotations reach the backend in batches while later
+        calls are in flight. Progress is journaled to a checkpoint file, so an
+        interrupted job can be continued with `resume_job`.
 
         Parameters
         ----------
@@ -328,31 +343,163 @@ class Controller:
             list of label metadata names to be set
         fuzzy_extraction: bool
             Set to True if fuzzy extraction desired in post processing
+        max_concurrency : int
+            Number of LLM requests in flight
+        requests_per_minute : int [optional]
+            LLM request budget per minute
+        tokens_per_minute : int [optional]
+            LLM token budget per minute
+        cache : str
+            On-disk LLM response cache mode, "read_write" | "read_only" |
+            "off". With "read_write", re-running a job only pays for prompts
+            that were not answered before, which also means the same answers
+            come back at any temperature.
+        checkpoint_dir : str [optional]
+            Directory of the job checkpoint, by default
+            `~/.cache/labeler_client/jobs`. The checkpoint is deleted once the
+            job is persisted.
+        submit_batch_size : int
+            Number of annotations submitted to the backend at a time, while
+            later records are still being annotated
         Returns
         -------
         job_uuid : str
             Job uuid
         """
+        params = {
+            "agent_uuid": agent_uuid,
+            "uuid_list": subset.get_uuid_list(),
+            "label_name": label_name,
+            "batch_size": batch_size,
+            "num_retrials": num_retrials,
+            "label_meta_names": label_meta_names,
+            "fuzzy_extraction": fuzzy_extraction,
+        }
+        llm_job, api_name = self.__prepare_job(params, subset)
+        checkpoint = JobCheckpoint.create(params, directory=checkpoint_dir)
+        print("Checkpoint: {}\n".format(checkpoint.path))
+        return self.__run_job(
+            checkpoint,
+            llm_job,
+            api_name,
+            subset,
+            max_concurrency=max_concurrency,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            cache=cache,
+            submit_batch_size=submit_batch_size,
+        )
+
+    def resume_job(
+        self,
+        checkpoint_path,
+        max_concurrency=1,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        cache="off",
+        submit_batch_size=500,
+    ):
+        """
+        Continues an interrupted `run_job` from its checkpoint. Records already
+        answered are not sent to the LLM again, and annotations whose
+        submission the backend confirmed are not submitted again. A batch
+        that was sent but not confirmed before the interruption is submitted
+        again; it sets the same labels for the same job annotator, and its
+        annotation uuids are only persisted once.
+
+        Parameters
+        ----------
+        checkpoint_path : str
+            Checkpoint file printed by `run_job`
+        max_concurrency : int
+            Number of LLM requests in flight
+        requests_per_minute : int [optional]
+            LLM request budget per minute
+        tokens_per_minute : int [optional]
+            LLM token budget per minute
+        cache : str
+            On-disk LLM response cache mode, "read_write" | "read_only" | "off"
+        submit_batch_size : int
+            Number of annotations submitted to the backend at a time
+        Returns
+        -------
+        job_uuid : str
+            Job uuid
+        """
+        checkpoint = JobCheckpoint(checkpoint_path)
+        print("Resuming job from checkpoint: {}\n".format(checkpoint.path))
+        if checkpoint.in_doubt_uuids:
+            print(
+                "Re-submitting [{}] annotation(s) whose submission was not "
+                "confirmed.\n".format(len(checkpoint.in_doubt_uuids))
+            )
+        try:
+            subset = Subset(self.__service, checkpoint.params["uuid_list"])
+            llm_job, api_name = self.__prepare_job(checkpoint.params, subset)
+        except BaseException:
+            checkpoint.close()
+            raise
+        return self.__run_job(
+            checkpoint,
+            llm_job,
+            api_name,
+            subset,
+            max_concurrency=max_concurrency,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            cache=cache,
+            submit_batch_size=submit_batch_size,
+        )
+
+    def __prepare_job(self, params, subset):
+        """
+        Look up the agent, check the provider and OpenAI keys, and set up the
+        LLM job, so a job that cannot run fails before anything is created.
+
+        Returns
+        -------
+        llm_job : OpenAIJob
+        api_name : str
+        """
         # if self.project and self.agent_token:
         #     self.create_service()
         # else:
         #     raise Exception("Service cannot be created as project and token not provided")
 
+        agent_uuid = params["agent_uuid"]
+        label_name = params["label_name"]
+        agent = self.get_agent_by_uuid(agent_uuid)
+        if not agent:
+            raise Exception("Agent ID: {} is invalid".format(agent_uuid))
+        provider_api = agent["provider_api"]
+        api_provider, api_name = provider_api.split(":")
+        if (
+            api_provider not in VALID_PROVIDERS
+            or api_name not in VALID_PROVIDERS[api_provider]
+        ):
+            raise Exception("LLM not supported")
+
+        # assumption: api key in env; model config is openai specific
+        if "OPENAI_API_KEY" not in os.environ:
+            raise Exception("OPENAI_API_KEY is not set")
+        openai_api_key = os.environ["OPENAI_API_KEY"]
+        openai_organization = (
+            os.environ["OPENAI_ORGANIZATION"]
+            if "OPENAI_ORGANIZATION" in os.environ
+            else ""
+        )
+        OpenAIJob.validate_openai_api_key(openai_api_key, openai_organization)
+
         label_schema = self.__service.get_schemas().value(active=True)[0]["schemas"][
             "label_schema"
         ]
         records = subset.get_view_record()
-
-        agent = self.get_agent_by_uuid(agent_uuid)
-        if not agent:
-            raise Exception("Agent ID: {} is invalid".format(agent_uuid))
         model_config = agent["model_config"]
         prompt_template = PromptTemplate(
             label_schema=label_schema,
             label_names=[label_name],
             template=agent["prompt_template"],
         )  # todo: read is_json_template
-        provider_api = agent["provider_api"]
 
         print("Job issued :::")
         print("\nAgent ID: {}".format(agent_uuid))
@@ -361,56 +508,165 @@ class Controller:
         print("\033[34m{}\x1b[0m".format(prompt_template.get_template()))
         # print("─" * 70)
 
-        # assumption: api key in env; model config is openai specific
-        openai_api_key = os.environ["OPENAI_API_KEY"]
-        openai_organization = (
-            os.environ["OPENAI_ORGANIZATION"]
-            if "OPENAI_ORGANIZATION" in os.environ
-            else ""
+        if "conf" in params["label_meta_names"]:
+            model_config["logprobs"] = True
+        llm_job = OpenAIJob(
+            label_schema, label_name, records, model_config, prompt_template
         )
+        return llm_job, api_name
 
-        # create job class instance
-        api_provider, api_name = provider_api.split(":")
-        if (
-            api_provider in VALID_PROVIDERS
-            and api_name in VALID_PROVIDERS[api_provider]
-        ):
-            if api_provider == "openai":
-                if "conf" in label_meta_names:
-                    model_config["logprobs"] = True
-                llm_job = OpenAIJob(
-                    label_schema, label_name, records, model_config, prompt_template
-                )
-                llm_job.validate_openai_api_key(openai_api_key, openai_organization)
-                llm_job.preprocess()
-                llm_job.get_llm_annotations(
-                    batch_size=batch_size,
-                    num_retrials=num_retrials,
-                    api_name=api_name,
-                    label_meta_names=label_meta_names,
-                )
-                llm_job.post_process_annotations(fuzzy_extraction=fuzzy_extraction)
-
-        # create job token and service
+    def __create_job(self, checkpoint):
+        """
+        Create the job token the annotations are submitted with.
+        """
         job_auth = self.__auth.create_access_token(job=True)
-        job_uuid, job_token = job_auth["user_id"], job_auth["token"]
-        job_service = Service(
-            project=self.__service.project,
-            host=self.__service.host,
-            port=self.__service.port,
-            token=job_token,
-        )
-
-        # set annotations and labels for job
-        job_subset = Subset(job_service, subset.get_uuid_list(), job_id=job_uuid)
-        for uuid, annotation in llm_job.annotations:
-            job_subset.set_annotations(uuid, annotation)
-        ret = job_service.submit_annotations(
-            job_subset, llm_job.uuids_with_valid_annotations
-        )
-        annotation_uuid_list = [r["annotation_uuid"] for r in ret]
+        checkpoint.set_job(job_auth["user_id"], job_auth["token"])
 
-        # set job
-        ret = self.persist_job(agent_uuid, job_uuid, label_name, annotation_uuid_list)
+    def __run_job(
+        self,
+        checkpoint,
+        llm_job,
+        api_name,
+        subset,
+        max_concurrency,
+        requests_per_minute,
+        tokens_per_minute,
+        cache,
+        submit_batch_size,
+    ):
+        params = checkpoint.params
+        try:
+            self.__annotate(
+                checkpoint,
+                llm_job,
+                api_name,
+                subset,
+                max_concurrency,
+                requests_per_minute,
+                tokens_per_minute,
+                cache,
+                submit_batch_size,
+            )
+            if checkpoint.job_uuid is None:
+                # no annotation to submit; the job is still recorded
+                self.__create_job(checkpoint)
+
+            # set job
+            ret = self.persist_job(
+                params["agent_uuid"],
+                checkpoint.job_uuid,
+                params["label_name"],
+                checkpoint.annotation_uuid_list,
+            )
+        except BaseException:
+            checkpoint.close()
+            raise
+        checkpoint.remove()
         print("\n", ret)
-        return job_uuid
+        return checkpoint.job_uuid
+
+    def __annotate(
+        self,
+        checkpoint,
+        llm_job,
+        api_name,
+        subset,
+        max_concurrency,
+        requests_per_minute,
+        tokens_per_minute,
+        cache,
+        submit_batch_size,
+    ):
+        """
+        Stream the subset through prompt generation, LLM calls, extraction and
+        submission to the job service. Each stage works on a record as soon
+        as the previous one is done with it; records finished in the
+        checkpoint are skipped. The job token is created just before the
+        first submission.
+        """
+        params = checkpoint.params
+        llm_job.reset_annotation_summary()
+        job = {}
+
+        def submit(annotations):
+            if not job:
+                if checkpoint.job_uuid is None:
+                    self.__create_job(checkpoint)
+                job["service"] = Service(
+                    project=self.__service.project,
+                    host=self.__service.host,
+                    port=self.__service.port,
+                    token=checkpoint.job_token,
+                    pool_size=self.__service.pool_size,
+                )
+                job["subset"] = Subset(
+                    job["service"], subset.get_uuid_list(), job_id=checkpoint.job_uuid
+                )
+            for uuid, annotation in annotations:
+                job["subset"].set_annotations(uuid, annotation)
+            uuid_list = [uuid for uuid, annotation in annotations]
+            checkpoint.add_submitting(uuid_list)
+            ret = job["service"].submit_annotations(job["subset"], uuid_list) or []
+            errors = [r for r in ret if "error" in r]
+            if errors:
+                raise Exception(errors[0]["error"])
+            checkpoint.add_submitted(uuid_list, [r["annotation_uuid"] for r in ret])
+
+        # annotated before an interruption, but not yet submitted
+        pending = [
+            (uuid, annotation)
+            for uuid, annotation in checkpoint.annotations.items()
+            if uuid not in checkpoint.submitted_uuids
+        ]
+        done = checkpoint.submitted_uuids | set(checkpoint.annotations)
+        prompts = (
+            (uuid, prompt)
+            for uuid, prompt in llm_job.iter_prompts()
+            if uuid not in done
+        )
+        num_responses = 0
+        num_annotations = 0
+        try:
+            # a single submitting thread keeps the job subset cache consistent;
+            # at most two batches wait for it before the LLM stage is held back
+            with ThreadPoolExecutor(max_workers=1) as submitter:
+                submissions = deque()
+                for responses, errors in llm_job.iter_llm_responses(
+                    prompts,
+                    batch_size=params["batch_size"],
+                    num_retrials=params["num_retrials"],
+                    api_name=api_name,
+                    label_meta_names=params["label_meta_names"],
+                    max_concurrency=max_concurrency,
+                    requests_per_minute=requests_per_minute,
+                    tokens_per_minute=tokens_per_minute,
+                    cache=cache,
+                    checkpoint=checkpoint,
+                ):
+                    annotations = []
+                    for uuid, response, metadata_list in responses:
+                        annotation = llm_job.get_annotation(
+                            uuid, response, metadata_list, params["fuzzy_extraction"]
+                        )
+                        if annotation is not None:
+                            annotations.append((uuid, annotation))
+                    checkpoint.add_annotations(annotations)
+                    num_responses += len(responses)
+                    num_annotations += len(annotations)
+                    pending += annotations
+                    if len(pending) >= submit_batch_size:
+                        submissions.append(submitter.submit(submit, pending))
+                        pending = []
+                        while len(submissions) > 2:
+                            submissions.popleft().result()
+                if pending:
+                    submissions.append(submitter.submit(submit, pending))
+                while submissions:
+                    submissions.popleft().result()
+        finally:
+            if job:
+                job["service"].close()
+
+        llm_job.print_prompt_summary()
+        print("\nPost-processing [{}] response(s) :::".format(num_responses))
+        llm_job.print_annotation_summary(num_responses, num_annotations)
@@ -1,8 +1,22 @@
+import json
+from collections import deque
+
+import httpx
+import numpy as np
+import pydash
 import requests
 from requests.adapters import HTTPAdapter
+from tabulate import tabulate
 from urllib3 import Retry
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError
 
-from labeler_client.constants import NO_TIMEOUT_ENDPOINTS, REQUEST_TIMEOUT_SECONDS
+from labeler_client.constants import (
+    DEFAULT_LIST_LIMIT,
+    MAX_BATCH_ITEMS,
+    MAX_PAYLOAD_BYTES,
+    NO_TIMEOUT_ENDPOINTS,
+    REQUEST_TIMEOUT_SECONDS,
+)
 
 
 def requests_retry_session(
@@ -10,6 +24,7 @@ def requests_retry_session(
     backoff_factor=0.3,
     status_forcelist=(500, 502, 504),
     session=None,
+    pool_size=None,
 ):
     session = session or requests.Session()
     retry = Retry(
@@ -19,62 +34,379 @@ def requests_retry_session(
         backoff_factor=backoff_factor,
         status_forcelist=status_forcelist,
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    if pool_size is None:
+        adapter = HTTPAdapter(max_retries=retry)
+    else:
+        # keep-alive connections are reused across calls; pool_maxsize bounds
+        # the number of connections kept open per host.
+        adapter = HTTPAdapter(
+            max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size
+        )
     session.mount("http://", adapter)
     session.mount("https://", adapter)
     return session
 
 
-def delete_request(path="", json={}, timeout=REQUEST_TIMEOUT_SECONDS):
+def is_connect_error(exception):
+    """
+    Whether `exception` (or the error it was raised from) happened while
+    connecting, i.e. before any part of the request reached the server, so
+    the request can be re-sent without being applied twice.
+    """
+    exception = exception.__cause__ or exception
+    if isinstance(
+        exception, (requests.ConnectTimeout, httpx.ConnectError, httpx.ConnectTimeout)
+    ):
+        return True
+    if not isinstance(exception, requests.ConnectionError) or not exception.args:
+        return False
+    reason = exception.args[0]
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    # urllib3 raises NewConnectionError (a ConnectTimeoutError) when the
+    # connection is refused or cannot be resolved
+    return isinstance(reason, ConnectTimeoutError)
+
+
+def search_filter(
+    limit=DEFAULT_LIST_LIMIT,
+    skip=0,
+    uuid_list=None,
+    keyword=None,
+    regex=None,
+    record_metadata_condition=None,
+    annotator_list=None,
+    label_condition=None,
+    label_metadata_condition=None,
+    verification_condition=None,
+):
+    """
+    Build the search filter of `Service.search` from the predicates that
+    are set.
+    """
+    filter = {
+        "limit": limit,
+        "skip": skip,
+    }
+    if keyword is not None:
+        filter["keyword"] = keyword
+    if uuid_list is not None:
+        filter["uuid_list"] = uuid_list
+    if regex is not None:
+        filter["regex"] = regex
+    if record_metadata_condition is not None:
+        filter["record_metadata_condition"] = record_metadata_condition
+    if annotator_list is not None:
+        filter["annotator_list"] = annotator_list
+    if label_condition is not None:
+        filter["label_condition"] = label_condition
+    if label_metadata_condition is not None:
+        filter["label_metadata_condition"] = label_metadata_condition
+    if verification_condition is not None:
+        filter["verification_condition"] = verification_condition
+    return filter
+
+
+def filter_import_columns(df, column_mapping):
+    """
+    Validate `column_mapping` against the columns of `df` and keep only
+    the columns to send. Returns the filtered frame and the mapping
+    (defaulting to columns `id` and `content`).
+    """
+    filtered_columns = []
+    if pydash.is_empty(column_mapping):
+        # defult mapping ,check for columns "id" and "content"
+        if "id" in df.columns and "content" in df.columns:
+            filtered_columns.extend(["id", "content"])
+            column_mapping = {"id": "id", "content": "content"}
+        else:
+            raise Exception(
+                "Needs to provide valid column_mapping, or columns with name 'id' and 'content'."
+            )
+    else:
+        if (
+            column_mapping["id"] in df.columns
+            and column_mapping["content"] in df.columns
+        ):
+            filtered_columns.extend([column_mapping["id"], column_mapping["content"]])
+        else:
+            raise Exception(
+                "Needs to provide valid column_mapping with fields 'id' and 'content'."
+            )
+    if "metadata" in column_mapping:
+        filtered_columns.append(column_mapping["metadata"])
+
+    # filter columns to only send necessary columns.
+    # fill nan values to make json serializable.
+    return df[filtered_columns].fillna("NaN"), column_mapping
+
+
+def summarize_import(results, return_summary):
+    """
+    Print the summary of an import from the `(start_row, rows,
+    response_text, error)` of each uploaded chunk, with `error` None for
+    imported chunks. See `Service.import_data_df` for `return_summary` and
+    the return value.
+    """
+    summary = {"imported": 0, "rejected": 0, "responses": [], "errors": []}
+    for start, rows, response_text, error in results:
+        if error is None:
+            summary["imported"] += rows
+            summary["responses"].append(response_text)
+        else:
+            summary["rejected"] += rows
+            summary["errors"].append({"rows": [start, start + rows], "error": error})
+    if summary["imported"] == 0 and len(summary["errors"]) > 0:
+        raise Exception(summary["errors"][0]["error"])
+    print(
+        tabulate(
+            [
+                ["Imported rows", summary["imported"]],
+                ["Rejected rows", summary["rejected"]],
+            ],
+            headers=["", "Count"],
+            tablefmt="rounded_outline",
+        )
+    )
+    if return_summary:
+        return summary
+    if len(summary["errors"]) > 0:
+        raise Exception(
+            "Rows {} were not imported: {}".format(
+                ", ".join(
+                    "{}-{}".format(error["rows"][0], error["rows"][1] - 1)
+                    for error in summary["errors"]
+                ),
+                summary["errors"][0]["error"],
+            )
+        )
+    return "\n".join(summary["responses"])
+
+
+def bounded_imap(executor, func, iterable, max_pending):
+    """
+    Lazily map `func` over `iterable` on `executor`, keeping at most
+    `max_pending` calls in flight. Results are yielded in input order and
+    `iterable` is only consumed as results are taken, so chained calls form
+    a pipeline with bounded memory. Pending calls are cancelled when the
+    generator is closed early.
+    """
+    pending = deque()
+    try:
+        for item in iterable:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def chunk_by_payload_size(
+    items, max_bytes=MAX_PAYLOAD_BYTES, max_items=MAX_BATCH_ITEMS
+):
+    """
+    Split `items` into consecutive lists whose JSON encoding stays under
+    `max_bytes` and which hold at most `max_items` entries each. An item
+    larger than `max_bytes` on its own is still sent, in a batch by itself.
+    """
+    batch = []
+    size = 2  # enclosing brackets
+    for item in items:
+        item_size = len(json.dumps(item).encode("utf-8")) + 2  # ", "
+        if batch and (size + item_size > max_bytes or len(batch) >= max_items):
+            yield batch
+            batch = []
+            size = 2
+        batch.append(item)
+        size += item_size
+    if batch:
+        yield batch
+
+
+# character positions of a canonical uuid string "8-4-4-4-12"
+_UUID_DASHES = [8, 13, 18, 23]
+_UUID_DIGITS = [i for i in range(36) if i not in _UUID_DASHES]
+# value of each lowercase hex digit character, 255 for any other byte
+_HEX_VALUES = np.full(256, 255, dtype=np.uint8)
+_HEX_VALUES[list(b"0123456789abcdef")] = np.arange(16, dtype=np.uint8)
+
+
+def pack_uuids(uuid_list):
+    """
+    Pack canonical uuid strings (lowercase, hyphenated) into a NumPy array
+    of 16-byte values (dtype `S16`), about a sixth of the memory of a list
+    of str. Returns None if any entry is not a canonical uuid, so callers
+    can keep the list as is.
+    """
+    count = len(uuid_list)
+    if count == 0:
+        return np.empty(0, dtype="S16")
+    try:
+        if set(map(len, uuid_list)) != {36}:
+            return None
+        text = "".join(uuid_list).encode("ascii")
+    except (TypeError, UnicodeEncodeError):
+        return None
+    chars = np.frombuffer(text, dtype=np.uint8).reshape(count, 36)
+    if not (chars[:, _UUID_DASHES] == ord("-")).all():
+        return None
+    nibbles = _HEX_VALUES[chars[:, _UUID_DIGITS]]
+    if (nibbles == 255).any():
+        return None
+    packed = np.ascontiguousarray((nibbles[:, 0::2] << 4) | nibbles[:, 1::2])
+    return packed.view("S16").ravel()
+
+
+def unpack_uuids(packed):
+    """
+    Convert an array built by `pack_uuids` back to a list of uuid strings.
+    """
+    count = len(packed)
+    digits = np.frombuffer(packed.tobytes().hex().encode("ascii"), dtype=np.uint8)
+    chars = np.full((count, 36), ord("-"), dtype=np.uint8)
+    chars[:, _UUID_DIGITS] = digits.reshape(count, 32)
+    text = chars.tobytes().decode("ascii")
+    return [text[i : i + 36] for i in range(0, 36 * count, 36)]
+
+
+def _high_words(packed):
+    """
+    First 8 bytes of each packed uuid as integers, in the same order as the
+    bytes compare.
+    """
+    return packed.view(">u8")[0::2].astype(np.uint64)
+
+
+def sort_packed_uuids(packed):
+    """
+    Sort packed uuids and drop duplicates. Sorting on the leading 64 bits is
+    much faster than comparing 16-byte strings; the full comparison is only
+    needed when two different uuids share those bits.
+    """
+    if len(packed) < 2:
+        return packed.copy()
+    high = _high_words(packed)
+    order = np.argsort(high)
+    high = high[order]
+    if (high[1:] != high[:-1]).all():
+        return packed[order]
+    return np.unique(packed)
+
+
+def packed_set_operation(operator, left, right):
+    """
+    Set operation on two sorted arrays of unique packed uuids, returning a
+    sorted array of unique packed uuids.
+
+    Parameters
+    ----
+    operator : str
+        "or", "and" or "difference".
+    left, right : numpy.ndarray
+        Sorted, duplicate-free arrays from `pack_uuids`.
+    """
+
+    def contained(values, sorted_values):
+        if len(sorted_values) == 0 or len(values) == 0:
+            return np.zeros(len(values), dtype=bool)
+        high = _high_words(sorted_values)
+        if (high[1:] != high[:-1]).all():
+            # leading 64 bits are unique: search on them, then confirm
+            positions = np.searchsorted(high, _high_words(values))
+        else:
+            positions = np.searchsorted(sorted_values, values)
+        positions[positions == len(sorted_values)] = 0
+        return sorted_values[positions] == values
+
+    if operator == "or":
+        return sort_packed_uuids(np.concatenate([left, right[~contained(right, left)]]))
+    if operator == "and":
+        return left[contained(left, right)]
+    if operator == "difference":
+        return left[~contained(left, right)]
+    raise Exception(f"Unknown set operator '{operator}'.")
+
+
+def delete_request(path="", json={}, timeout=REQUEST_TIMEOUT_SECONDS, session=None):
     for endpoint in NO_TIMEOUT_ENDPOINTS.get("get", []):
         if path.endswith(endpoint):
             timeout = None
             break
     try:
-        return requests_retry_session().delete(path, json=json, timeout=timeout)
+        return (session or requests_retry_session()).delete(
+            path, json=json, timeout=timeout
+        )
     except requests.ConnectTimeout as ex:
         raise Exception("{}: {}".format(ex.__class__.__name__, "408 Request Timeout"))
 
 
-def put_request(path="", json={}, timeout=REQUEST_TIMEOUT_SECONDS):
-    for endpoint in NO_TIMEOUT_ENDPOINTS.get("post", []):
+def get_request(path="", json={}, timeout=REQUEST_TIMEOUT_SECONDS, session=None):
+    for endpoint in NO_TIMEOUT_ENDPOINTS.get("get", []):
         if path.endswith(endpoint):
             timeout = None
             break
     try:
-        return requests_retry_session().put(path, json=json, timeout=timeout)
+        return (session or requests_retry_session()).get(
+            path, json=json, timeout=timeout
+        )
     except requests.ConnectTimeout as ex:
         raise Exception("{}: {}".format(ex.__class__.__name__, "408 Request Timeout"))
 
 
-def get_request(path="", json={}, timeout=REQUEST_TIMEOUT_SECONDS):
-    for endpoint in NO_TIMEOUT_ENDPOINTS.get("get", []):
+def post_request(path="", json={}, timeout=REQUEST_TIMEOUT_SECONDS, session=None):
+    for endpoint in NO_TIMEOUT_ENDPOINTS.get("post", []):
         if path.endswith(endpoint):
             timeout = None
             break
     try:
-        return requests_retry_session().get(path, json=json, timeout=timeout)
+        return (session or requests_retry_session()).post(
+            path, json=json, timeout=timeout
+        )
     except requests.ConnectTimeout as ex:
-        raise Exception("{}: {}".format(ex.__class__.__name__, "408 Request Timeout"))
+        raise Exception(
+            "{}: {}".format(ex.__class__.__name__, "408 Request Timeout")
+        ) from ex
 
 
-def post_request(path="", json={}, timeout=REQUEST_TIMEOUT_SECONDS):
-    for endpoint in NO_TIMEOUT_ENDPOINTS.get("post", []):
+def put_request(path="", json={}, timeout=REQUEST_TIMEOUT_SECONDS, session=None):
+    for endpoint in NO_TIMEOUT_ENDPOINTS.get("put", []):
         if path.endswith(endpoint):
             timeout = None
             break
     try:
-        return requests_retry_session().post(path, json=json, timeout=timeout)
+        return (session or requests_retry_session()).put(
+            path, json=json, timeout=timeout
+        )
     except requests.ConnectTimeout as ex:
         raise Exception("{}: {}".format(ex.__class__.__name__, "408 Request Timeout"))
 
 
-def put_request(path="", json={}, timeout=REQUEST_TIMEOUT_SECONDS):
-    for endpoint in NO_TIMEOUT_ENDPOINTS.get("put", []):
+async def async_get_request(client, path="", json={}, timeout=REQUEST_TIMEOUT_SECONDS):
+    for endpoint in NO_TIMEOUT_ENDPOINTS.get("get", []):
         if path.endswith(endpoint):
             timeout = None
             break
     try:
-        return requests_retry_session().put(path, json=json, timeout=timeout)
-    except requests.ConnectTimeout as ex:
-        raise Exception("{}: {}".format(ex.__class__.__name__, "408 Request Timeout"))
+        # httpx.AsyncClient.get does not accept a body; the back-end reads
+        # GET payloads from json, so go through the generic request.
+        return await client.request("GET", path, json=json, timeout=timeout)
+    except httpx.ConnectTimeout as ex:
+        raise Exception(
+            "{}: {}".format(ex.__class__.__name__, "408 Request Timeout")
+        ) from ex
+
+
+async def async_post_request(client, path="", json={}, timeout=REQUEST_TIMEOUT_SECONDS):
+    for endpoint in NO_TIMEOUT_ENDPOINTS.get("post", []):
+        if path.endswith(endpoint):
+            timeout = None
+            break
+    try:
+        return await client.request("POST", path, json=json, timeout=timeout)
+    except httpx.ConnectTimeout as ex:
+        raise Exception(
+            "{}: {}".format(ex.__class__.__name__, "408 Request Timeout")
+        ) from ex
@@ -1,10 +1,13 @@
+import hashlib
 import json
-import queue
 import random
 import re
+import threading
 import time
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from curses.ascii import isdigit
+from itertools import islice
 from string import Template
 
 import jaro
@@ -15,11 +18,90 @@ from tabulate import tabulate
 from tqdm import tqdm
 from tqdm.notebook import tqdm_notebook
 
-from labeler_client.constants import FUZZY_THRESHOLD
+from labeler_client.cache import DiskCache
+from labeler_client.constants import (
+    FUZZY_THRESHOLD,
+    LLM_CACHE_MAX_BYTES,
+    LLM_CACHE_MODES,
+    LLM_CACHE_PATH,
+)
+from labeler_client.helpers import bounded_imap
 from labeler_client.prompt import PromptTemplate
 from labeler_client.valid_formats import model_config_options
 
 MAX_TOKEN_LIMIT = 2044
+LLM_CACHE_NAMESPACE = "openai"
+# prompts looked up in the checkpoint and cache at a time
+LLM_LOOKUP_WINDOW = 500
+BATCH_PROMPT = (
+    "Complete each of the {} numbered tasks below independently, as if it were "
+    "the only one. Reply with only a JSON object that maps each task number to "
+    'your answer for that task, e.g. {{"1": <answer to task 1>, '
+    '"2": <answer to task 2>}}.\n\n'
+)
+
+
+def estimate_tokens(text):
+    """
+    Approximate token count of `text`, using 1 word ~ 1.33 tokens.
+    """
+    return round(len(text.split()) * 1.33)
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter shared by the threads calling an LLM API. Each call
+    takes one request and its estimated tokens from two buckets that refill
+    continuously at `requests_per_minute` and `tokens_per_minute`; callers
+    block until both have enough. A budget of None is not enforced.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        """
+        Init function
+
+        Parameters
+        ----------
+        requests_per_minute : int
+            Maximum number of requests per minute
+        tokens_per_minute : int
+            Maximum number of (estimated) tokens per minute
+        """
+        self.__lock = threading.Lock()
+        self.__buckets = {}
+        for name, per_minute in (
+            ("requests", requests_per_minute),
+            ("tokens", tokens_per_minute),
+        ):
+            if per_minute:
+                # [capacity, available, refill per second]
+                self.__buckets[name] = [per_minute, per_minute, per_minute / 60.0]
+        self.__last = time.monotonic()
+
+    def acquire(self, tokens=0):
+        """
+        Block until one request and `tokens` tokens are available, then take
+        them. Calls larger than the bucket take the whole bucket.
+        """
+        amounts = {"requests": 1, "tokens": tokens}
+        while True:
+            with self.__lock:
+                now = time.monotonic()
+                for bucket in self.__buckets.values():
+                    bucket[1] = min(
+                        bucket[0], bucket[1] + (now - self.__last) * bucket[2]
+                    )
+                self.__last = now
+                wait = 0
+                for name, (capacity, available, rate) in self.__buckets.items():
+                    needed = min(amounts[name], capacity)
+                    if available < needed:
+                        wait = max(wait, (needed - available) / rate)
+                if wait == 0:
+                    for name, bucket in self.__buckets.items():
+                        bucket[1] -= min(amounts[name], bucket[0])
+                    return
+            time.sleep(wait)
 
 
 class OpenAIJob:
@@ -211,8 +293,7 @@ class OpenAIJob:
         bool
             True if prompt is valid, False otherwise
         """
-        num_words = len(prompt.split())
-        num_tokens = round(num_words * 1.33)
+        num_tokens = estimate_tokens(prompt)
         if num_tokens > MAX_TOKEN_LIMIT:
             return False
         return True
@@ -226,13 +307,21 @@ class OpenAIJob:
         prompts: list
             List of tuples of (uuid, generated prompt) for each record in given subset
         """
-        prompts = []
+        return list(self.iter_prompts())
+
+    def iter_prompts(self):
+        """
+        Generate the (uuid, prompt) pairs of `generate_prompts` one record at
+        a time. Prompts over the token limit are dropped and collected in
+        `invalid_prompts`.
+        """
+        self.is_json_template = self.template.is_json_template
         self.invalid_prompts = []
         for record in self.records:
             # append each data record to the template to generate prompt
             prompt = self.template.get_prompt(input_str=record["record_content"])
             if self.is_valid_prompt(prompt):
-                prompts.append((record["uuid"], prompt))
+                yield record["uuid"], prompt
             else:
                 print(
                     "Prompt generated for uuid {} : {} was not within Open AI max token limits, and was hence dropped".format(
@@ -240,15 +329,14 @@ class OpenAIJob:
                     )
                 )
                 self.invalid_prompts.append((record["uuid"], prompt))
-        return prompts
 
-    def get_response_length(self):
-        content = self.openai_response.choices[0]["message"]["content"]
+    def get_response_length(self, openai_response):
+        content = openai_response.choices[0]["message"]["content"]
         return len(content)
 
-    def get_openai_conf_score(self):
+    def get_openai_conf_score(self, openai_response):
         logprobs = []
-        logprobs_response = self.openai_response.choices[0]["logprobs"]["content"]
+        logprobs_response = openai_response.choices[0]["logprobs"]["content"]
         for logprob in logprobs_response:
             logprobs.append(logprob["logprob"])
         conf_score = round(np.mean(np.exp(logprobs)), 6)
@@ -263,307 +351,519 @@ class OpenAIJob:
         prompts : list
             List of prompts
         """
-        self.is_json_template = self.template.is_json_template
-        prompts = self.generate_prompts()
+        self.prompts = self.generate_prompts()
+        self.print_prompt_summary()
 
+    def print_prompt_summary(self):
+        """
+        Print the number of valid and invalid prompts generated.
+        """
+        num_records = max(len(self.records), 1)
+        num_valid = len(self.records) - len(self.invalid_prompts)
         print("\nPre-processing [{}] record(s) :::".format(len(self.records)))
         table = [
             [
                 "Valid prompts",
-                len(prompts),
-                100 * round(len(prompts) / len(self.records), 4),
+                num_valid,
+                100 * round(num_valid / num_records, 4),
             ],
             [
                 "Invalid prompts",
                 len(self.invalid_prompts),
-                100 * round(len(self.invalid_prompts) / len(self.records), 4),
+                100 * round(len(self.invalid_prompts) / num_records, 4),
             ],
         ]
         print(tabulate(table, headers=["", "Count", "%"], tablefmt="rounded_outline"))
-        self.prompts = prompts
 
     def get_llm_annotations(
-        self, batch_size=1, num_retrials=2, api_name="chat", label_meta_names=[]
+        self,
+        batch_size=1,
+        num_retrials=2,
+        api_name="chat",
+        label_meta_names=[],
+        max_concurrency=1,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        cache="off",
+        cache_path=None,
+        cache_max_bytes=LLM_CACHE_MAX_BYTES,
+        checkpoint=None,
     ):
         """
         Calls OpenAI using the generated prompts, to obtain valid & invalid responses
 
         Parameters
         ----------
+        See `iter_llm_responses`.
+
+        Returns
+        -------
+        responses : list
+            List of valid responses from OpenAI
+        invalid_responses : list
+            List of invalid responses from OpenAI
+        """
+        responses = []
+        invalid_responses = []
+        for batch_responses, batch_errors in self.iter_llm_responses(
+            self.prompts,
+            batch_size=batch_size,
+            num_retrials=num_retrials,
+            api_name=api_name,
+            label_meta_names=label_meta_names,
+            max_concurrency=max_concurrency,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            cache=cache,
+            cache_path=cache_path,
+            cache_max_bytes=cache_max_bytes,
+            checkpoint=checkpoint,
+        ):
+            responses += batch_responses
+            invalid_responses += batch_errors
+        self.responses = responses
+        self.invalid_responses = invalid_responses
+
+    def iter_llm_responses(
+        self,
+        prompts,
+        batch_size=1,
+        num_retrials=2,
+        api_name="chat",
+        label_meta_names=[],
+        max_concurrency=1,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        cache="off",
+        cache_path=None,
+        cache_max_bytes=LLM_CACHE_MAX_BYTES,
+        checkpoint=None,
+    ):
+        """
+        Calls OpenAI for a stream of (uuid, prompt) pairs. Prompts are read
+        only as far ahead as the requests in flight need, and results are
+        yielded in prompt order as soon as they arrive, so later stages can
+        start before all calls are done.
+
+        Parameters
+        ----------
+        prompts : iterable
+            (uuid, prompt) pairs, e.g. from `iter_prompts`
         batch_size : int
-            Size of batch to each Open AI prompt
+            Size of batch to each Open AI prompt. Chat batches are sent as
+            numbered tasks in one message; records whose answer cannot be
+            parsed are retried individually.
         num_retrials : int
             Number of retrials to OpenAI in case of failure in response
         api_name : str
             Name of OpenAI api eg. "chat" or "completion
         label_meta_names: list
             list of label metadata names to be set
+        max_concurrency : int
+            Number of requests to OpenAI in flight
+        requests_per_minute : int [optional]
+            Request budget per minute, enforced across concurrent requests
+        tokens_per_minute : int [optional]
+            Token budget per minute (estimated from the prompts and
+            `max_tokens`), enforced across concurrent requests
+        cache : str
+            On-disk response cache mode: "read_write" answers prompts seen
+            before from the cache and stores new responses, "read_only" only
+            looks up, "off" always calls OpenAI. Entries are keyed by the API,
+            the model configuration and the prompt text. Only answers to
+            single-prompt requests are stored, so batched answers are never
+            served for an unbatched run.
+        cache_path : str [optional]
+            Location of the cache database, by default
+            `~/.cache/labeler_client/llm_responses.sqlite3`
+        cache_max_bytes : int
+            Size limit of the cache; least recently used entries are evicted
+        checkpoint : JobCheckpoint [optional]
+            Journal of the job. Records answered in it are not sent again,
+            and new responses are added to it as they arrive.
 
-        Returns
+        Yields
         -------
         responses : list
-            List of valid responses from OpenAI
+            (uuid, response, metadata) tuples of valid responses
         invalid_responses : list
-            List of invalid responses from OpenAI
+            (uuid, error) tuples of failed calls
         """
         print("\nCalling LLM API :::")
 
-        prompts = self.prompts
+        if cache not in LLM_CACHE_MODES:
+            raise Exception("cache must be one of {}".format(LLM_CACHE_MODES))
         # todo: set batch_size depending on tokens per minute and requests per minute
         if batch_size < 1:
             batch_size = 1
         elif batch_size > 10:
             batch_size = 10
-
-        responses = []
-        invalid_responses = []
-        q = queue.Queue()
+        max_concurrency = max(1, max_concurrency)
+        limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        counts = Counter()
         start = time.time()
-        if batch_size == 1:
-            for i, (uuid, prompt) in tqdm_notebook(enumerate(prompts), "Progress"):
-                time.sleep(1e-10)
-                q.put(num_retrials)
-                while not q.empty():
-                    try:
-                        trials_left = q.get()
-                        if api_name == "completions":
-                            completion = openai.Completion.create(
-                                prompt=prompt, **self.model_config
-                            )
-                            confidence_score = np.mean(
-                                np.exp(
-                                    completion["choices"][0]["logprobs"][
-                                        "token_logprobs"
-                                    ]
-                                )
-                            )
-                            response = completion["choices"][0]["text"]
-                        elif api_name == "chat":
-                            self.model_config["messages"] = [
-                                {
-                                    "role": "user",
-                                    "content": prompt,
-                                },
-                            ]
-                            openai_response = openai.ChatCompletion.create(
-                                **self.model_config
-                            )
-                            self.openai_response = openai_response
-                            metadata_list = []
-                            for label_meta_name in label_meta_names:
-                                func = getattr(
-                                    self, self.label_meta_func_map[label_meta_name]
-                                )
-                                metadata_list.append(
-                                    {
-                                        "metadata_name": label_meta_name,
-                                        "metadata_value": func(),
-                                    }
-                                )
-
-                            response = openai_response.choices[0]["message"]["content"]
-                        responses.append((uuid, response.strip(), metadata_list))
-                    except openai.error.AuthenticationError as e:
-                        print("--------------------------")
-                        print(
-                            'Encounted an error during call to OpenAI for uuid: {}\nError Message from OpenAI: "{}"'.format(
-                                uuid, e
-                            )
-                        )
-                        invalid_responses.append((uuid, e))
-                    except openai.error.APIError as e:
-                        print("--------------------------")
-                        print(
-                            'Encounted an error during call to OpenAI for uuid: {}\nError Message from OpenAI: "{}"'.format(
-                                uuid, e
-                            )
-                        )
-                        invalid_responses.append((uuid, e))
-                    except openai.error.APIConnectionError as e:
-                        print("--------------------------")
-                        print(
-                            'Encounted an error during call to OpenAI for uuid: {}\nError Message from OpenAI: "{}"'.format(
-                                uuid, e
-                            )
-                        )
-                        invalid_responses.append((uuid, e))
-                    except openai.error.RateLimitError as e:
-                        trials_left -= 1
-                        if trials_left == 0:
-                            print(
-                                "-------------------\nEncounted an error during call to OpenAI for uuid: {}\nRetried call to OpenAI {} number of times. \nError Message from OpenAI: {}.\n".format(
-                                    uuid, num_retrials, e
-                                )
-                            )
-                            invalid_responses.append((uuid, e))
-                        else:
-                            q.put(trials_left)
-                    except openai.error.Timeout as e:
-                        trials_left -= 1
-                        if trials_left == 0:
-                            print(
-                                "-------------------\nEncounted an error during call to OpenAI for uuid: {}\nRetried call to OpenAI {} number of times. \nError Message from OpenAI: {}.\n".format(
-                                    uuid, num_retrials, e
-                                )
-                            )
-                            invalid_responses.append((uuid, e))
+        response_cache = None
+        if cache != "off":
+            response_cache = DiskCache(cache_path or LLM_CACHE_PATH, cache_max_bytes)
+
+        def work_items():
+            # known responses of a window come first, then its prompt batches
+            prompt_iterator = iter(prompts)
+            while True:
+                window = list(islice(prompt_iterator, LLM_LOOKUP_WINDOW))
+                if not window:
+                    return
+                counts["prompts"] += len(window)
+                known = []
+                pending = window
+                if checkpoint is not None:
+                    pending = []
+                    for uuid, prompt in window:
+                        if uuid in checkpoint.responses:
+                            known.append((uuid, *checkpoint.responses[uuid]))
                         else:
-                            q.put(trials_left)
-                    except openai.error.InvalidRequestError as e:
-                        print("--------------------------")
-                        print(
-                            'Encounted an error during call to OpenAI for uuid: {}\nError Message from OpenAI: "{}"'.format(
-                                uuid, e
-                            )
-                        )
-                        invalid_responses.append((uuid, e))
-                    except openai.error.ServiceUnavailableError as e:
-                        print("--------------------------")
-                        print(
-                            'Encounted an error during call to OpenAI for uuid: {}\nError Message from OpenAI: "{}"'.format(
-                                uuid, e
-                            )
-                        )
-                        invalid_responses.append((uuid, e))
-                    except Exception as e:
-                        print("--------------------------")
-                        print(
-                            "Encounted an unknown error during call to OpenAI for uuid: {} - {}\n".format(
-                                uuid, e
-                            )
-                        )
-                        invalid_responses.append((uuid, e))
-        else:
-            prompt_batches = [
-                prompts[i : i + batch_size] for i in range(0, len(prompts), batch_size)
-            ]
-            for i, prompt_batch in tqdm_notebook(enumerate(prompt_batches), "Progress"):
-                time.sleep(1e-10)
-                uuids = [uuid for uuid, prompt in prompt_batch]
-                prompts = [prompt for uuid, prompt in prompt_batch]
-                q.put(num_retrials)
-                while not q.empty():
-                    try:
-                        trials_left = q.get()
-                        if api_name == "completions":
-                            response_batch = openai.Completion.create(
-                                prompt=prompts, **self.model_config
-                            )
-                            for choice in response_batch.choices:
-                                confidence_score = np.mean(
-                                    np.exp(choice.logprobs.token_logprobs)
-                                )
-                                responses.append(
-                                    (
-                                        uuids[choice.index],
-                                        choice.text.strip(),
-                                        confidence_score,
-                                    )
-                                )
-                        elif api_name == "chat":
-                            # TO BE IMPLEMENTED
-                            pass
-                    except openai.error.AuthenticationError as e:
-                        print("--------------------------")
-                        print(
-                            'Encounted an error during call to OpenAI for uuids: {}\nError Message from OpenAI: "{}"'.format(
-                                uuids, e
-                            )
-                        )
-                        for uuid in uuids:
-                            invalid_responses.append((uuid, e))
-                    except openai.error.APIError as e:
-                        print("--------------------------")
-                        print(
-                            'Encounted an error during call to OpenAI for uuids: {}\nError Message from OpenAI: "{}"'.format(
-                                uuids, e
-                            )
-                        )
-                        for uuid in uuids:
-                            invalid_responses.append((uuid, e))
-                    except openai.error.APIConnectionError as e:
-                        print("--------------------------")
-                        print(
-                            'Encounted an error during call to OpenAI for uuids: {}\nError Message from OpenAI: "{}"'.format(
-                                uuids, e
-                            )
+                            pending.append((uuid, prompt))
+                    counts["checkpoint"] += len(known)
+                if response_cache is not None and pending:
+                    cache_keys = {
+                        prompt: self.__get_cache_key(api_name, prompt)
+                        for uuid, prompt in pending
+                    }
+                    cached = response_cache.get_many(
+                        LLM_CACHE_NAMESPACE, list(set(cache_keys.values()))
+                    )
+                    cached_responses = []
+                    uncached = []
+                    for uuid, prompt in pending:
+                        hit = self.__from_cache(
+                            cached.get(cache_keys[prompt]), label_meta_names
                         )
-                        for uuid in uuids:
-                            invalid_responses.append((uuid, e))
-                    except openai.error.RateLimitError as e:
-                        trials_left -= 1
-                        if trials_left == 0:
-                            print(
-                                "-------------------\nEncounted an error during call to OpenAI for uuids: {}\nRetried call to OpenAI {} number of times. \nError Message from OpenAI: {}.\n".format(
-                                    uuids, num_retrials, e
-                                )
-                            )
-                            for uuid in uuids:
-                                invalid_responses.append((uuid, e))
-                        else:
-                            q.put(trials_left)
-                    except openai.error.Timeout as e:
-                        trials_left -= 1
-                        if trials_left == 0:
-                            print(
-                                "-------------------\nEncounted an error during call to OpenAI for uuids: {}\nRetried call to OpenAI {} number of times. \nError Message from OpenAI: {}.\n".format(
-                                    uuids, num_retrials, e
-                                )
-                            )
-                            for uuid in uuids:
-                                invalid_responses.append((uuid, e))
+                        if hit is None:
+                            uncached.append((uuid, prompt))
                         else:
-                            q.put(trials_left)
-                    except openai.error.InvalidRequestError as e:
-                        print("--------------------------")
-                        print(
-                            'Encounted an error during call to OpenAI for uuids: {}\nError Message from OpenAI: "{}"'.format(
-                                uuids, e
-                            )
-                        )
-                        for uuid in uuids:
-                            invalid_responses.append((uuid, e))
-                    except openai.error.ServiceUnavailableError as e:
-                        print("--------------------------")
-                        print(
-                            'Encounted an error during call to OpenAI for uuids: {}\nError Message from OpenAI: "{}"'.format(
-                                uuids, e
-                            )
+                            cached_responses.append((uuid, *hit))
+                    counts["cache"] += len(cached_responses)
+                    if checkpoint is not None:
+                        checkpoint.add_responses(cached_responses)
+                    known += cached_responses
+                    pending = uncached
+                if known:
+                    yield known, []
+                for i in range(0, len(pending), batch_size):
+                    yield [], pending[i : i + batch_size]
+
+        def call(work_item):
+            known, prompt_batch = work_item
+            if not prompt_batch:
+                return known, []
+            responses, errors = self.__call_with_retries(
+                prompt_batch, num_retrials, api_name, label_meta_names, limiter
+            )
+            # only answers to single-prompt requests are cached: a batched
+            # answer came from a different request text and configuration
+            single_prompt_responses = responses if len(prompt_batch) == 1 else []
+            if len(prompt_batch) > 1 and not errors:
+                # records whose batched answer could not be parsed are sent
+                # again on their own
+                answered = {uuid for uuid, response, metadata in responses}
+                for uuid, prompt in prompt_batch:
+                    if uuid not in answered:
+                        single_responses, single_errors = self.__call_with_retries(
+                            [(uuid, prompt)],
+                            num_retrials,
+                            api_name,
+                            label_meta_names,
+                            limiter,
                         )
-                        for uuid in uuids:
-                            invalid_responses.append((uuid, e))
-                        invalid_responses.append((uuid, e))
-                    except Exception as e:
-                        print("--------------------------")
-                        print(
-                            "Encounted an unknown error during call to OpenAI for uuids: {}\n".format(
-                                uuids, e
-                            )
+                        responses += single_responses
+                        errors += single_errors
+                        single_prompt_responses += single_responses
+            if cache == "read_write":
+                batch_prompts = dict(prompt_batch)
+                response_cache.put_many(
+                    LLM_CACHE_NAMESPACE,
+                    [
+                        (
+                            self.__get_cache_key(api_name, batch_prompts[uuid]),
+                            "",
+                            [response, metadata],
                         )
-                        for uuid in uuids:
-                            invalid_responses.append((uuid, e))
+                        for uuid, response, metadata in single_prompt_responses
+                    ],
+                )
+            if checkpoint is not None:
+                checkpoint.add_responses(responses)
+            return responses, errors
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+                with tqdm_notebook(
+                    desc="Progress",
+                    total=len(prompts) if hasattr(prompts, "__len__") else None,
+                ) as progress:
+                    # results come back in prompt order, each tagged with its uuid
+                    for batch_responses, batch_errors in bounded_imap(
+                        executor, call, work_items(), 2 * max_concurrency
+                    ):
+                        counts["responses"] += len(batch_responses)
+                        counts["errors"] += len(batch_errors)
+                        progress.update(len(batch_responses) + len(batch_errors))
+                        yield batch_responses, batch_errors
+        finally:
+            if response_cache is not None:
+                response_cache.close()
         print(
             "Time taken to obtain responses from LLM: {} seconds".format(
                 round(time.time() - start, 2)
             )
         )
-        self.responses = responses
-        self.invalid_responses = invalid_responses
+        if checkpoint is not None:
+            print("Responses found in checkpoint: {}".format(counts["checkpoint"]))
+        if cache != "off":
+            print("Responses found in cache: {}".format(counts["cache"]))
 
+        num_prompts = max(counts["prompts"], 1)
         table = [
             [
                 "Valid reponses",
-                len(responses),
-                100 * round(len(responses) / len(prompts), 4),
+                counts["responses"],
+                100 * round(counts["responses"] / num_prompts, 4),
             ],
             [
                 "Encountered API errors",
-                len(prompts) - len(responses),
-                100 * round(len(invalid_responses) / len(prompts), 4),
+                counts["errors"],
+                100 * round(counts["errors"] / num_prompts, 4),
             ],
         ]
         print(tabulate(table, headers=["", "Count", "%"], tablefmt="rounded_outline"))
 
+    def __get_cache_key(self, api_name, prompt):
+        """
+        Content hash identifying a prompt sent to the given API with the
+        job's model configuration. Unset parameters and key order do not
+        change the hash.
+        """
+        model_config = {
+            key: value for key, value in self.model_config.items() if value is not None
+        }
+        content = json.dumps(
+            {
+                "api": "openai:" + api_name,
+                "model_config": model_config,
+                "prompt": prompt,
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def __from_cache(entry, label_meta_names):
+        """
+        (response, metadata) of a cache entry, or None if there is no entry
+        or it lacks some of the requested label metadata.
+        """
+        if entry is None:
+            return None
+        response, metadata = entry[1]
+        if isinstance(metadata, list):
+            names = {meta["metadata_name"] for meta in metadata}
+            if not names.issuperset(label_meta_names):
+                return None
+            metadata = [
+                meta for meta in metadata if meta["metadata_name"] in label_meta_names
+            ]
+        return response, metadata
+
+    def __call_with_retries(
+        self, prompt_batch, num_retrials, api_name, label_meta_names, limiter
+    ):
+        """
+        Call OpenAI for a batch of (uuid, prompt) pairs, retrying rate limit
+        errors and timeouts with backoff.
+
+        Returns
+        -------
+        responses : list
+            (uuid, response, metadata) tuples
+        invalid_responses : list
+            (uuid, error) tuples
+        """
+        uuids = [uuid for uuid, prompt in prompt_batch]
+        label = "uuid" if len(uuids) == 1 else "uuids"
+        target = uuids[0] if len(uuids) == 1 else uuids
+        tokens = sum(estimate_tokens(prompt) for uuid, prompt in prompt_batch)
+        tokens += (self.model_config.get("max_tokens") or 0) * len(prompt_batch)
+        trials_left = num_retrials
+        while True:
+            limiter.acquire(tokens)
+            try:
+                return self.__call_api(prompt_batch, api_name, label_meta_names), []
+            except (openai.error.RateLimitError, openai.error.Timeout) as e:
+                trials_left -= 1
+                if trials_left <= 0:
+                    print(
+                        "-------------------\nEncounted an error during call to OpenAI for {}: {}\nRetried call to OpenAI {} number of times. \nError Message from OpenAI: {}.\n".format(
+                            label, target, num_retrials, e
+                        )
+                    )
+                    return [], [(uuid, e) for uuid in uuids]
+                # back off with jitter so concurrent callers do not retry in step
+                time.sleep(
+                    random.uniform(0.5, 1.0) * min(2 ** (num_retrials - trials_left), 30)
+                )
+            except (
+                openai.error.AuthenticationError,
+                openai.error.APIError,
+                openai.error.APIConnectionError,
+                openai.error.InvalidRequestError,
+                openai.error.ServiceUnavailableError,
+            ) as e:
+                print("--------------------------")
+                print(
+                    'Encounted an error during call to OpenAI for {}: {}\nError Message from OpenAI: "{}"'.format(
+                        label, target, e
+                    )
+                )
+                return [], [(uuid, e) for uuid in uuids]
+            except Exception as e:
+                print("--------------------------")
+                print(
+                    "Encounted an unknown error during call to OpenAI for {}: {} - {}\n".format(
+                        label, target, e
+                    )
+                )
+                return [], [(uuid, e) for uuid in uuids]
+
+    def __call_api(self, prompt_batch, api_name, label_meta_names):
+        """
+        Send one request for a batch of (uuid, prompt) pairs. The request
+        configuration is built per call, so concurrent calls share no state.
+
+        Returns
+        -------
+        responses : list
+            (uuid, response, metadata) tuples
+        """
+        uuids = [uuid for uuid, prompt in prompt_batch]
+        prompts = [prompt for uuid, prompt in prompt_batch]
+        if api_name == "completions":
+            if len(prompt_batch) == 1:
+                completion = openai.Completion.create(
+                    prompt=prompts[0], **self.model_config
+                )
+                response = completion["choices"][0]["text"]
+                return [(uuids[0], response.strip(), [])]
+            response_batch = openai.Completion.create(
+                prompt=prompts, **self.model_config
+            )
+            responses = []
+            for choice in response_batch.choices:
+                confidence_score = np.mean(np.exp(choice.logprobs.token_logprobs))
+                responses.append(
+                    (uuids[choice.index], choice.text.strip(), confidence_score)
+                )
+            return responses
+        elif api_name == "chat":
+            if len(prompt_batch) > 1:
+                return self.__call_chat_batch(prompt_batch, label_meta_names)
+            openai_response = openai.ChatCompletion.create(
+                **{
+                    **self.model_config,
+                    "messages": [{"role": "user", "content": prompts[0]}],
+                }
+            )
+            metadata_list = self.__get_metadata_list(openai_response, label_meta_names)
+            response = openai_response.choices[0]["message"]["content"]
+            return [(uuids[0], response.strip(), metadata_list)]
+        return []
+
+    def __call_chat_batch(self, prompt_batch, label_meta_names):
+        """
+        Send several prompts to the chat API as numbered tasks of one message
+        and split the JSON answer back per uuid. Records whose answer is
+        missing or cannot be parsed are left out of the result.
+
+        Returns
+        -------
+        responses : list
+            (uuid, response, metadata) tuples
+        """
+        tasks = "\n\n".join(
+            "### Task {}\n{}".format(index + 1, prompt)
+            for index, (uuid, prompt) in enumerate(prompt_batch)
+        )
+        config = {
+            **self.model_config,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": BATCH_PROMPT.format(len(prompt_batch)) + tasks,
+                }
+            ],
+        }
+        if config.get("max_tokens"):
+            # the answers of all tasks share one completion
+            config["max_tokens"] = config["max_tokens"] * len(prompt_batch)
+        openai_response = openai.ChatCompletion.create(**config)
+        answers = self.__split_batch_response(
+            openai_response.choices[0]["message"]["content"], len(prompt_batch)
+        )
+        responses = []
+        for index, (uuid, prompt) in enumerate(prompt_batch):
+            if index + 1 in answers:
+                metadata_list = self.__get_metadata_list(
+                    openai_response, label_meta_names, answers[index + 1]
+                )
+                responses.append((uuid, answers[index + 1], metadata_list))
+        return responses
+
+    @staticmethod
+    def __split_batch_response(content, num_tasks):
+        """
+        Parse the answer to a batched chat prompt into {task number: answer}.
+        Answers given as JSON objects are serialized back to JSON text, as
+        they would be returned for a single prompt.
+        """
+        start = content.find("{")
+        end = content.rfind("}")
+        if start == -1 or end < start:
+            return {}
+        try:
+            parsed = json.loads(content[start : end + 1])
+        except ValueError:
+            return {}
+        if not isinstance(parsed, dict):
+            return {}
+        answers = {}
+        for key, value in parsed.items():
+            match = re.search(r"\d+", str(key))
+            if match is None or not 1 <= int(match.group()) <= num_tasks:
+                continue
+            if isinstance(value, (dict, list)):
+                answers[int(match.group())] = json.dumps(value)
+            elif value is not None:
+                answers[int(match.group())] = str(value).strip()
+        return answers
+
+    def __get_metadata_list(self, openai_response, label_meta_names, content=None):
+        """
+        Label metadata of a response. `content` is the part of a batched
+        response that belongs to one record; only its length is measured
+        separately, the confidence score is that of the whole response.
+        """
+        metadata_list = []
+        for label_meta_name in label_meta_names:
+            if label_meta_name == "length" and content is not None:
+                metadata_value = len(content)
+            else:
+                func = getattr(self, self.label_meta_func_map[label_meta_name])
+                metadata_value = func(openai_response)
+            metadata_list.append(
+                {"metadata_name": label_meta_name, "metadata_value": metadata_value}
+            )
+        return metadata_list
+
     def extract(self, uuid, response, fuzzy_extraction):
         """
         Helper function for post-processing. Extracts the label (name and value) from the OpenAI response
@@ -698,9 +998,21 @@ class OpenAIJob:
         """
         print("\nPost-processing [{}] response(s) :::".format(len(self.responses)))
 
-        responses = self.responses
-        self.invalid_option_counter = Counter()
+        self.reset_annotation_summary()
         annotations = []
+        for uuid, response, metadata_list in self.responses:
+            label = self.get_annotation(uuid, response, metadata_list, fuzzy_extraction)
+            if label is not None:
+                annotations.append((uuid, label))
+        self.annotations = annotations
+        self.print_annotation_summary(len(self.responses), len(annotations))
+
+    def reset_annotation_summary(self):
+        """
+        Reset the label distribution and invalid option counts collected by
+        `get_annotation`.
+        """
+        self.invalid_option_counter = Counter()
         self.label_distribution = {}
         for label_key in self.label_dic:
             for key in self.label_dic[label_key]["options"]:
@@ -708,58 +1020,83 @@ class OpenAIJob:
                     self.label_dic[label_key]["text_to_value"][key]
                 ] = 0
 
-        for uuid, response, metadata_list in responses:
-            # extract, format, validate responses
-            label_responses = self.extract(uuid, response, fuzzy_extraction)
-            if len(label_responses) == 0:
-                continue
-            self.uuids_with_valid_annotations.append(uuid)
-            # assume only one label in label_dic
-            # todo: fix label level should be dependent on parsed label name
-            label_name = list(self.label_dic.keys())[0]
-            label_level = self.label_dic[label_name]["level"]
-            if label_level == "record":
-                label = {"labels_record": []}
-                for label_name, response in label_responses.items():
-                    label_value = self.label_dic[label_name]["text_to_value"][response]
-                    label["labels_record"].append(
-                        {
-                            "label_name": label_name,
-                            "label_level": label_level,
-                            "label_value": [label_value],
-                            "metadata_list": metadata_list,
-                        }
-                    )
-                    self.label_distribution[label_value] += 1
-            else:
-                label = {"labels_span": []}
-                for label_name, response in label_responses.items():
-                    label_value = self.label_dic[label_name]["text_to_value"][
-                        response["label_response"]
-                    ]
-                    label["labels_span"].append(
-                        {
-                            "label_name": label_name,
-                            "label_level": label_level,
-                            "label_value": [label_value],
-                            "start_idx": response["start_idx"],
-                            "end_idx": response["end_idx"],
-                        }
-                    )
-                    self.label_distribution[label_value] += 1
-            annotations.append((uuid, label))
-        self.annotations = annotations
+    def get_annotation(self, uuid, response, metadata_list, fuzzy_extraction=False):
+        """
+        Extract, format and validate one response. Call `reset_annotation_summary`
+        before the first response of a job.
+
+        Parameters
+        ----------
+        uuid : str
+            Record uuid
+        response : str
+            Output from OpenAI
+        metadata_list : list
+            Label metadata of the response
+        fuzzy_extraction: bool
+            Set to True if fuzzy extraction desired in post processing
+
+        Returns
+        -------
+        label : dict
+            Annotation in format required by Labeler, None if no valid label
+            could be extracted
+        """
+        label_responses = self.extract(uuid, response, fuzzy_extraction)
+        if len(label_responses) == 0:
+            return None
+        self.uuids_with_valid_annotations.append(uuid)
+        # assume only one label in label_dic
+        # todo: fix label level should be dependent on parsed label name
+        label_name = list(self.label_dic.keys())[0]
+        label_level = self.label_dic[label_name]["level"]
+        if label_level == "record":
+            label = {"labels_record": []}
+            for label_name, response in label_responses.items():
+                label_value = self.label_dic[label_name]["text_to_value"][response]
+                label["labels_record"].append(
+                    {
+                        "label_name": label_name,
+                        "label_level": label_level,
+                        "label_value": [label_value],
+                        "metadata_list": metadata_list,
+                    }
+                )
+                self.label_distribution[label_value] += 1
+        else:
+            label = {"labels_span": []}
+            for label_name, response in label_responses.items():
+                label_value = self.label_dic[label_name]["text_to_value"][
+                    response["label_response"]
+                ]
+                label["labels_span"].append(
+                    {
+                        "label_name": label_name,
+                        "label_level": label_level,
+                        "label_value": [label_value],
+                        "start_idx": response["start_idx"],
+                        "end_idx": response["end_idx"],
+                    }
+                )
+                self.label_distribution[label_value] += 1
+        return label
 
+    def print_annotation_summary(self, num_responses, num_annotations):
+        """
+        Print extraction counts and the label distribution.
+        """
+        label_name = list(self.label_dic.keys())[0]
+        denominator = max(num_responses, 1)
         table = [
             [
                 "Valid annotations",
-                len(annotations),
-                100 * round(len(annotations) / len(responses), 4),
+                num_annotations,
+                100 * round(num_annotations / denominator, 4),
             ],
             [
                 "Encountered extraction errors",
-                len(responses) - len(annotations),
-                100 * round((len(responses) - len(annotations)) / len(responses), 4),
+                num_responses - num_annotations,
+                100 * round((num_responses - num_annotations) / denominator, 4),
             ],
         ]
         print(tabulate(table, headers=["", "Count", "%"], tablefmt="rounded_outline"))
@@ -1,8 +1,9 @@
 import time
 
-from labeler_client.constants import DNS_NAME, SERVICE_ENDPOINTS
+from labeler_client.constants import (DEFAULT_POOL_SIZE, DNS_NAME,
+                                      SERVICE_ENDPOINTS)
 from labeler_client.helpers import (delete_request, get_request, post_request,
-                                    put_request)
+                                    put_request, requests_retry_session)
 
 
 class Project:
@@ -10,7 +11,12 @@ class Project:
     [Megagon-only] Methods for managing multi-project domains; with interfaces to create, list, archieve and restore projects.
     """
 
-    def __init__(self, project='base', host=None, token='', auth=None):
+    def __init__(self,
+                 project='base',
+                 host=None,
+                 token='',
+                 auth=None,
+                 pool_size=DEFAULT_POOL_SIZE):
         if host is not None:
             if project is None or len(project) == 0:
                 raise Exception("Project cannot be None or empty.")
@@ -23,6 +29,20 @@ class Project:
         self.auth = auth
         self.host = host
         self.project_exists = False
+        self.pool_size = pool_size
+        self.session = requests_retry_session(pool_size=pool_size)
+
+    def close(self):
+        """
+        Close the shared HTTP session and release pooled connections.
+        """
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def get_service_endpoint(self, key=None):
         dns_name = DNS_NAME
@@ -48,7 +68,7 @@ class Project:
         payload = self.get_base_payload()
         payload.update({'stack_id': stack_id})
         path = self.get_service_endpoint('get_project_stack_status')
-        response = get_request(path=path, json=payload)
+        response = get_request(path=path, json=payload, session=self.session)
         if response.status_code == 200:
             return response.json()
         else:
@@ -58,7 +78,7 @@ class Project:
         payload = self.get_base_payload()
         payload.update({'project_name': name})
         path = self.get_service_endpoint('create_project')
-        response = post_request(path=path, json=payload)
+        response = post_request(path=path, json=payload, session=self.session)
         if response.status_code == 200:
             return response.json()
         else:
@@ -69,7 +89,7 @@ class Project:
         payload.update({'id': id})
         path = self.get_service_endpoint('restore_project').format(
             project_id=id)
-        response = put_request(path=path, json=payload)
+        response = put_request(path=path, json=payload, session=self.session)
         if response.status_code == 200:
             return response.json()
         else:
@@ -80,7 +100,7 @@ class Project:
         payload.update({'id': id})
         path = self.get_service_endpoint('archive_project').format(
             project_id=id)
-        response = delete_request(path=path, json=payload)
+        response = delete_request(path=path, json=payload, session=self.session)
         if response.status_code == 200:
             return response.json()
         else:
@@ -90,7 +110,7 @@ class Project:
         payload = self.get_base_payload()
         payload.update({'archived': archived})
         path = self.get_service_endpoint('get_projects')
-        response = get_request(path=path, json=payload)
+        response = get_request(path=path, json=payload, session=self.session)
         if response.status_code == 200:
             result = response.json()
             for i in range(len(result)):
@@ -42,7 +42,7 @@ class Schema:
         payload = self.__service.get_base_payload()
         payload['schemas'] = schemas
         path = self.__service.get_service_endpoint('set_schemas')
-        response = post_request(path, json=payload)
+        response = post_request(path, json=payload, session=self.__service.session)
         if response.status_code == 200:
             return response.json()
         else:
@@ -61,7 +61,7 @@ class Schema:
         payload = self.__service.get_base_payload()
         payload['active'] = active
         path = self.__service.get_service_endpoint('get_schemas')
-        response = get_request(path, json=payload)
+        response = get_request(path, json=payload, session=self.__service.session)
         if response.status_code == 200:
             return response.json()
         else:
@@ -1,24 +1,74 @@
 import asyncio
+import functools
+import hashlib
+import itertools
 import json
 import math
+import os
 import time
-import warnings
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
 
 import httpx
+import numpy as np
 import pandas as pd
 import pydash
 from tqdm import tqdm
 
+from labeler_client.annotation_buffer import AnnotationBuffer
 from labeler_client.authentication import Authentication
-from labeler_client.constants import (DEFAULT_LIST_LIMIT, DNS_NAME,
-                                      HTTPX_LIMITS, REQUEST_TIMEOUT_SECONDS,
-                                      SERVICE_ENDPOINTS)
-from labeler_client.helpers import get_request, post_request
+from labeler_client.cache import DiskCache, ResponseCache
+from labeler_client.constants import (
+    DEFAULT_LIST_LIMIT,
+    DEFAULT_POOL_SIZE,
+    DISK_CACHE_MAX_BYTES,
+    DNS_NAME,
+    EXPORT_COLUMNS,
+    HTTPX_LIMITS,
+    MAX_PAYLOAD_BYTES,
+    REQUEST_TIMEOUT_SECONDS,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_TTL_SECONDS,
+    SERVICE_ENDPOINTS,
+)
+from labeler_client.helpers import (
+    bounded_imap,
+    chunk_by_payload_size,
+    filter_import_columns,
+    get_request,
+    is_connect_error,
+    post_request,
+    requests_retry_session,
+    search_filter,
+    summarize_import,
+)
 from labeler_client.schema import Schema
 from labeler_client.statistic import Statistic
 from labeler_client.subset import Subset
 
 
+def compute_metadata_batch(func, data_batch, batched=False):
+    """
+    Compute stage of `Service.set_metadata`; module-level so it can run in
+    a process pool. NumPy values are converted to plain lists/scalars so
+    the batch stays JSON serializable.
+    """
+    if batched:
+        values = func([item["record_content"] for item in data_batch])
+        if len(values) != len(data_batch):
+            raise Exception(
+                f"Batched metadata function returned {len(values)} values for {len(data_batch)} records."
+            )
+    else:
+        values = [func(item["record_content"]) for item in data_batch]
+    for item, value in zip(data_batch, values):
+        if isinstance(value, (np.ndarray, np.generic)):
+            value = value.tolist()
+        item["value"] = value
+    return data_batch
+
+
 class Service:
     """
     Service objects communicate to back-end Labeler services and establish
@@ -27,7 +77,15 @@ class Service:
 
     """
 
-    def __init__(self, host=None, project=None, token=None, auth=None, port=5000):
+    def __init__(
+        self,
+        host=None,
+        project=None,
+        token=None,
+        auth=None,
+        port=5000,
+        pool_size=DEFAULT_POOL_SIZE,
+    ):
         """
         Init function
 
@@ -44,6 +102,9 @@ class Service:
         auth : Authentication
             [Megagon-only] Labeler-ui authentication object.
             Can be skipped if valid token is provided.
+        pool_size : int, optional
+            Maximum number of keep-alive connections held by the
+            service's shared HTTP session.
         """
         if pydash.is_empty(project):
             raise Exception("Project cannot be None or empty.")
@@ -56,8 +117,15 @@ class Service:
         self.host = host
         self.user = None
         self.version = None
+        self.__unsupported_endpoints = set()
+        self.disk_cache = None
+        self.response_cache = None
+        self.pool_size = pool_size
+        self.session = requests_retry_session(pool_size=pool_size)
         response = get_request(
-            path=self.get_service_endpoint() + "?url_check=1", timeout=5
+            path=self.get_service_endpoint() + "?url_check=1",
+            timeout=5,
+            session=self.session,
         )
         if response.status_code == 200:
             self.version = pydash.objects.get(response.json(), "version", None)
@@ -67,6 +135,210 @@ class Service:
     def get_version(self):
         return self.version
 
+    def close(self):
+        """
+        Close the shared HTTP session and release pooled connections.
+        """
+        self.session.close()
+        self.disable_disk_cache()
+
+    def enable_disk_cache(self, path=None, max_bytes=DISK_CACHE_MAX_BYTES):
+        """
+        Keep fetched annotations and record views in an on-disk cache shared
+        across sessions. Cached records are revalidated against their
+        back-end version on every use, and only stale or missing records are
+        downloaded again.
+
+        Parameters
+        -------
+        path : str, optional
+            Location of the SQLite cache file.
+            Defaults to `~/.cache/labeler_client/cache.sqlite3`.
+        max_bytes : int
+            Size limit of the cache; least recently used records are evicted
+            beyond it.
+        """
+        self.disable_disk_cache()
+        self.disk_cache = DiskCache(path=path, max_bytes=max_bytes)
+        return self.disk_cache
+
+    def disable_disk_cache(self):
+        """
+        Stop using the on-disk cache. Stored entries are kept on disk.
+        """
+        if self.disk_cache is not None:
+            self.disk_cache.close()
+            self.disk_cache = None
+
+    def enable_response_cache(
+        self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl=RESPONSE_CACHE_TTL_SECONDS
+    ):
+        """
+        Cache the responses of `search`, `Subset.get_view_record` and
+        `Subset.get_view_annotation` in memory, keyed by endpoint and
+        request arguments. The cache is cleared whenever this service writes
+        to the project.
+
+        Parameters
+        -------
+        max_entries : int
+            Maximum number of cached responses; least recently used ones
+            are dropped first.
+        ttl : float
+            Seconds a cached response stays valid.
+        """
+        self.response_cache = ResponseCache(max_entries=max_entries, ttl=ttl)
+        return self.response_cache
+
+    def disable_response_cache(self):
+        """
+        Stop caching responses in memory.
+        """
+        self.response_cache = None
+
+    def get_response_cache_stats(self):
+        """
+        Get the hit and miss counters and size of the response cache, or
+        None if it is disabled.
+        """
+        if self.response_cache is None:
+            return None
+        return self.response_cache.stats()
+
+    def invalidate_response_cache(self):
+        """
+        Drop cached responses; called after every write to the project.
+        """
+        if self.response_cache is not None:
+            self.response_cache.invalidate()
+
+    def cached_response(self, endpoint, payload, fetch):
+        """
+        Return the response of `fetch()` for a read request, through the
+        response cache if enabled.
+
+        Parameters
+        -------
+        endpoint : str
+            Endpoint name of the request.
+        payload : dict
+            Request arguments; the token is ignored.
+        fetch : callable
+            Sends the request and returns its result.
+        """
+        if self.response_cache is None:
+            return fetch()
+        canonical = json.dumps(
+            {key: value for key, value in payload.items() if key != "token"},
+            sort_keys=True,
+            default=str,
+        )
+        key = f"{endpoint}:{hashlib.sha1(canonical.encode('utf-8')).hexdigest()}"
+        return self.response_cache.get_or_fetch(key, fetch)
+
+    def get_data_versions(self, uuid_list=[], max_workers=4):
+        """
+        Get the current version of each record, which changes whenever the
+        record, its metadata or its annotations change.
+
+        Parameters
+        -------
+        uuid_list : list
+            List of data uuids.
+        max_workers : int
+            Number of requests in flight.
+
+        Returns
+        -------
+        versions : dict
+            Version by record uuid, or None if the back-end does not expose
+            record versions.
+        """
+        if "get_data_versions" in self.__unsupported_endpoints:
+            return None
+
+        def get_batch(uuids):
+            payload = self.get_base_payload()
+            payload.update({"uuid_list": uuids})
+            response = get_request(
+                self.get_service_endpoint("get_data_versions"),
+                json=payload,
+                session=self.session,
+            )
+            if response.status_code in (404, 405):
+                return None
+            if response.status_code == 200:
+                return response.json()
+            raise Exception(response.text)
+
+        versions = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for batch in bounded_imap(
+                executor, get_batch, chunk_by_payload_size(uuid_list), max_workers
+            ):
+                if batch is None:
+                    self.__unsupported_endpoints.add("get_data_versions")
+                    return None
+                versions.update(batch)
+        return versions
+
+    def fetch_cached(self, view, uuid_list, fetch):
+        """
+        Fetch per-record items through the on-disk cache. Without a cache, or
+        when the back-end does not expose record versions, `fetch` is called
+        for the whole list.
+
+        Parameters
+        -------
+        view : str
+            Name of the view the items come from, including any arguments
+            that change their content.
+        uuid_list : list
+            List of data uuids.
+        fetch : callable
+            Called with a list of uuids, returns the items (dicts with a
+            `uuid` field) of those records.
+
+        Returns
+        -------
+        items : list
+            Items in the order of `uuid_list`.
+        """
+        if self.disk_cache is None or pydash.is_empty(uuid_list):
+            return fetch(uuid_list)
+        versions = self.get_data_versions(uuid_list)
+        if versions is None:
+            return fetch(uuid_list)
+        namespace = f"{self.get_service_endpoint()}/{view}"
+        cached = self.disk_cache.get_many(namespace, uuid_list)
+        items = {
+            uuid: value
+            for uuid, (version, value) in cached.items()
+            if versions.get(uuid) is not None and version == str(versions[uuid])
+        }
+        stale = [uuid for uuid in uuid_list if uuid not in items]
+        if stale:
+            fetched = fetch(stale)
+            self.disk_cache.put_many(
+                namespace,
+                [
+                    (item["uuid"], versions[item["uuid"]], item)
+                    for item in fetched
+                    if versions.get(item.get("uuid")) is not None
+                ],
+            )
+            if len(stale) == len(uuid_list):
+                return fetched
+            for item in fetched:
+                items[item.get("uuid")] = item
+        return [items[uuid] for uuid in uuid_list if uuid in items]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def show(self, config={}):
         """
         Show project management dashboard in a floating dashboard.
@@ -146,7 +418,7 @@ class Service:
             path = self.get_service_endpoint("get_users_by_uids")
             payload = self.get_base_payload()
             payload.update({"uids": uids})
-            response = get_request(path, json=payload)
+            response = get_request(path, json=payload, session=self.session)
             if response.status_code == 200:
                 return response.json()
             else:
@@ -166,7 +438,7 @@ class Service:
             if not pydash.is_empty(token):
                 path = self.get_service_endpoint("get_user")
                 payload = self.get_base_payload()
-                response = post_request(path, json=payload)
+                response = post_request(path, json=payload, session=self.session)
                 if response.status_code == 200:
                     parsed_result = response.json()
                 else:
@@ -189,6 +461,7 @@ class Service:
         label_condition=None,
         label_metadata_condition=None,
         verification_condition=None,
+        lazy=False,
     ):
         """
         Search the back-end database based on user-provided predicates.
@@ -227,40 +500,279 @@ class Service:
             verification condition of the annotation.
             {"label_name": # name of the associated label
              "search_mode":"ALL"|"UNVERIFIED"|"VERIFIED"}
+        lazy: bool
+            If False, the search is sent right away. If True, it is sent
+            only when the subset's records are first needed, so set
+            operations between lazy search results (`&`, `|`, `-`) can be
+            sent to the back-end as one compound query (see `run_query`).
+            A lazy search reports errors at first use rather than here, and
+            reflects the project at that time rather than at this call.
 
         Returns
         -------
         subset : Subset
             Subset meeting the search conditions.
         """
+        if not lazy:
+            return Subset(
+                service=self,
+                data_uuids=self.__search_uuids(
+                    limit=limit,
+                    skip=skip,
+                    uuid_list=uuid_list,
+                    keyword=keyword,
+                    regex=regex,
+                    record_metadata_condition=record_metadata_condition,
+                    annotator_list=annotator_list,
+                    label_condition=label_condition,
+                    label_metadata_condition=label_metadata_condition,
+                    verification_condition=verification_condition,
+                ),
+            )
+        filter = search_filter(
+            limit=limit,
+            skip=skip,
+            uuid_list=uuid_list,
+            keyword=keyword,
+            regex=regex,
+            record_metadata_condition=record_metadata_condition,
+            annotator_list=annotator_list,
+            label_condition=label_condition,
+            label_metadata_condition=label_metadata_condition,
+            verification_condition=verification_condition,
+        )
+        return Subset(service=self, query={"search": filter})
+
+    def __search_uuids(
+        self,
+        limit=DEFAULT_LIST_LIMIT,
+        skip=0,
+        uuid_list=None,
+        keyword=None,
+        regex=None,
+        record_metadata_condition=None,
+        annotator_list=None,
+        label_condition=None,
+        label_metadata_condition=None,
+        verification_condition=None,
+    ):
+        """
+        Send a search request and return the list of matching record uuids.
+        See `search` for parameters.
+        """
         payload = self.get_base_payload()
-        filter = {
-            "limit": limit,
-            "skip": skip,
-        }
-        if keyword is not None:
-            filter["keyword"] = keyword
-        if uuid_list is not None:
-            filter["uuid_list"] = uuid_list
-        if regex is not None:
-            filter["regex"] = regex
-        if record_metadata_condition is not None:
-            filter["record_metadata_condition"] = record_metadata_condition
-        if annotator_list is not None:
-            filter["annotator_list"] = annotator_list
-        if label_condition is not None:
-            filter["label_condition"] = label_condition
-        if label_metadata_condition is not None:
-            filter["label_metadata_condition"] = label_metadata_condition
-        if verification_condition is not None:
-            filter["verification_condition"] = verification_condition
-        payload.update(filter)
+        payload.update(
+            search_filter(
+                limit=limit,
+                skip=skip,
+                uuid_list=uuid_list,
+                keyword=keyword,
+                regex=regex,
+                record_metadata_condition=record_metadata_condition,
+                annotator_list=annotator_list,
+                label_condition=label_condition,
+                label_metadata_condition=label_metadata_condition,
+                verification_condition=verification_condition,
+            )
+        )
         path = self.get_service_endpoint("search")
-        response = get_request(path, json=payload)
-        if response.status_code == 200:
-            return Subset(data_uuids=response.json(), service=self)
-        else:
-            raise Exception(response.text)
+
+        def fetch():
+            response = get_request(path, json=payload, session=self.session)
+            if response.status_code == 200:
+                return response.json()
+            else:
+                raise Exception(response.text)
+
+        return self.cached_response("search", payload, fetch)
+
+    def run_query(self, query):
+        """
+        Evaluate a subset query expression and return the matching record
+        uuids. A query is either a search `{"search": filter}`, with the
+        filter fields of `search`, a known list of records
+        `{"uuid_list": [...]}`, or a set operation
+        `{"operator": "and"|"or"|"difference", "operands": [query, ...]}`.
+        Set operations between searches only are sent to the back-end as one
+        compound request; if it does not support them, the searches are run
+        one by one and combined here. Operations with a record list operand
+        are always combined here, with their search operands still grouped
+        into one compound request, so record lists are never sent back to the
+        back-end. Operations that
+        are empty because of an empty operand are not sent at all.
+
+        Parameters
+        ------
+        query : dict
+            Query expression, as returned by `Subset.get_query`.
+
+        Returns
+        -------
+        uuid_list : list
+            Matching record uuids, in the order of the first operand.
+        """
+        if "uuid_list" in query:
+            return list(query["uuid_list"])
+        if "search" in query:
+            return self.__search_uuids(**query["search"])
+        if query["operator"] not in ("or", "and", "difference"):
+            raise Exception(f"Unknown query operator '{query['operator']}'.")
+        if self.__is_empty_query(query):
+            return []
+        if (
+            self.__is_search_only(query)
+            and "search_compound" not in self.__unsupported_endpoints
+        ):
+            payload = self.get_base_payload()
+            payload.update({"query": query})
+            path = self.get_service_endpoint("search_compound")
+
+            def fetch():
+                response = get_request(path, json=payload, session=self.session)
+                if response.status_code in (404, 405):
+                    return None
+                if response.status_code == 200:
+                    return response.json()
+                raise Exception(response.text)
+
+            uuids = self.cached_response("search_compound", payload, fetch)
+            if uuids is not None:
+                return uuids
+            self.__unsupported_endpoints.add("search_compound")
+        uuids = None
+        for operand in self.__group_searches(query):
+            if uuids is not None and len(uuids) == 0 and query["operator"] != "or":
+                # nothing left to intersect with or subtract from
+                break
+            result = self.run_query(operand)
+            if uuids is None:
+                uuids = dict.fromkeys(result)
+            elif query["operator"] == "or":
+                uuids.update(dict.fromkeys(result))
+            elif query["operator"] == "and":
+                keep = set(result)
+                uuids = {uuid: None for uuid in uuids if uuid in keep}
+            else:
+                drop = set(result)
+                uuids = {uuid: None for uuid in uuids if uuid not in drop}
+        return list(uuids or [])
+
+    def __group_searches(self, query):
+        """
+        Operands of a set operation with its search-only operands grouped
+        into one operation, so that they can still be sent as one compound
+        request when other operands are record lists. The subtracted
+        operands of a difference are grouped into their union.
+        """
+        operands = query["operands"]
+        first = []
+        if query["operator"] == "difference":
+            first, operands = operands[:1], operands[1:]
+        searches = [operand for operand in operands if self.__is_search_only(operand)]
+        if len(searches) < 2 or len(searches) == len(operands):
+            return query["operands"]
+        operator = "or" if query["operator"] == "difference" else query["operator"]
+        position = next(i for i, op in enumerate(operands) if self.__is_search_only(op))
+        others = [operand for operand in operands if not self.__is_search_only(operand)]
+        others.insert(position, {"operator": operator, "operands": searches})
+        return first + others
+
+    def __is_search_only(self, query):
+        """
+        Whether every operand of the query, at any depth, is a search.
+        """
+        if "search" in query:
+            return True
+        if "uuid_list" in query:
+            return False
+        return all(self.__is_search_only(operand) for operand in query["operands"])
+
+    def __is_empty_query(self, query):
+        """
+        Whether the query is empty without searching: an empty record list,
+        or an operation made empty by such operands.
+        """
+        if "uuid_list" in query:
+            return len(query["uuid_list"]) == 0
+        if "search" in query:
+            return False
+        operands = query["operands"]
+        if query["operator"] == "or":
+            return all(self.__is_empty_query(operand) for operand in operands)
+        if query["operator"] == "and":
+            return any(self.__is_empty_query(operand) for operand in operands)
+        return self.__is_empty_query(operands[0])
+
+    def iter_search(
+        self,
+        page_size=500,
+        prefetch=2,
+        records=False,
+        uuid_list=None,
+        keyword=None,
+        regex=None,
+        record_metadata_condition=None,
+        annotator_list=None,
+        label_condition=None,
+        label_metadata_condition=None,
+        verification_condition=None,
+    ):
+        """
+        Walk all search results page by page. While the caller consumes a
+        page, up to `prefetch` following pages are fetched in the background.
+        Predicates are the same as in `search`.
+
+        Parameters
+        ------
+        page_size: int
+            Number of records requested per page.
+        prefetch: int
+            Number of pages fetched ahead of the consumer. 0 disables
+            background fetching.
+        records: bool
+            If False, yield record uuids one at a time. If True, yield one
+            list of records (see `Subset.get_view_record`) per page.
+
+        Example
+        ----
+        ```python
+        for page in service.iter_search(page_size=1000, records=True, keyword="good"):
+            ...
+        ```
+        """
+
+        def fetch_page(page):
+            uuids = self.__search_uuids(
+                limit=page_size,
+                skip=page * page_size,
+                uuid_list=uuid_list,
+                keyword=keyword,
+                regex=regex,
+                record_metadata_condition=record_metadata_condition,
+                annotator_list=annotator_list,
+                label_condition=label_condition,
+                label_metadata_condition=label_metadata_condition,
+                verification_condition=verification_condition,
+            )
+            if records and len(uuids) > 0:
+                return uuids, Subset(data_uuids=uuids, service=self).get_view_record()
+            return uuids, []
+
+        with ThreadPoolExecutor(max_workers=max(1, prefetch)) as executor:
+            pages = bounded_imap(
+                executor, fetch_page, itertools.count(), max(0, prefetch) + 1
+            )
+            try:
+                for uuids, page_records in pages:
+                    if records:
+                        if len(page_records) > 0:
+                            yield page_records
+                    else:
+                        yield from uuids
+                    if len(uuids) < page_size:
+                        break
+            finally:
+                pages.close()
 
     def search_by_job(
         self,
@@ -287,7 +799,7 @@ class Service:
             label_metadata_condition=label_metadata_condition,
             verification_condition=verification_condition,
         )
-        return Subset(data_uuids=ret.get_uuid_list(), service=self, job_id=job_id)
+        return Subset(service=self, data_uuids=ret.get_uuid_list(), job_id=job_id)
 
     def deprecate_submit_annotations(self, subset=None, uuid_list=[]):
         # To be deprecated. Default to submit annotations as a batch
@@ -339,7 +851,7 @@ class Service:
             )
 
         return asyncio.run(main())
-    
+
     def submit_annotations(self, subset=None, uuid_list=[]):
         """
         Submit annotations for a batch of records in a subset to the back-end service database.
@@ -357,65 +869,204 @@ class Service:
         """
         if pydash.is_empty(subset):
             raise Exception("Subset can not be None.")
-        payload = self.get_base_payload()
-        annotator_user_id = self.get_annotator()["user_id"]
+        annotation_list = self.__get_own_annotations(
+            subset, uuid_list, self.get_annotator()["user_id"]
+        )
+        if annotation_list:
+            ret, submitted = self._post_annotations(annotation_list, uuid_list)
+            if submitted:
+                subset.clear_dirty(uuid_list)
+            return ret
+
+    def submit_dirty(self, subset=None, max_bytes=MAX_PAYLOAD_BYTES, max_workers=4):
+        """
+        Submit only the records of `subset` changed through
+        `Subset.set_annotations` since they were fetched or last submitted.
+        Records are sent in chunks bounded by payload size, concurrently;
+        records of chunks that were accepted are marked clean.
+
+        Parameters
+        -------
+        subset : Subset
+            The subset object containing records and annotations.
+        max_bytes : int
+            Upper bound on the encoded annotation list of one request.
+        max_workers : int
+            Number of requests in flight.
+
+        Returns
+        -------
+        result : list
+            Back-end results of all chunks in order, with
+            `{"uuid": ..., "error": ...}` entries for records of failed chunks.
+        """
+        if pydash.is_empty(subset):
+            raise Exception("Subset can not be None.")
+        annotation_list = self.__get_own_annotations(
+            subset, subset.get_dirty_uuids(), self.get_annotator()["user_id"]
+        )
+        if not annotation_list:
+            return []
+
+        def submit_chunk(chunk):
+            uuid_list = [annotation["record_uuid"] for annotation in chunk]
+            ret, submitted = self._post_annotations(chunk, uuid_list)
+            return uuid_list, ret, submitted
+
+        result = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for uuid_list, ret, submitted in bounded_imap(
+                executor,
+                submit_chunk,
+                chunk_by_payload_size(annotation_list, max_bytes=max_bytes),
+                max_workers,
+            ):
+                if submitted:
+                    subset.clear_dirty(uuid_list)
+                result += ret
+        return result
+
+    def get_annotation_buffer(
+        self,
+        subset=None,
+        batch_size=500,
+        flush_interval=5.0,
+        max_pending=5000,
+        max_workers=2,
+        on_error=None,
+    ):
+        """
+        Create a write-behind buffer for `subset`: annotations set through
+        the buffer are submitted in the background, by size or time
+        threshold. Use as a context manager, or call `close()`, to submit
+        what is left.
+
+        Parameters
+        -------
+        subset : Subset
+            The subset object containing records and annotations.
+        batch_size : int
+            Number of queued records that triggers a submission.
+        flush_interval : float
+            Maximum number of seconds a record waits before submission.
+        max_pending : int
+            Maximum number of queued and in-flight records before
+            `set_annotations` blocks.
+        max_workers : int
+            Number of requests in flight per submission.
+        on_error : callable, optional
+            Called with the list of `{"uuid": ..., "error": ...}` entries of
+            records that failed to submit. Without a callback they are kept in
+            the buffer's `errors` list.
+
+        Returns
+        -------
+        buffer : AnnotationBuffer
+        """
+        if pydash.is_empty(subset):
+            raise Exception("Subset can not be None.")
+        return AnnotationBuffer(
+            self,
+            subset,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+            max_pending=max_pending,
+            max_workers=max_workers,
+            on_error=on_error,
+        )
+
+    def __get_own_annotations(self, subset, uuid_list, annotator_user_id):
+        """
+        Build the `annotation_list` payload items for `uuid_list` from the
+        annotations of `annotator_user_id` in the subset cache.
+        """
         annotation_list = []
-        
         for uuid in uuid_list:
             annotation_data = subset.get_annotation_by_uuid(uuid)
             if annotation_data is not None:
                 own = list(
-                        filter(
-                            lambda annotation: annotation["annotator"] == annotator_user_id,
-                            annotation_data["annotation_list"],
-                        )
+                    filter(
+                        lambda annotation: annotation["annotator"] == annotator_user_id,
+                        annotation_data["annotation_list"],
                     )
+                )
                 own_annotation = {
-                        "record_uuid": uuid,
-                        "labels": {} if len(own) == 0 else own[0]
+                    "record_uuid": uuid,
+                    "labels": {} if len(own) == 0 else own[0],
                 }
                 annotation_list.append(own_annotation)
+        return annotation_list
 
-        if annotation_list:
-            parameters = {
-                "annotation_list": annotation_list
-            }
-            payload.update(parameters)
-            path = self.get_service_endpoint("submit_annotations_batch")
-            try:
-                response = post_request(path, json=payload)
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    return [{"uuid": uuid, "error": response.text} for uuid in uuid_list]
-            except httpx.TimeoutException:
-                    return [{"uuid": uuid, "error": "408 Request Timeout"} for uuid in uuid_list]
-            except Exception as e:
-                return [{"uuid": uuid, "error": str(e)} for uuid in uuid_list]
+    def _post_annotations(self, annotation_list, uuid_list):
+        """
+        Post one `annotation_list` batch. Returns the result list and whether
+        the back-end accepted it; on failure the result holds one error entry
+        per uuid of `uuid_list`. Also used by `AnnotationBuffer` to flush its
+        queue.
+        """
+        payload = self.get_base_payload()
+        payload.update({"annotation_list": annotation_list})
+        path = self.get_service_endpoint("submit_annotations_batch")
+        try:
+            response = post_request(path, json=payload, session=self.session)
+            if response.status_code == 200:
+                return response.json(), True
+            error = response.text
+        except httpx.TimeoutException:
+            error = "408 Request Timeout"
+        except Exception as e:
+            error = str(e)
+        finally:
+            self.invalidate_response_cache()
+        return [{"uuid": uuid, "error": error} for uuid in uuid_list], False
+
+    def get_reconciliation_data(
+        self, uuid_list=[], max_bytes=MAX_PAYLOAD_BYTES, max_workers=4
+    ):
+        """
+        Get the reconciliation view (annotations of all annotators) for a list
+        of records.
 
-    def get_reconciliation_data(self, uuid_list=[]):
+        Parameters
+        ----
+        uuid_list : list
+            List of data uuids.
+        max_bytes : int
+            Upper bound on the encoded uuid list of one request; the list is
+            split into as few batches as this allows.
+        max_workers : int
+            Number of batch requests in flight.
+
+        Returns
+        ----
+        result : list
+            Reconciliation records, in the order of `uuid_list`.
+        """
         if pydash.is_empty(uuid_list):
             return []
-        BATCH_SIZE = 45
-        # making sure the request URL doesn't exceed the 2048 characters limitation for certain browsers
-        index = 0
-        result = []
-        while index < len(uuid_list):
-            uuids = []
-            counter = 0
-            while index < len(uuid_list) and counter < BATCH_SIZE:
-                counter += 1
-                uuids.append(uuid_list[index])
-                index += 1
+
+        def get_batch(uuids):
             payload = self.get_base_payload()
             payload.update({"uuid_list": uuids})
             response = get_request(
-                self.get_service_endpoint("get_reconciliation_data"), json=payload
+                self.get_service_endpoint("get_reconciliation_data"),
+                json=payload,
+                session=self.session,
             )
             if response.status_code == 200:
-                result += response.json()
+                return response.json()
             else:
                 raise Exception(response.text)
+
+        result = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for batch in bounded_imap(
+                executor,
+                get_batch,
+                chunk_by_payload_size(uuid_list, max_bytes=max_bytes),
+                max_workers,
+            ):
+                result += batch
         return result
 
     def import_data_url(self, url="", file_type=None, column_mapping={}):
@@ -442,17 +1093,27 @@ class Service:
             {"url": url, "file_type": file_type, "column_mapping": column_mapping}
         )
         path = self.get_service_endpoint("post_data")
-        response = post_request(path, json=payload)
+        response = post_request(path, json=payload, session=self.session)
+        self.invalidate_response_cache()
         if response.status_code == 200:
             return response.text
         else:
             raise Exception(response.text)
 
-    def import_data_df(self, df, column_mapping={}):
+    def import_data_df(
+        self,
+        df,
+        column_mapping={},
+        chunk_size=1000,
+        max_workers=4,
+        max_retries=2,
+        return_summary=False,
+    ):
         """
         Import data from a pandas DataFrame.
         Each row corresponds to a data record. The dataframe needs at least two columns:
         one with a unique id for each row, and one with the raw data content.
+        Large frames are uploaded in chunks, several at a time.
 
         Parameters
         ----
@@ -466,60 +1127,194 @@ class Service:
             --8<-- "docs/assets/code/column_mapping/metadata.json"
             ```
             metadata with name `location` will be created for all imported data records.
+        chunk_size : int
+            Number of rows per upload request.
+        max_workers : int
+            Number of chunks uploaded concurrently.
+        max_retries : int
+            Number of times a chunk is re-sent after it failed to connect or
+            the server answered 503 (Service Unavailable), i.e. when the
+            chunk is known not to have been imported.
+        return_summary : bool
+            If False, raise if any chunk fails. If True, return the import
+            summary instead, so the successful chunks of a partial import
+            can be told apart from the failed ones.
 
+        Returns
+        ----
+        response : str
+            Server response, one line per chunk, if `return_summary` is False.
+        summary : dict
+            If `return_summary` is True: `imported` and `rejected` row counts,
+            the server `responses` of successful chunks, and `errors` with
+            the row range and message of each failed chunk.
         """
 
         if not isinstance(df, pd.DataFrame):
             raise Exception("df needs to be a valid pandas dataframe")
-        filtered_columns = []
-        if pydash.is_empty(column_mapping):
-            # defult mapping ,check for columns "id" and "content"
-            if "id" in df.columns and "content" in df.columns:
-                filtered_columns.extend(["id", "content"])
-                column_mapping = {"id": "id", "content": "content"}
-            else:
+        df, column_mapping = filter_import_columns(df, column_mapping)
+        chunks = (
+            (start, df.iloc[start : start + chunk_size])
+            for start in range(0, len(df), chunk_size)
+        )
+        return self.__import_chunks(
+            chunks,
+            column_mapping,
+            total=len(df),
+            max_workers=max_workers,
+            max_retries=max_retries,
+            return_summary=return_summary,
+        )
+
+    def import_file(
+        self,
+        path,
+        column_mapping={},
+        format=None,
+        chunk_size=1000,
+        max_workers=4,
+        max_retries=2,
+        return_summary=False,
+    ):
+        """
+        Import data from a local CSV, JSON Lines or Parquet file.
+        The file is read in chunks by a streaming reader while earlier chunks
+        are uploaded, so client memory stays bounded by
+        `(max_workers + 1) * chunk_size` rows regardless of the file size.
+
+        Parameters
+        ----
+        path : str
+            Path of the local file.
+        column_mapping : dict
+            Same as in `import_data_df`.
+        format : str
+            'csv' | 'jsonl' | 'parquet'. If None, inferred from the file
+            extension. Parquet requires `pyarrow`.
+        chunk_size : int
+            Number of rows read and uploaded per request.
+        max_workers : int
+            Number of chunks uploaded concurrently.
+        max_retries : int
+            Same as in `import_data_df`.
+        return_summary : bool
+            Same as in `import_data_df`.
+
+        Returns
+        ----
+        response : str or dict
+            See `import_data_df`.
+        """
+        if format is None:
+            extension = os.path.splitext(path)[1].lower().lstrip(".")
+            format = {"ndjson": "jsonl", "pq": "parquet"}.get(extension, extension)
+        total = None
+        # `reader` holds the open file and is closed when the import ends,
+        # `frames` yields its DataFrame chunks
+        if format == "csv":
+            reader = frames = pd.read_csv(path, chunksize=chunk_size)
+        elif format == "jsonl":
+            reader = frames = pd.read_json(path, lines=True, chunksize=chunk_size)
+        elif format == "parquet":
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
                 raise Exception(
-                    "Needs to provide valid column_mapping, or columns with name 'id' and 'content'."
+                    "Importing parquet files requires pyarrow: pip install pyarrow"
                 )
+            reader = pq.ParquetFile(path)
+            total = reader.metadata.num_rows
+            frames = (
+                batch.to_pandas()
+                for batch in reader.iter_batches(batch_size=chunk_size)
+            )
         else:
-            if (
-                column_mapping["id"] in df.columns
-                and column_mapping["content"] in df.columns
-            ):
-                filtered_columns.extend(
-                    [column_mapping["id"], column_mapping["content"]]
-                )
-            else:
-                raise Exception(
-                    "Needs to provide valid column_mapping with fields 'id' and 'content'."
-                )
-        if "metadata" in column_mapping:
-            filtered_columns.append(column_mapping["metadata"])
+            raise Exception(
+                f"Unsupported format '{format}'; use 'csv', 'jsonl' or 'parquet'."
+            )
 
-        # filter columns to only send necessary columns.
-        # fill nan values to make json serializable.
+        filtered_mapping = column_mapping
 
-        df = df[filtered_columns].fillna("NaN")
+        def read_chunks():
+            nonlocal filtered_mapping
+            start = 0
+            for chunk in frames:
+                chunk, filtered_mapping = filter_import_columns(chunk, column_mapping)
+                yield start, chunk
+                start += len(chunk)
 
-        if len(df) > 1000:
-            warnings.warn(
-                "Try using 'import_data_url' for import; importing large datasets DataFrame is not advised.",
-                RuntimeWarning,
+        with reader:
+            chunks = read_chunks()
+            # validate the mapping on the first chunk before any upload starts
+            first = next(chunks, None)
+            if first is None:
+                raise Exception(f"No rows found in {path}.")
+            return self.__import_chunks(
+                itertools.chain([first], chunks),
+                filtered_mapping,
+                total=total,
+                max_workers=max_workers,
+                max_retries=max_retries,
+                return_summary=return_summary,
             )
+
+    def __import_chunk(self, chunk, column_mapping, max_retries):
+        """
+        Upload one chunk of rows. The import endpoint is not idempotent, so
+        the chunk is only re-sent when it cannot have been imported: the
+        connection failed before the request was sent, or the server
+        answered 503. Returns `(response_text, error)`.
+        """
         payload = self.get_base_payload()
         payload.update(
             {
                 "file_type": "DF",
-                "df_dict": df.to_dict(orient="records"),
+                "df_dict": chunk.to_dict(orient="records"),
                 "column_mapping": column_mapping,
             }
         )
         path = self.get_service_endpoint("post_data")
-        response = post_request(path, json=payload)
-        if response.status_code == 200:
-            return response.text
-        else:
-            raise Exception(response.text)
+        error = None
+        for _ in range(max_retries + 1):
+            try:
+                response = post_request(path, json=payload, session=self.session)
+            except Exception as e:
+                error = str(e)
+                if is_connect_error(e):
+                    continue
+                break
+            if response.status_code == 200:
+                return response.text, None
+            error = response.text
+            if response.status_code != 503:
+                break
+        return None, error
+
+    def __import_chunks(
+        self, chunks, column_mapping, total, max_workers, max_retries, return_summary
+    ):
+        """
+        Upload `(start_row, DataFrame)` chunks with at most `max_workers`
+        uploads in flight, then print the import summary. `chunks` is
+        consumed lazily, so it can be a streaming reader.
+        """
+
+        def upload(item):
+            start, chunk = item
+            response_text, error = self.__import_chunk(
+                chunk, column_mapping, max_retries
+            )
+            self.invalidate_response_cache()
+            return start, len(chunk), response_text, error
+
+        results = []
+        with tqdm(
+            total=total, leave=True, desc="Rows imported:"
+        ) as tq, ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for result in bounded_imap(executor, upload, chunks, max_workers + 1):
+                results.append(result)
+                tq.update(result[1])
+        return summarize_import(results, return_summary)
 
     def export(self):
         """
@@ -534,63 +1329,417 @@ class Service:
         """
         payload = self.get_base_payload()
         path = self.get_service_endpoint("export_data")
-        response = get_request(path, json=payload)
+        response = get_request(path, json=payload, session=self.session)
         if response.status_code == 200:
-            return pd.DataFrame(
-                json.loads(response.text),
-                columns=[
-                    "data_id",
-                    "content",
-                    "annotator",
-                    "label_name",
-                    "label_value",
-                ],
-            )
+            return pd.DataFrame(json.loads(response.text), columns=EXPORT_COLUMNS)
         else:
             raise Exception(response.text)
 
-    def set_verification_data(self, verify_list=[]):
-        result = []
-        for each in verify_list:
-            uuid = each["uuid"]
-            annotator_id = each["annotator_id"]
-            label_level = each["labels"][0]["label_level"]
-            label_name = each["labels"][0]["label_name"]
+    def export_iter(self, page_size=10000, prefetch=1, since=None):
+        """
+        Export the project page by page. Each page is requested with
+        `limit`/`skip`. Once the first page shows that the back-end pages
+        the export, the next `prefetch` pages are fetched in the background
+        while the current one is consumed.
+
+        Parameters
+        ----
+        page_size : int
+            Number of export rows per page.
+        prefetch : int
+            Number of pages fetched ahead of the consumer.
+        since : str | datetime | float, optional
+            Watermark; if set, only export records and annotations created
+            or modified after it. See `export_delta`.
+
+        Returns
+        ----
+        chunks : generator of DataFrame
+            DataFrames with the same columns as `export`.
+        """
+        for rows, watermark in self.__export_pages(
+            page_size, prefetch, since, delta=since is not None
+        ):
+            if len(rows) > 0:
+                yield pd.DataFrame(rows, columns=EXPORT_COLUMNS)
+
+    def export_delta(self, since=None, page_size=10000, prefetch=1):
+        """
+        Incremental export: only the records and annotations created or
+        modified after the watermark `since`, so transfer size follows the
+        amount of change rather than the project size.
+
+        The back-end applies the filter and issues the watermarks, so client
+        and server clocks need not agree. It must answer a `since` request
+        with `{"rows": [...], "watermark": ...}`; a back-end without delta
+        export raises an exception instead of returning a full export.
+
+        Parameters
+        ----
+        since : str | datetime | float, optional
+            Watermark returned by the previous call (or an ISO 8601 string,
+            a datetime, or a POSIX timestamp). If None, export everything.
+        page_size : int
+            Number of export rows per page.
+        prefetch : int
+            Number of pages fetched ahead.
+
+        Returns
+        ----
+        export_df : DataFrame
+            Changed rows, with the same columns as `export`.
+        watermark : str
+            Pass as `since` to the next call. It is the one the back-end
+            issued with the first page, so changes made while the export
+            runs are delivered again next time rather than missed.
+
+        Example
+        ----
+        ```python
+        df, watermark = service.export_delta()
+        ...
+        changes, watermark = service.export_delta(since=watermark)
+        ```
+        """
+        chunks = []
+        watermark = None
+        for rows, page_watermark in self.__export_pages(
+            page_size, prefetch, since, delta=True
+        ):
+            if watermark is None:
+                watermark = page_watermark
+            chunks.append(pd.DataFrame(rows, columns=EXPORT_COLUMNS))
+        if len(chunks) == 0:
+            return pd.DataFrame(columns=EXPORT_COLUMNS), watermark
+        return pd.concat(chunks, ignore_index=True), watermark
+
+    def __export_pages(self, page_size, prefetch, since, delta):
+        """
+        Yield `(rows, watermark)` per export page. With `delta`, `since` is
+        sent even when None and the back-end must reply with its watermark;
+        otherwise the watermark is None.
+        """
+        path = self.get_service_endpoint("export_data")
+        since = self.__format_watermark(since)
+
+        def fetch_page(page):
             payload = self.get_base_payload()
-            payload.update(
-                {
-                    "uuid": uuid,
-                    "labels": each["labels"],
-                    "label_level": label_level,
-                    "label_name": label_name,
-                    "annotator_id": annotator_id,
-                }
+            payload.update({"limit": page_size, "skip": page * page_size})
+            if delta:
+                payload["since"] = since
+            response = get_request(path, json=payload, session=self.session)
+            if response.status_code != 200:
+                raise Exception(response.text)
+            ret = response.json()
+            if not delta:
+                return ret, None
+            if not isinstance(ret, dict) or "watermark" not in ret:
+                raise Exception(
+                    "The back-end does not support delta export (`since`); "
+                    "use export() for a full export."
+                )
+            return ret["rows"], ret["watermark"]
+
+        # the first page is fetched alone: a back-end without export paging
+        # returns every row, which must not be downloaded more than once
+        rows, watermark = fetch_page(0)
+        if len(rows) > page_size:
+            for start in range(0, len(rows), page_size):
+                yield rows[start : start + page_size], watermark
+            return
+        yield rows, watermark
+        if len(rows) < page_size:
+            return
+        first_row = rows[0]
+        # an export of exactly page_size rows is also returned whole by such
+        # a back-end; the second page tells, as it repeats the first one
+        rows, watermark = fetch_page(1)
+        if len(rows) == 0 or rows[0] == first_row:
+            return
+        yield rows, watermark
+        if len(rows) < page_size:
+            return
+
+        with ThreadPoolExecutor(max_workers=max(1, prefetch)) as executor:
+            pages = bounded_imap(
+                executor, fetch_page, itertools.count(2), max(0, prefetch) + 1
             )
-            path = self.get_service_endpoint("set_verification_data").format(uuid=uuid)
-            response = post_request(path, json=payload)
+            try:
+                for rows, watermark in pages:
+                    if len(rows) == 0:
+                        break
+                    yield rows, watermark
+                    if len(rows) != page_size:
+                        break
+            finally:
+                pages.close()
+
+    def __format_watermark(self, since):
+        """
+        Normalize an export watermark to the ISO 8601 string sent to the
+        back-end. Naive datetimes are taken as UTC; other strings are
+        passed through unchanged as opaque cursors.
+        """
+        if since is None or isinstance(since, str):
+            return since
+        if isinstance(since, datetime):
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            return since.astimezone(timezone.utc).isoformat()
+        if isinstance(since, (int, float)):
+            return datetime.fromtimestamp(since, timezone.utc).isoformat()
+        raise Exception("since must be a watermark string, datetime or timestamp.")
+
+    def export_to(
+        self, path, format="parquet", page_size=10000, prefetch=1, since=None
+    ):
+        """
+        Export the project to a local file, writing each page as it arrives
+        so memory use is bounded by `page_size` rather than the project size.
+
+        Parameters
+        ----
+        path : str
+            Output file path.
+        format : str
+            'parquet' | 'arrow' (Arrow IPC file) | 'jsonl'. Parquet and Arrow
+            require `pyarrow`; their columns are stored as strings, with
+            non-string values (e.g. label value lists) JSON-encoded.
+        page_size : int
+            Number of export rows per page.
+        prefetch : int
+            Number of pages fetched ahead while a page is written.
+        since : str | datetime | float, optional
+            Only export changes after this watermark. See `export_delta`.
+
+        Returns
+        ----
+        count : int
+            Number of rows written.
+        """
+        if format not in ["parquet", "arrow", "jsonl"]:
+            raise Exception(
+                f"Unsupported format '{format}'; use 'parquet', 'arrow' or 'jsonl'."
+            )
+        count = 0
+        chunks = self.export_iter(page_size=page_size, prefetch=prefetch, since=since)
+        if format == "jsonl":
+            with open(path, "w") as f:
+                for chunk in chunks:
+                    lines = chunk.to_json(orient="records", lines=True)
+                    f.write(lines if lines.endswith("\n") else lines + "\n")
+                    count += len(chunk)
+            return count
+
+        try:
+            import pyarrow as pa
+            import pyarrow.ipc
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise Exception(
+                f"Exporting to {format} requires pyarrow: pip install pyarrow"
+            )
+
+        def to_string(value):
+            if value is None or isinstance(value, str):
+                return value
+            return json.dumps(value)
+
+        schema = pa.schema([(column, pa.string()) for column in EXPORT_COLUMNS])
+        if format == "parquet":
+            writer = pq.ParquetWriter(path, schema)
+        else:
+            writer = pa.ipc.new_file(path, schema)
+        with writer:
+            for chunk in chunks:
+                table = pa.Table.from_pydict(
+                    {
+                        column: [to_string(value) for value in chunk[column]]
+                        for column in EXPORT_COLUMNS
+                    },
+                    schema=schema,
+                )
+                writer.write_table(table)
+                count += len(chunk)
+        return count
+
+    def set_verification_data(self, verify_list=[], batch_size=500, max_workers=4):
+        """
+        Submit verification labels for a list of records.
+
+        Parameters
+        ----
+        verify_list : list
+            Items with fields `uuid`, `annotator_id` and `labels`.
+        batch_size : int
+            Number of items per batch request.
+        max_workers : int
+            Number of requests in flight.
+
+        Returns
+        ----
+        result : list
+            One entry per item of `verify_list`, in the same order: the
+            back-end result, or `{"uuid": ..., "error": ...}` for items that
+            failed.
+        """
+        items = [
+            {
+                "uuid": each["uuid"],
+                "labels": each["labels"],
+                "label_level": each["labels"][0]["label_level"],
+                "label_name": each["labels"][0]["label_name"],
+                "annotator_id": each["annotator_id"],
+            }
+            for each in verify_list
+        ]
+        return self.__post_label_items(
+            "set_verification_data", "verification_list", items, batch_size, max_workers
+        )
+
+    def set_reconciliation_data(self, recon_list=[], batch_size=500, max_workers=4):
+        """
+        Submit reconciled labels for a list of records.
+
+        Parameters
+        ----
+        recon_list : list
+            Items with fields `uuid` and `labels`.
+        batch_size : int
+            Number of items per batch request.
+        max_workers : int
+            Number of requests in flight.
+
+        Returns
+        ----
+        result : list
+            One entry per item of `recon_list`, in the same order: the
+            back-end result, or `{"uuid": ..., "error": ...}` for items that
+            failed.
+        """
+        items = [
+            {
+                "uuid": each["uuid"],
+                "labels": each["labels"],
+                "annotator": "reconciliation",
+            }
+            for each in recon_list
+        ]
+        return self.__post_label_items(
+            "set_reconciliation_data",
+            "reconciliation_list",
+            items,
+            batch_size,
+            max_workers,
+        )
+
+    def __post_label_items(self, key, list_name, items, batch_size, max_workers):
+        """
+        Post per-record label items through the `<key>_batch` endpoint in
+        chunks of `batch_size`, with up to `max_workers` requests in flight.
+        If the back-end has no batch endpoint (404/405), fall back to one
+        concurrent request per item on the per-record `key` endpoint.
+        Results keep the order of `items`; failed items are reported as
+        `{"uuid": ..., "error": ...}` without failing the others. Items are
+        never re-sent after a batch was accepted, as the writes are not
+        idempotent; an item the batch response has no result for is reported
+        as failed.
+        """
+
+        def post_item(item):
+            payload = self.get_base_payload()
+            payload.update(item)
+            path = self.get_service_endpoint(key).format(uuid=item["uuid"])
+            try:
+                response = post_request(path, json=payload, session=self.session)
+            except Exception as e:
+                return {"uuid": item["uuid"], "error": str(e)}
             if response.status_code == 200:
-                result.append(response.json())
+                return response.json()
             else:
-                result.append({"uuid": uuid, "error": response.text})
-        return result
+                return {"uuid": item["uuid"], "error": response.text}
 
-    def set_reconciliation_data(self, recon_list=[]):
-        result = []
-        for each in recon_list:
-            uuid = each["uuid"]
+        def post_chunk(chunk):
+            """
+            Returns the chunk's results in item order, with None for the
+            items to post one at a time.
+            """
+            if key in self.__unsupported_endpoints:
+                return [None] * len(chunk)
             payload = self.get_base_payload()
-            payload.update(
-                {"uuid": uuid, "labels": each["labels"], "annotator": "reconciliation"}
+            payload.update({list_name: chunk})
+            path = self.get_service_endpoint(f"{key}_batch")
+            try:
+                response = post_request(path, json=payload, session=self.session)
+            except Exception as e:
+                return [{"uuid": item["uuid"], "error": str(e)} for item in chunk]
+            if response.status_code in (404, 405):
+                self.__unsupported_endpoints.add(key)
+                return [None] * len(chunk)
+            if response.status_code != 200:
+                return [
+                    {"uuid": item["uuid"], "error": response.text} for item in chunk
+                ]
+            results = response.json()
+            if len(results) == len(chunk):
+                # one result per item, in item order
+                return results
+            return self.__match_label_results(chunk, results)
+
+        chunks = [items[i : i + batch_size] for i in range(0, len(items), batch_size)]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            result = [
+                item_result
+                for chunk_result in executor.map(post_chunk, chunks)
+                for item_result in chunk_result
+            ]
+            fallback_indexes = [i for i, r in enumerate(result) if r is None]
+            fallback_results = executor.map(
+                post_item, [items[i] for i in fallback_indexes]
             )
-            path = self.get_service_endpoint("set_reconciliation_data").format(
-                uuid=uuid
+            for i, item_result in zip(fallback_indexes, fallback_results):
+                result[i] = item_result
+        self.invalidate_response_cache()
+        return result
+
+    @staticmethod
+    def __match_label_results(chunk, results):
+        """
+        Match the results of a batch response that does not have one result
+        per item to the items of `chunk`, by (`uuid`, annotator). A result
+        without an annotator field only matches an item whose uuid is unique
+        in the chunk. Items without a result are reported as failed.
+        """
+
+        def annotator(entry):
+            return entry.get("annotator_id", entry.get("annotator"))
+
+        uuid_counts = Counter(item["uuid"] for item in chunk)
+        by_key = {}
+        for result in results:
+            if not isinstance(result, dict) or "uuid" not in result:
+                continue
+            if annotator(result) is None and uuid_counts[result["uuid"]] != 1:
+                continue
+            by_key.setdefault((result["uuid"], annotator(result)), deque()).append(
+                result
             )
-            response = post_request(path, json=payload)
-            if response.status_code == 200:
-                result.append(response.json())
+        matched = []
+        for item in chunk:
+            keys = [(item["uuid"], annotator(item))]
+            if uuid_counts[item["uuid"]] == 1:
+                keys.append((item["uuid"], None))
+            queue = next((by_key[k] for k in keys if by_key.get(k)), None)
+            if queue is not None:
+                matched.append(queue.popleft())
             else:
-                result.append({"uuid": uuid, "error": response.text})
-        return result
+                matched.append(
+                    {
+                        "uuid": item["uuid"],
+                        "error": "No result for this item in the batch response.",
+                    }
+                )
+        return matched
 
     def __batch_update_metadata(self, meta_name, metadata_list):
         """
@@ -611,16 +1760,30 @@ class Service:
             }
         )
         path = self.get_service_endpoint("batch_update_metadata")
-        response = post_request(path, json=payload)
+        response = post_request(path, json=payload, session=self.session)
+        self.invalidate_response_cache()
         if response.status_code == 200:
             return response.text
         else:
             raise Exception(response.text)
 
-    def set_metadata(self, meta_name, func, batch_size=500):
+    def set_metadata(
+        self,
+        meta_name,
+        func,
+        batch_size=500,
+        fetch_workers=1,
+        compute_workers=1,
+        upload_workers=1,
+        use_processes=False,
+        batched=False,
+    ):
         """
         Set metadata for all records in the back-end database,
         based on user-defined function for metadata calculation.
+        Batches flow through a fetch -> compute -> upload pipeline, so
+        fetching batch i+1, computing batch i and uploading batch i-1
+        overlap.
         Parameters
         ------
         meta_name : str
@@ -628,8 +1791,25 @@ class Service:
         func : function(raw_content)
             Function which takes input the raw data content and returns the
             corresponding metadata (int, string, vectors...).
+            With `batched=True`, takes the list of raw contents of a batch
+            and returns a list (or 2-D NumPy array) of metadata values in
+            the same order.
         batch_size : int
-            Batch size for back-end database updates.
+            Batch size for back-end database updates, and number of records
+            passed to `func` per call when `batched=True`.
+        fetch_workers : int
+            Number of batches fetched ahead concurrently.
+        compute_workers : int
+            Number of batches `func` is applied to concurrently.
+        upload_workers : int
+            Number of concurrent metadata uploads.
+        use_processes : bool
+            If True, compute in a process pool instead of a thread pool,
+            for CPU-bound functions. `func` must then be picklable
+            (e.g. a module-level function, not a lambda).
+        batched : bool
+            If True, call `func` once per batch instead of once per record,
+            for vectorized encoders.
 
         Example
         ----
@@ -640,19 +1820,38 @@ class Service:
         n = self.get_statistics().get_label_progress()["total"]
         set_count = 0
         batch_number = math.ceil(float(n) / batch_size)
+        compute_executor = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
 
+        def upload_batch(data_batch):
+            return int(self.__batch_update_metadata(meta_name, data_batch))
+
+        compute_pool = compute_executor(max_workers=compute_workers)
+        upload_pool = ThreadPoolExecutor(max_workers=upload_workers)
         with tqdm(
             total=batch_number, leave=True, desc="Metadata batches processed:"
-        ) as tq:
-            for i in range(batch_number):
-                s = self.search(limit=batch_size, skip=i * batch_size)
-                data_batch = s.get_view_record()
-                for item in data_batch:
-                    item["value"] = func(item["record_content"])
-
-                res = self.__batch_update_metadata(meta_name, data_batch)
-                set_count += int(res)
-                tq.update()
+        ) as tq, compute_pool, upload_pool:
+            fetched = self.iter_search(
+                page_size=batch_size, prefetch=fetch_workers, records=True
+            )
+            computed = bounded_imap(
+                compute_pool,
+                functools.partial(compute_metadata_batch, func, batched=batched),
+                fetched,
+                compute_workers + 1,
+            )
+            uploaded = bounded_imap(
+                upload_pool, upload_batch, computed, upload_workers + 1
+            )
+            try:
+                for count in uploaded:
+                    set_count += count
+                    tq.update()
+            finally:
+                # on error, cancel the pending work of every stage before the
+                # pools shut down, instead of waiting for it
+                uploaded.close()
+                computed.close()
+                fetched.close()
         return f"Set metadata '{meta_name}' for {set_count} data record{'s' if set_count > 1 else ''}."
 
     def get_assignment(self, annotator=None, latest_only=False):
@@ -670,7 +1869,7 @@ class Service:
         payload["annotator"] = annotator
         payload["latest_only"] = latest_only
         path = self.get_service_endpoint("get_assignment")
-        response = get_request(path, json=payload)
+        response = get_request(path, json=payload, session=self.session)
 
         unique_assignments = set({})
         if response.status_code == 200:
@@ -680,4 +1879,3 @@ class Service:
 
         else:
             raise Exception(response.text)
-
@@ -29,7 +29,7 @@ class Statistic:
         """
         payload = self.__service.get_base_payload()
         path = self.__service.get_service_endpoint("get_label_progress")
-        response = get_request(path, json=payload)
+        response = get_request(path, json=payload, session=self.__service.session)
         if response.status_code == 200:
             return response.json()
         else:
@@ -59,7 +59,7 @@ class Statistic:
         payload = self.__service.get_base_payload()
         payload.update({"label_name": label_name})
         path = self.__service.get_service_endpoint("get_label_distribution")
-        response = get_request(path, json=payload)
+        response = get_request(path, json=payload, session=self.__service.session)
         if response.status_code == 200:
             return response.json()
         else:
@@ -76,7 +76,7 @@ class Statistic:
         """
         payload = self.__service.get_base_payload()
         path = self.__service.get_service_endpoint("get_annotator_contribution")
-        response = get_request(path, json=payload)
+        response = get_request(path, json=payload, session=self.__service.session)
         if response.status_code == 200:
             return response.json()
         else:
@@ -105,7 +105,7 @@ class Statistic:
         payload = self.__service.get_base_payload()
         payload.update({"label_name": label_name})
         path = self.__service.get_service_endpoint("get_annotator_agreement")
-        response = get_request(path, json=payload)
+        response = get_request(path, json=payload, session=self.__service.session)
         if response.status_code == 200:
             return response.json()
         else:
@@ -141,7 +141,7 @@ class Statistic:
         path = self.__service.get_service_endpoint("get_embeddings").format(
             embed_type=embed_type
         )
-        response = get_request(path, json=payload)
+        response = get_request(path, json=payload, session=self.__service.session)
         if response.status_code == 200:
             return response.json()
         else:
@@ -1,10 +1,16 @@
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 from re import S
 
+import numpy as np
 import pydash
 
-from labeler_client.helpers import get_request, post_request
+from labeler_client.constants import DEFAULT_FETCH_WORKERS
+from labeler_client.helpers import (bounded_imap, chunk_by_payload_size,
+                                    get_request, pack_uuids,
+                                    packed_set_operation, post_request,
+                                    sort_packed_uuids, unpack_uuids)
 
 
 class Subset:
@@ -14,16 +20,38 @@ class Subset:
     Attributes
     ----------
     __data_uuids : list
-        List of unique identifiers of data records in the subset.
+        List of unique identifiers of data records in the subset. None until
+        `__query` is evaluated, or until first needed for subsets built from
+        packed uuids.
+    __packed_uuids : numpy.ndarray
+        The same uuids packed as 16-byte values (see `pack_uuids`), sorted
+        and without duplicates, used for set operations. None until needed,
+        False if the identifiers are not canonical uuids.
+    __query : dict
+        Unevaluated query expression the subset was built from (see
+        `Service.run_query`), or None for subsets built from a uuid list.
     __service : Service
         Connected backend service
     __my_annotation_list : list
         Local cache of the record and annotation view of the subset owned by
-        service.annotator_id. with all possible metadata.
+        service.annotator_id. with all possible metadata. Loaded on first
+        access, so subsets only used for set operations, assignment or
+        suggestions never download annotations.
+    __uuid_index : dict
+        Position of each record uuid in `__my_annotation_list`.
+    __annotator_index : dict
+        For each record uuid, position of each annotator's annotation in the
+        record's `annotation_list`.
+    __dirty_uuids : dict
+        Record uuids changed through `set_annotations` and not yet submitted,
+        in order of first change (values unused).
+    fetch_workers : int
+        Number of concurrent requests when a large subset is fetched in
+        chunks.
 
     """
 
-    def __init__(self, service, data_uuids=[], job_id=None):
+    def __init__(self, service, data_uuids=[], job_id=None, query=None):
         """
         Init function
 
@@ -32,22 +60,97 @@ class Subset:
         service : Service
             Service-class object identifying the connected
             backend service and corresponding data storage
-        data_uuids : list
-            List of data uuid's to be included in the subset
+        data_uuids : list or numpy.ndarray
+            List of data uuid's to be included in the subset, or an array
+            of packed uuids (see `pack_uuids`), kept sorted and converted to
+            a list on demand
+        query : dict, optional
+            Query expression defining the subset instead of `data_uuids`.
+            It is evaluated when the records are first needed.
         """
-        self.__data_uuids = data_uuids
+        self.__query = query
+        self.__data_uuids = None if query is not None else data_uuids
+        self.__packed_uuids = None
+        if isinstance(data_uuids, np.ndarray):
+            self.__data_uuids = None
+            self.__packed_uuids = sort_packed_uuids(data_uuids)
         self.__service = service
         # TODO: to be removed after UI changes
         # in verifcation UI, instead of calling value() for subset owned
         # by job_id, on subset owned by user, call value(annotator_list =[job_id])
         self.job_id = job_id
-        if job_id is None:
-            self.annotator_id = service.get_annotator()["user_id"]
-        else:
-            self.annotator_id = job_id
-        self.__my_annotation_list = self.__get_annotation_list(
-            annotator_list=[self.annotator_id]
-        )
+        self.__annotator_id = job_id
+        self.__my_annotation_list = None
+        self.__uuid_index = {}
+        self.__annotator_index = {}
+        self.__dirty_uuids = {}
+        self.fetch_workers = DEFAULT_FETCH_WORKERS
+
+    @property
+    def annotator_id(self):
+        """
+        Owner of the local annotation cache: the job ID for job subsets,
+        otherwise the service annotator (resolved on first access).
+        """
+        if self.__annotator_id is None:
+            self.__annotator_id = self.__service.get_annotator()["user_id"]
+        return self.__annotator_id
+
+    @annotator_id.setter
+    def annotator_id(self, annotator_id):
+        self.__annotator_id = annotator_id
+
+    def __get_my_annotation_list(self):
+        """
+        Return the local annotation cache, fetching it on first access.
+        """
+        if self.__my_annotation_list is None:
+            self.__get_annotation_list(annotator_list=[self.annotator_id])
+        return self.__my_annotation_list
+
+    def __set_my_annotation_list(self, annotation_list):
+        """
+        Replace the local annotation cache and rebuild its uuid and
+        annotator indices.
+        """
+        self.__my_annotation_list = annotation_list
+        self.__uuid_index = {}
+        for position, datapoint in enumerate(annotation_list):
+            self.__uuid_index.setdefault(datapoint["uuid"], position)
+        self.__annotator_index = {}
+
+    def __get_datapoint_position(self, uuid):
+        """
+        Position of record `uuid` in the local cache, or None.
+        """
+        my_annotation_list = self.__get_my_annotation_list()
+        position = self.__uuid_index.get(uuid)
+        if position is not None and (
+            position >= len(my_annotation_list)
+            or my_annotation_list[position]["uuid"] != uuid
+        ):
+            # cache list was changed in place by a caller; re-index
+            self.__set_my_annotation_list(my_annotation_list)
+            position = self.__uuid_index.get(uuid)
+        return position
+
+    def __get_annotation_position(self, uuid, annotation_list, annotator):
+        """
+        Position of `annotator`'s annotation in the `annotation_list` of
+        record `uuid`, or None.
+        """
+        positions = self.__annotator_index.get(uuid)
+        position = None if positions is None else positions.get(annotator)
+        if position is None or (
+            position >= len(annotation_list)
+            or annotation_list[position]["annotator"] != annotator
+        ):
+            positions = {}
+            for idx, annotation in enumerate(annotation_list):
+                positions.setdefault(annotation["annotator"], idx)
+            self.__annotator_index[uuid] = positions
+            position = positions.get(annotator)
+        return position
 
     def __get_annotator_id(self):
         if self.job_id is not None:
@@ -72,7 +175,7 @@ class Subset:
         payload = self.__service.get_base_payload()
         payload.update(
             {
-                "uuid_list": self.__data_uuids,
+                "uuid_list": self.get_uuid_list(),
                 "label_name": label_name,
                 "label_level": label_level,
                 "annotator": annotator,
@@ -80,12 +183,7 @@ class Subset:
                 "status_filter": verified_status,
             }
         )
-        path = self.__service.get_service_endpoint("get_view_verification")
-        response = get_request(path, json=payload)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            raise Exception(response.text)
+        return self.__get_in_chunks("get_view_verification", payload)
 
     def get_uuid_list(self):
         """
@@ -96,8 +194,93 @@ class Subset:
         __data_uuids : list
             List of data uuids included in Subset
         """
+        if self.__data_uuids is None:
+            if self.__packed_uuids is not None:
+                self.__data_uuids = unpack_uuids(self.__packed_uuids)
+            else:
+                self.__data_uuids = self.__service.run_query(self.__query)
         return self.__data_uuids
 
+    def __get_packed_uuids(self):
+        """
+        The subset uuids packed for vectorized set operations, or None if
+        they are not canonical uuids.
+        """
+        if self.__packed_uuids is None:
+            packed = pack_uuids(self.get_uuid_list())
+            self.__packed_uuids = (
+                False if packed is None else sort_packed_uuids(packed)
+            )
+        if self.__packed_uuids is False:
+            return None
+        return self.__packed_uuids
+
+    def get_query(self):
+        """
+        Get the query expression selecting the records of the subset: the
+        query it was built from, or the list of its records for subsets built
+        from uuids. See `Service.run_query`.
+        """
+        if self.__query is not None:
+            return self.__query
+        return {"uuid_list": self.get_uuid_list()}
+
+    def __is_evaluated(self):
+        return self.__data_uuids is not None or self.__packed_uuids is not None
+
+    def __get_in_chunks(self, endpoint, payload, uuid_list=None):
+        """
+        Send a GET request to `endpoint` for `uuid_list` (default: the subset
+        records). Large lists are split into chunks bounded by payload size,
+        sent with up to `fetch_workers` requests in flight, and the
+        per-record results are concatenated in order (lists), or merged
+        (dicts keyed by record).
+        """
+        if uuid_list is None:
+            uuid_list = self.get_uuid_list()
+        path = self.__service.get_service_endpoint(endpoint)
+
+        def fetch(uuids):
+            response = get_request(
+                path,
+                json={**payload, "uuid_list": uuids},
+                session=self.__service.session,
+            )
+            if response.status_code == 200:
+                return response.json()
+            else:
+                raise Exception(response.text)
+
+        chunks = list(chunk_by_payload_size(uuid_list))
+        if len(chunks) <= 1:
+            return fetch(uuid_list)
+        result = None
+        with ThreadPoolExecutor(max_workers=self.fetch_workers) as executor:
+            for chunk_result in bounded_imap(
+                executor, fetch, chunks, self.fetch_workers
+            ):
+                if result is None and isinstance(chunk_result, (list, dict)):
+                    result = type(chunk_result)()
+                if isinstance(result, list) and isinstance(chunk_result, list):
+                    result.extend(chunk_result)
+                elif (
+                    isinstance(result, dict)
+                    and isinstance(chunk_result, dict)
+                    and result.keys().isdisjoint(chunk_result)
+                ):
+                    result.update(chunk_result)
+                else:
+                    raise Exception(
+                        "Cannot combine the '{}' responses of {} records sent in "
+                        "{} requests: {}".format(
+                            endpoint,
+                            len(uuid_list),
+                            len(chunks),
+                            type(chunk_result).__name__,
+                        )
+                    )
+        return result
+
     def __get_annotation_list(self, annotator_list: list = None):
         """
         Internal function, used by UI only.
@@ -133,18 +316,19 @@ class Subset:
             if len(annotator_list) == 1 and annotator_list[0] == self.annotator_id
             else False
         )
-        payload.update(
-            {"uuid_list": self.__data_uuids, "annotator_list": annotator_list}
+        payload.update({"annotator_list": annotator_list})
+
+        def fetch(uuid_list):
+            return self.__get_in_chunks("get_annotations", payload, uuid_list)
+
+        ret = self.__service.fetch_cached(
+            f"annotations/{json.dumps(annotator_list)}", self.get_uuid_list(), fetch
         )
-        path = self.__service.get_service_endpoint("get_annotations")
-        response = get_request(path, json=payload)
-        if response.status_code == 200:
-            ret = response.json()
-            if update_cache:
-                self.__my_annotation_list = ret
-            return ret
-        else:
-            raise Exception(response.text)
+        if update_cache:
+            # a fresh cache replaces any unsubmitted local changes
+            self.__set_my_annotation_list(ret)
+            self.__dirty_uuids = {}
+        return ret
 
     def value(self, annotator_list: list = None):
         """
@@ -165,7 +349,7 @@ class Subset:
         # To retrieve own annotations. passin own id.
         # leave unchanged untile UI changes.
         if annotator_list is None:
-            return self.__my_annotation_list
+            return self.__get_my_annotation_list()
         else:
             return self.__get_annotation_list(annotator_list=annotator_list)
 
@@ -175,20 +359,28 @@ class Subset:
         record_content=None,
         record_meta_names=None,
     ):
-        payload = self.__service.get_base_payload()
-        payload.update({"uuid_list": self.__data_uuids})
+        options = {}
         if record_id:
-            payload.update({"record_id": record_id})
+            options.update({"record_id": record_id})
         if record_content:
-            payload.update({"record_content": record_content})
+            options.update({"record_content": record_content})
         if record_meta_names:
-            payload.update({"record_meta_names": record_meta_names})
-        path = self.__service.get_service_endpoint("get_view_record")
-        response = get_request(path, json=payload)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            raise Exception(response.text)
+            options.update({"record_meta_names": record_meta_names})
+        payload = self.__service.get_base_payload()
+        payload.update(options)
+
+        def fetch(uuid_list):
+            return self.__get_in_chunks("get_view_record", payload, uuid_list)
+
+        return self.__service.cached_response(
+            "get_view_record",
+            {"uuid_list": self.get_uuid_list(), **options},
+            lambda: self.__service.fetch_cached(
+                f"view_record/{json.dumps(options, sort_keys=True)}",
+                self.get_uuid_list(),
+                fetch,
+            ),
+        )
 
     def get_view_annotation(
         self,
@@ -197,19 +389,18 @@ class Subset:
         label_meta_names=None,
     ):
         payload = self.__service.get_base_payload()
-        payload.update({"uuid_list": self.__data_uuids})
+        payload.update({"uuid_list": self.get_uuid_list()})
         if annotator_list is not None:
             payload.update({"annotator_list": annotator_list})
         if label_names is not None:
             payload.update({"label_names": label_names})
         if label_meta_names is not None:
             payload.update({"label_meta_names": label_meta_names})
-        path = self.__service.get_service_endpoint("get_view_annotation")
-        response = get_request(path, json=payload)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            raise Exception(response.text)
+
+        def fetch():
+            return self.__get_in_chunks("get_view_annotation", payload)
+
+        return self.__service.cached_response("get_view_annotation", payload, fetch)
 
     def get_view_verification(
         self,
@@ -221,7 +412,7 @@ class Subset:
     ):
         # TODO: replace get_verification_annotations
         payload = self.__service.get_base_payload()
-        payload.update({"uuid_list": self.__data_uuids})
+        payload.update({"uuid_list": self.get_uuid_list()})
         if label_name is not None:
             payload.update({"label_name": label_name})
         if label_level is not None:
@@ -233,12 +424,7 @@ class Subset:
         if status_filter is not None:
             payload.update({"status_filter": status_filter})
 
-        path = self.__service.get_service_endpoint("get_view_verification")
-        response = get_request(path, json=payload)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            raise Exception(response.text)
+        return self.__get_in_chunks("get_view_verification", payload)
 
     def get_annotation_by_uuid(self, uuid):
         """
@@ -254,10 +440,10 @@ class Subset:
         annotation : dict
             Annotation for specified data record if it exists else None
         """
-        for annotation in self.__my_annotation_list:
-            if annotation["uuid"] == uuid:
-                return annotation
-        return None
+        position = self.__get_datapoint_position(uuid)
+        if position is None:
+            return None
+        return self.__my_annotation_list[position]
 
     def show(self, config={}):
         """
@@ -331,23 +517,49 @@ class Subset:
                 f"Labels can not be None. For clearing annotations, use {{}}."
             )
         labels["annotator"] = annotator_user_id
-        added = False
-        index = -1
-        for datapoint_idx, datapoint in enumerate(self.__my_annotation_list):
-            if datapoint["uuid"] == uuid:
-                index = datapoint_idx
-                for annotation_idx, annotation in enumerate(
-                    datapoint["annotation_list"]
-                ):
-                    if annotation["annotator"] == annotator_user_id:
-                        added = True
-                        self.__my_annotation_list[datapoint_idx]["annotation_list"][
-                            annotation_idx
-                        ] = labels
-        if not added and index != -1 and index < len(self.__my_annotation_list):
-            self.__my_annotation_list[index]["annotation_list"].append(labels)
+        index = self.__get_datapoint_position(uuid)
+        if index is not None:
+            annotation_list = self.__my_annotation_list[index]["annotation_list"]
+            annotation_idx = self.__get_annotation_position(
+                uuid, annotation_list, annotator_user_id
+            )
+            if annotation_idx is None:
+                self.__annotator_index[uuid][annotator_user_id] = len(
+                    annotation_list
+                )
+                annotation_list.append(labels)
+            else:
+                annotation_list[annotation_idx] = labels
+            self.__dirty_uuids[uuid] = None
         return labels
 
+    def get_dirty_uuids(self):
+        """
+        Get the uuids of records whose annotation was changed through
+        `set_annotations` since it was fetched or last submitted.
+
+        Returns
+        -------
+        dirty_uuids : list
+            Record uuids, in order of first change.
+        """
+        return list(self.__dirty_uuids)
+
+    def clear_dirty(self, uuid_list=None):
+        """
+        Mark records as in sync with the back-end.
+
+        Parameters
+        ----------
+        uuid_list : list
+            Record uuids to clear. If None, clear all.
+        """
+        if uuid_list is None:
+            self.__dirty_uuids = {}
+        else:
+            for uuid in uuid_list:
+                self.__dirty_uuids.pop(uuid, None)
+
     def get_reconciliation_data(self, uuid_list=None):
         """Returns the list of reconciliation data for all data entries specified by user.
         The reconciliation data for one data record consists of the annotations for it by all annotators
@@ -368,7 +580,7 @@ class Subset:
             ```
         """
         if uuid_list is None:
-            uuid_list = self.__data_uuids
+            uuid_list = self.get_uuid_list()
         return self.__service.get_reconciliation_data(uuid_list=uuid_list)
 
     def suggest_similar(self, meta_name, limit=3):
@@ -394,10 +606,14 @@ class Subset:
         """
         payload = self.__service.get_base_payload()
         payload.update(
-            {"uuid_list": self.__data_uuids, "meta_name": meta_name, "limit": limit}
+            {
+                "uuid_list": self.get_uuid_list(),
+                "meta_name": meta_name,
+                "limit": limit,
+            }
         )
         path = self.__service.get_service_endpoint("suggest_similar_annotations")
-        response = get_request(path, json=payload)
+        response = get_request(path, json=payload, session=self.__service.session)
         if response.status_code == 200:
             suggested_uuids = list(set(json.loads(response.text)))
             return Subset(service=self.__service, data_uuids=suggested_uuids)
@@ -417,28 +633,124 @@ class Subset:
         payload = self.__service.get_base_payload()
         payload.update(
             {
-                "subset_uuid_list": self.__data_uuids,
+                "subset_uuid_list": self.get_uuid_list(),
                 "annotator": annotator,
             }
         )
         path = self.__service.get_service_endpoint("get_assignment")
 
-        response = post_request(path, json=payload)
+        response = post_request(path, json=payload, session=self.__service.session)
         if response.status_code == 200:
             return response.json()
         else:
             raise Exception(response.text)
 
+    def __derive(self, data_uuids, parents):
+        """
+        Build a Subset from the result of a set operation. If the loaded
+        caches of `parents` cover every record of the result, the new subset
+        starts with a copy of those cache entries instead of fetching them
+        again.
+        """
+        if isinstance(data_uuids, np.ndarray):
+            # set operation results are already sorted and duplicate-free
+            subset = Subset(service=self.__service)
+            subset.__data_uuids = None
+            subset.__packed_uuids = data_uuids
+        else:
+            subset = Subset(service=self.__service, data_uuids=data_uuids)
+        sources = [
+            parent
+            for parent in parents
+            if isinstance(parent, Subset)
+            and parent.job_id is None
+            and parent.__service is self.__service
+            and parent.__my_annotation_list is not None
+        ]
+        if len(sources) > 0 and isinstance(data_uuids, np.ndarray):
+            data_uuids = subset.get_uuid_list()
+        covered = set()
+        for parent in sources:
+            covered.update(parent.get_uuid_list())
+        if len(sources) > 0 and covered.issuperset(data_uuids):
+            entries = {}
+            for parent in sources:
+                for datapoint in parent.__my_annotation_list:
+                    entries.setdefault(datapoint["uuid"], datapoint)
+            # copy annotation lists so set_annotations on the new subset
+            # does not leak into the parents' caches.
+            subset.__set_my_annotation_list(
+                [
+                    {
+                        **entries[uuid],
+                        "annotation_list": list(entries[uuid]["annotation_list"]),
+                    }
+                    for uuid in data_uuids
+                    if uuid in entries
+                ]
+            )
+            # the copied entries carry the parents' unsubmitted changes
+            included = set(data_uuids)
+            for parent in sources:
+                for uuid in parent.__dirty_uuids:
+                    if uuid in included:
+                        subset.__dirty_uuids[uuid] = None
+        return subset
+
+    def __packed_operation(self, other, operator):
+        """
+        Apply set `operator` ("or", "and", "difference") to the packed uuids
+        of both subsets without building Python sets. Returns None if either
+        subset holds identifiers that are not canonical uuids.
+        """
+        if not isinstance(other, Subset):
+            return None
+        left = self.__get_packed_uuids()
+        right = other.__get_packed_uuids() if left is not None else None
+        if right is None:
+            return None
+        return packed_set_operation(operator, left, right)
+
+    def __combine(self, operator, other):
+        """
+        Build an unevaluated Subset applying `operator` to the queries of
+        `self` and `other`, or None if both subsets are already evaluated
+        (then combining the uuid lists locally is cheaper).
+        """
+        if not isinstance(other, Subset) or (
+            self.__is_evaluated() and other.__is_evaluated()
+        ):
+            return None
+        left, right = self.get_query(), other.get_query()
+        # flatten chained operations: (a & b) & c -> and(a, b, c),
+        # (a - b) - c -> difference(a, b, c)
+        operands = left["operands"] if left.get("operator") == operator else [left]
+        if operator != "difference" and right.get("operator") == operator:
+            operands = operands + right["operands"]
+        else:
+            operands = operands + [right]
+        return Subset(
+            service=self.__service,
+            query={"operator": operator, "operands": operands},
+        )
+
     # overlading subset operation with set algebra
     def __or__(self, other):
         """
         Computation overloading for the set "or" operator |.
         With Subset A and B, C = A | B will return a new Subset object
         with a uuid_list which unions data records in A and B.
+        Unevaluated search results are combined into one query instead.
         """
-        return Subset(
-            service=self.__service,
-            data_uuids=list(set(self.get_uuid_list()) | set(other.get_uuid_list())),
+        combined = self.__combine("or", other)
+        if combined is not None:
+            return combined
+        packed = self.__packed_operation(other, "or")
+        if packed is not None:
+            return self.__derive(packed, [self, other])
+        return self.__derive(
+            list(set(self.get_uuid_list()) | set(other.get_uuid_list())),
+            [self, other],
         )
 
     def union(self, other):
@@ -449,19 +761,38 @@ class Subset:
         Computation overloading for the set "and" operator &.
         With Subset A and B, C = A & B will return a new Subset object
         with a uuid_list which intersects data records in A and B.
+        Unevaluated search results are combined into one query instead.
         """
-        return Subset(
-            service=self.__service,
-            data_uuids=list(set(self.get_uuid_list()) & set(other.get_uuid_list())),
+        combined = self.__combine("and", other)
+        if combined is not None:
+            return combined
+        packed = self.__packed_operation(other, "and")
+        if packed is not None:
+            return self.__derive(packed, [self, other])
+        return self.__derive(
+            list(set(self.get_uuid_list()) & set(other.get_uuid_list())),
+            [self, other],
         )
 
     def intersection(self, other):
         return Subset.__and__(self, other)
 
     def __sub__(self, other):
-        return Subset(
-            service=self.__service,
-            data_uuids=list(set(self.get_uuid_list()) - set(other.get_uuid_list())),
+        """
+        Computation overloading for the set "difference" operator -.
+        With Subset A and B, C = A - B will return a new Subset object
+        with a uuid_list of the data records in A that are not in B.
+        Unevaluated search results are combined into one query instead.
+        """
+        combined = self.__combine("difference", other)
+        if combined is not None:
+            return combined
+        packed = self.__packed_operation(other, "difference")
+        if packed is not None:
+            return self.__derive(packed, [self])
+        return self.__derive(
+            list(set(self.get_uuid_list()) - set(other.get_uuid_list())),
+            [self],
         )
 
     def difference(self, other):
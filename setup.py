@@ -27,7 +27,8 @@ package = {
         "pydash==7.0.6", "tabulate==0.9.0", "jaro-winkler==2.0.3"
     ],
     "extras_require": {
-        "ui": ["labeler-ui @ git+https://github.com/meganno/labeler-ui.git"]
+        "ui": ["labeler-ui @ git+https://github.com/meganno/labeler-ui.git"],
+        "parquet": ["pyarrow"],
     },
     "include_package_data":
     True,
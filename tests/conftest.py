@@ -0,0 +1,342 @@
+"""
+Fixtures for behavior tests against an in-memory back-end. `FakeBackend`
+answers the requests `get_request`/`post_request` would send, so the client
+code under test runs unchanged without a server; `FakeOpenAI` does the same
+for chat completions.
+"""
+
+import json
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import openai
+import pytest
+
+from labeler_client import annotation_buffer, controller, schema, service, subset
+from labeler_client.service import Service
+
+PROJECT = "test"
+ANNOTATOR_TOKEN = "annotator-token"
+JOB_TOKEN = "job-token"
+USERS = {ANNOTATOR_TOKEN: "annotator-1", JOB_TOKEN: "job-1"}
+JOB_UUID = USERS[JOB_TOKEN]
+AGENT_UUID = "agent-1"
+LABEL_SCHEMA = [
+    {
+        "name": "sentiment",
+        "level": "record",
+        "options": [
+            {"text": "pos", "value": "pos"},
+            {"text": "neg", "value": "neg"},
+        ],
+    }
+]
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.status_code = status_code
+        self.__body = body
+        self.text = json.dumps(body)
+
+    def json(self):
+        return self.__body
+
+
+class FakeBackend:
+    """
+    Records, annotations and persisted jobs of one project.
+
+    Attributes
+    ----------
+    calls : list
+        `(method, route)` of every request, in order.
+    annotations : dict
+        Submitted labels by (record uuid, annotator user id).
+    jobs : dict
+        `annotation_uuid_list` of each persisted job, by job uuid.
+    hooks : dict
+        Optional callables by route, called with the payload before a
+        request is answered. A hook may block, raise, or return a
+        `FakeResponse` that is sent instead.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.records = []
+        self.annotations = {}
+        self.jobs = {}
+        self.agents = []
+        self.hooks = {}
+
+    def add_records(self, num_records):
+        """
+        Add records `r0`, `r1`, ... whose content is "good review <n>" for
+        odd and "bad review <n>" for even numbers. Returns their uuids.
+        """
+        start = len(self.records)
+        self.records += [
+            {
+                "uuid": "r{}".format(i),
+                "record_id": str(i),
+                "record_content": "{} review {}".format("good" if i % 2 else "bad", i),
+            }
+            for i in range(start, start + num_records)
+        ]
+        return [record["uuid"] for record in self.records[start:]]
+
+    def add_agent(self, agent_uuid, prompt_template, provider_api="openai:chat"):
+        self.agents.append(
+            {
+                "uuid": agent_uuid,
+                "model_config": json.dumps({"model": "test-model"}),
+                "prompt_template": prompt_template,
+                "provider_api": provider_api,
+                "created_by": USERS[ANNOTATOR_TOKEN],
+            }
+        )
+
+    def routes(self, route):
+        return [call for call in self.calls if call[1] == route]
+
+    def request(self, method, path, payload):
+        url = urlsplit(path)
+        route = "/" + url.path.split("/", 2)[2] if url.path.count("/") > 1 else "/"
+        with self.lock:
+            self.calls.append((method, route))
+        hook = self.hooks.get(route)
+        if hook is not None:
+            response = hook(payload)
+            if response is not None:
+                return response
+        if "url_check" in url.query:
+            return FakeResponse({"version": "test"})
+        user_id = USERS.get(payload.get("token"))
+        if user_id is None:
+            return FakeResponse({"detail": "invalid token"}, 401)
+        handler = getattr(
+            self, "_{}_{}".format(method, route.strip("/").replace("/", "_")), None
+        )
+        if handler is None and route.startswith("/agents/"):
+            handler = self._post_set_job
+        if handler is None:
+            return FakeResponse({"detail": "not found: " + route}, 404)
+        with self.lock:
+            return FakeResponse(handler(payload, user_id, route))
+
+    def _post_auth_users_authenticate(self, payload, user_id, route):
+        return {"username": user_id, "user_id": user_id}
+
+    def _get_agents(self, payload, user_id, route):
+        return self.agents
+
+    def _get_schemas(self, payload, user_id, route):
+        return [{"schemas": {"label_schema": LABEL_SCHEMA}}]
+
+    def _get_data_search(self, payload, user_id, route):
+        found = [
+            record["uuid"]
+            for record in self.records
+            if payload.get("keyword", "") in record["record_content"]
+        ]
+        skip = payload.get("skip", 0)
+        return found[skip : skip + payload.get("limit", 10)]
+
+    def _get_view_record(self, payload, user_id, route):
+        uuid_list = set(payload["uuid_list"])
+        return [record for record in self.records if record["uuid"] in uuid_list]
+
+    def _get_annotations(self, payload, user_id, route):
+        annotator_list = payload.get("annotator_list")
+        result = []
+        for record in self.records:
+            if record["uuid"] not in payload["uuid_list"]:
+                continue
+            annotation_list = [
+                dict(labels, annotator=annotator)
+                for (record_uuid, annotator), labels in self.annotations.items()
+                if record_uuid == record["uuid"]
+                and (annotator_list is None or annotator in annotator_list)
+            ]
+            result.append(
+                {
+                    "uuid": record["uuid"],
+                    "data": record["record_content"],
+                    "annotation_list": annotation_list,
+                }
+            )
+        return result
+
+    def _post_annotations_batch(self, payload, user_id, route):
+        result = []
+        for annotation in payload["annotation_list"]:
+            record_uuid = annotation["record_uuid"]
+            # one annotation per record and annotator; submitting again
+            # replaces its labels
+            self.annotations[(record_uuid, user_id)] = annotation["labels"]
+            result.append(
+                {
+                    "uuid": record_uuid,
+                    "annotation_uuid": "{}/{}".format(record_uuid, user_id),
+                }
+            )
+        return result
+
+    def _post_set_job(self, payload, user_id, route):
+        job_uuid = route.rsplit("/", 1)[1]
+        self.jobs[job_uuid] = payload["annotation_uuid_list"]
+        return {"job_uuid": job_uuid}
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    fake = FakeBackend()
+
+    def get_request(path="", json={}, timeout=None, session=None):
+        return fake.request("get", path, json)
+
+    def post_request(path="", json={}, timeout=None, session=None):
+        return fake.request("post", path, json)
+
+    for module in (annotation_buffer, controller, schema, service, subset):
+        if hasattr(module, "get_request"):
+            monkeypatch.setattr(module, "get_request", get_request)
+        if hasattr(module, "post_request"):
+            monkeypatch.setattr(module, "post_request", post_request)
+    return fake
+
+
+@pytest.fixture
+def connect(backend):
+    """
+    Returns a function creating a `Service` for a token; services are
+    closed after the test.
+    """
+    services = []
+
+    def connect(token=ANNOTATOR_TOKEN):
+        services.append(Service(host="http://backend", project=PROJECT, token=token))
+        return services[-1]
+
+    yield connect
+    for each in services:
+        each.close()
+
+
+class Crash(BaseException):
+    """
+    Stops a job the way an interrupt or a killed process would: not caught
+    by the job's error handling.
+    """
+
+
+class FakeOpenAI:
+    """
+    Answers chat completions with `sentiment: pos` for prompts containing
+    "good" and `sentiment: neg` otherwise. Batched prompts (`BATCH_PROMPT`
+    followed by numbered tasks) are answered with a JSON object of the
+    answer of each task.
+
+    Attributes
+    ----------
+    calls : int
+        Number of completions returned.
+    batch_calls : int
+        Number of them that answered a batched prompt.
+    single_prompts : list
+        Prompts answered on their own, in order.
+    skip_tasks : set
+        Task numbers left out of the answers to batched prompts, as if the
+        model had not answered them.
+    crash_after : int
+        Raise `Crash` instead of answering once this many completions were
+        returned; None never crashes.
+    events : list
+        Shared event log; "llm" is appended for every completion.
+    """
+
+    def __init__(self, events, delay=0.0):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.batch_calls = 0
+        self.single_prompts = []
+        self.skip_tasks = set()
+        self.crash_after = None
+        self.events = events
+        self.delay = delay
+
+    def create(self, **config):
+        with self.lock:
+            if self.crash_after is not None and self.calls >= self.crash_after:
+                raise Crash()
+            self.calls += 1
+            self.events.append("llm")
+        if self.delay:
+            time.sleep(self.delay)
+        content = config["messages"][0]["content"]
+        tasks = re.split(r"### Task (\d+)\n", content)
+        with self.lock:
+            if len(tasks) > 1:
+                self.batch_calls += 1
+            else:
+                self.single_prompts.append(content)
+        if len(tasks) > 1:
+            # tasks == [instruction, number, prompt, number, prompt, ...]
+            answer = json.dumps(
+                {
+                    number: self.answer(prompt)
+                    for number, prompt in zip(tasks[1::2], tasks[2::2])
+                    if int(number) not in self.skip_tasks
+                }
+            )
+        else:
+            answer = self.answer(content)
+        return openai.openai_object.OpenAIObject.construct_from(
+            {"choices": [{"message": {"content": answer}}]}
+        )
+
+    @staticmethod
+    def answer(prompt):
+        return "sentiment: {}".format("pos" if "good" in prompt else "neg")
+
+
+class FakeAuth:
+    def __init__(self):
+        self.tokens_created = 0
+
+    def create_access_token(self, job=False):
+        self.tokens_created += 1
+        return {"user_id": JOB_UUID, "token": JOB_TOKEN}
+
+
+@pytest.fixture
+def events():
+    return []
+
+
+@pytest.fixture
+def llm(monkeypatch, events):
+    fake = FakeOpenAI(events)
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(openai.ChatCompletion, "create", fake.create)
+    monkeypatch.setattr(openai.Model, "list", lambda: [])
+    return fake
+
+
+def expected_label(backend, uuid):
+    content = next(r for r in backend.records if r["uuid"] == uuid)["record_content"]
+    return "pos" if "good" in content else "neg"
+
+
+def job_labels(backend):
+    """
+    Label values submitted by the job, by record uuid.
+    """
+    return {
+        uuid: labels["labels_record"][0]["label_value"][0]
+        for (uuid, annotator), labels in backend.annotations.items()
+        if annotator == JOB_UUID
+    }
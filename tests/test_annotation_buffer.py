@@ -0,0 +1,163 @@
+import threading
+
+from conftest import FakeResponse
+
+from labeler_client.subset import Subset
+
+ANNOTATOR = "annotator-1"
+
+
+def labels(value):
+    return {"labels_record": [{"label_name": "sentiment", "label_value": [value]}]}
+
+
+def block(route, backend):
+    """
+    Hold requests to `route` until the returned event is set; `started` is
+    set once the first one arrives.
+    """
+    started, release = threading.Event(), threading.Event()
+
+    def hook(payload):
+        started.set()
+        release.wait(10)
+
+    backend.hooks[route] = hook
+    return started, release
+
+
+def run_in_thread(func, *args):
+    thread = threading.Thread(target=func, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+def submitted_labels(backend, uuid):
+    return backend.annotations[(uuid, ANNOTATOR)]["labels_record"][0]["label_value"]
+
+
+def test_flush_submits_queued_records(backend, connect):
+    uuid_list = backend.add_records(10)
+    service = connect()
+    subset = Subset(service, uuid_list)
+    buffer = service.get_annotation_buffer(subset, batch_size=100, flush_interval=60)
+    for uuid in uuid_list:
+        buffer.set_annotations(uuid, labels("pos"))
+    assert buffer.pending_count() == 10
+    assert backend.annotations == {}
+
+    buffer.flush()
+
+    assert buffer.pending_count() == 0
+    assert len(backend.routes("/annotations/batch")) == 1
+    assert sorted(uuid for uuid, _ in backend.annotations) == sorted(uuid_list)
+    assert subset.get_dirty_uuids() == []
+    buffer.close()
+
+
+def test_flush_waits_for_a_background_flush_in_flight(backend, connect):
+    uuid_list = backend.add_records(2)
+    service = connect()
+    buffer = service.get_annotation_buffer(
+        Subset(service, uuid_list), batch_size=2, flush_interval=60
+    )
+    started, release = block("/annotations/batch", backend)
+    for uuid in uuid_list:
+        buffer.set_annotations(uuid, labels("pos"))
+    # the background thread took both records and is blocked submitting them
+    assert started.wait(5)
+    flush = run_in_thread(buffer.flush)
+    flush.join(0.2)
+    assert flush.is_alive()
+
+    release.set()
+    flush.join(5)
+    assert not flush.is_alive()
+    assert len(backend.annotations) == 2
+    buffer.close()
+
+
+def test_set_annotations_blocks_at_max_pending(backend, connect):
+    uuid_list = backend.add_records(3)
+    service = connect()
+    buffer = service.get_annotation_buffer(
+        Subset(service, uuid_list), batch_size=2, max_pending=2, flush_interval=60
+    )
+    started, release = block("/annotations/batch", backend)
+    buffer.set_annotations(uuid_list[0], labels("pos"))
+    buffer.set_annotations(uuid_list[1], labels("pos"))
+    assert started.wait(5)
+    third = run_in_thread(buffer.set_annotations, uuid_list[2], labels("pos"))
+    third.join(0.2)
+    assert third.is_alive()
+    assert buffer.pending_count() == 2
+
+    release.set()
+    third.join(5)
+    assert not third.is_alive()
+    buffer.close()
+    assert len(backend.annotations) == 3
+
+
+def test_changes_to_a_queued_record_are_coalesced(backend, connect):
+    uuid_list = backend.add_records(1)
+    service = connect()
+    with service.get_annotation_buffer(
+        Subset(service, uuid_list), flush_interval=60
+    ) as buffer:
+        buffer.set_annotations(uuid_list[0], labels("neg"))
+        buffer.set_annotations(uuid_list[0], labels("pos"))
+        assert buffer.pending_count() == 1
+
+    assert len(backend.routes("/annotations/batch")) == 1
+    assert submitted_labels(backend, uuid_list[0]) == ["pos"]
+
+
+def test_flush_interval_submits_without_flush(backend, connect):
+    uuid_list = backend.add_records(1)
+    service = connect()
+    submitted = threading.Event()
+    backend.hooks["/annotations/batch"] = lambda payload: submitted.set()
+    buffer = service.get_annotation_buffer(
+        Subset(service, uuid_list), batch_size=100, flush_interval=0.05
+    )
+    buffer.set_annotations(uuid_list[0], labels("pos"))
+    assert submitted.wait(5)
+    buffer.close()
+    assert submitted_labels(backend, uuid_list[0]) == ["pos"]
+
+
+def test_rejected_records_are_reported_and_stay_dirty(backend, connect):
+    uuid_list = backend.add_records(2)
+    service = connect()
+    subset = Subset(service, uuid_list)
+    backend.hooks["/annotations/batch"] = lambda payload: FakeResponse(
+        {"detail": "unavailable"}, 500
+    )
+    with service.get_annotation_buffer(subset, flush_interval=60) as buffer:
+        for uuid in uuid_list:
+            buffer.set_annotations(uuid, labels("pos"))
+
+    assert sorted(error["uuid"] for error in buffer.errors) == uuid_list
+    assert sorted(subset.get_dirty_uuids()) == uuid_list
+
+
+def test_loading_the_subset_cache_does_not_block_the_buffer(backend, connect):
+    uuid_list = backend.add_records(1)
+    service = connect()
+    buffer = service.get_annotation_buffer(
+        Subset(service, uuid_list), flush_interval=60
+    )
+    started, release = block("/annotations", backend)
+    producer = run_in_thread(buffer.set_annotations, uuid_list[0], labels("pos"))
+    assert started.wait(5)
+    count = []
+    reader = run_in_thread(lambda: count.append(buffer.pending_count()))
+    reader.join(1)
+    assert count == [0]
+
+    release.set()
+    producer.join(5)
+    assert buffer.pending_count() == 1
+    buffer.close()
+    assert submitted_labels(backend, uuid_list[0]) == ["pos"]
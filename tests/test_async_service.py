@@ -0,0 +1,104 @@
+import asyncio
+
+import httpx
+import pandas as pd
+import pytest
+from conftest import ANNOTATOR_TOKEN, LABEL_SCHEMA, PROJECT, FakeResponse
+
+from labeler_client import async_schema, async_service, async_subset
+from labeler_client.async_service import AsyncService
+
+
+@pytest.fixture
+def run(backend, monkeypatch):
+    """
+    Returns a function running a coroutine function with a connected
+    `AsyncService` whose requests go to `backend`.
+    """
+
+    async def async_get_request(client, path="", json={}, timeout=None):
+        return backend.request("get", path, json)
+
+    async def async_post_request(client, path="", json={}, timeout=None):
+        return backend.request("post", path, json)
+
+    for module in (async_schema, async_service, async_subset):
+        if hasattr(module, "async_get_request"):
+            monkeypatch.setattr(module, "async_get_request", async_get_request)
+        if hasattr(module, "async_post_request"):
+            monkeypatch.setattr(module, "async_post_request", async_post_request)
+
+    def run(func):
+        async def main():
+            async with AsyncService(
+                host="http://backend", project=PROJECT, token=ANNOTATOR_TOKEN
+            ) as service:
+                return await func(service)
+
+        return asyncio.run(main())
+
+    return run
+
+
+def test_search_sends_the_filter_of_the_sync_service(backend, run):
+    backend.add_records(20)
+    payloads = []
+    backend.hooks["/data/search"] = payloads.append
+
+    subset = run(lambda service: service.search(keyword="good", limit=3, skip=1))
+
+    assert subset.get_uuid_list() == ["r3", "r5", "r7"]
+    assert payloads[0]["keyword"] == "good"
+    assert "regex" not in payloads[0]
+
+
+def test_get_schemas(backend, run):
+    async def active_schemas(service):
+        return await service.get_schemas().get_active_schemas()
+
+    assert run(active_schemas) == [{"schemas": {"label_schema": LABEL_SCHEMA}}]
+
+
+def test_failed_label_items_do_not_fail_the_others(backend, run):
+    def answer(payload):
+        if payload["uuid"] == "r1":
+            raise httpx.ReadTimeout("timed out")
+        return FakeResponse({"uuid": payload["uuid"]})
+
+    backend.hooks["/annotations/r0/labels"] = answer
+    backend.hooks["/annotations/r1/labels"] = answer
+    backend.hooks["/annotations/r2/labels"] = lambda payload: FakeResponse(
+        {"detail": "rejected"}, 422
+    )
+
+    result = run(
+        lambda service: service.set_reconciliation_data(
+            [{"uuid": uuid, "labels": {}} for uuid in ("r0", "r1", "r2")]
+        )
+    )
+
+    assert result[0] == {"uuid": "r0"}
+    assert result[1] == {"uuid": "r1", "error": "timed out"}
+    assert result[2]["uuid"] == "r2" and "rejected" in result[2]["error"]
+
+
+def test_import_data_df_reports_the_failed_chunk(backend, run):
+    chunks = []
+
+    def answer(payload):
+        chunks.append([row["id"] for row in payload["df_dict"]])
+        if payload["df_dict"][0]["id"] == 2:
+            return FakeResponse({"detail": "bad rows"}, 422)
+        return FakeResponse("ok")
+
+    backend.hooks["/data"] = answer
+    df = pd.DataFrame({"id": range(5), "content": ["text"] * 5, "other": [0] * 5})
+
+    summary = run(
+        lambda service: service.import_data_df(df, chunk_size=2, return_summary=True)
+    )
+
+    assert sorted(chunks) == [[0, 1], [2, 3], [4]]
+    assert summary["imported"] == 3
+    assert summary["rejected"] == 2
+    assert summary["errors"][0]["rows"] == [2, 4]
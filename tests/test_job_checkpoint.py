@@ -0,0 +1,124 @@
+import pytest
+
+from conftest import (
+    AGENT_UUID,
+    JOB_UUID,
+    Crash,
+    FakeAuth,
+    FakeResponse,
+    expected_label,
+    job_labels,
+)
+
+from labeler_client.checkpoint import JobCheckpoint
+from labeler_client.controller import Controller
+from labeler_client.subset import Subset
+
+NUM_RECORDS = 20
+
+
+@pytest.fixture
+def controller(backend, connect):
+    backend.add_agent(AGENT_UUID, "Sentiment of: ${input}")
+    return Controller(connect(), FakeAuth())
+
+
+def run_job(backend, controller, checkpoint_dir, **kwargs):
+    uuid_list = backend.add_records(NUM_RECORDS)
+    return controller.run_job(
+        AGENT_UUID,
+        Subset(controller._Controller__service, uuid_list),
+        "sentiment",
+        checkpoint_dir=str(checkpoint_dir),
+        submit_batch_size=5,
+        **kwargs
+    )
+
+
+def only_checkpoint(checkpoint_dir):
+    (path,) = checkpoint_dir.iterdir()
+    return str(path)
+
+
+def assert_job_complete(backend):
+    labels = job_labels(backend)
+    assert len(labels) == NUM_RECORDS
+    assert labels == {uuid: expected_label(backend, uuid) for uuid in labels}
+    persisted = backend.jobs[JOB_UUID]
+    assert len(persisted) == NUM_RECORDS
+    assert len(set(persisted)) == NUM_RECORDS
+
+
+def test_resume_after_interrupted_llm_calls(backend, llm, controller, tmp_path):
+    llm.crash_after = 12
+    with pytest.raises(Crash):
+        run_job(backend, controller, tmp_path)
+    path = only_checkpoint(tmp_path)
+
+    llm.crash_after = None
+    assert controller.resume_job(path) == JOB_UUID
+
+    # no record was sent to the LLM twice
+    assert llm.calls == NUM_RECORDS
+    assert_job_complete(backend)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_resume_ignores_a_torn_last_line(backend, llm, controller, tmp_path):
+    llm.crash_after = 7
+    with pytest.raises(Crash):
+        run_job(backend, controller, tmp_path)
+    path = only_checkpoint(tmp_path)
+    with open(path, "a") as journal:
+        journal.write('{"type": "responses", "respo')
+
+    llm.crash_after = None
+    controller.resume_job(path)
+
+    assert llm.calls == NUM_RECORDS
+    assert_job_complete(backend)
+
+
+def test_resume_after_failed_persist_only_persists(backend, llm, controller, tmp_path):
+    route = "/agents/{}/jobs/{}".format(AGENT_UUID, JOB_UUID)
+    backend.hooks[route] = lambda payload: FakeResponse({"detail": "down"}, 503)
+    with pytest.raises(Exception):
+        run_job(backend, controller, tmp_path)
+    path = only_checkpoint(tmp_path)
+    checkpoint = JobCheckpoint(path)
+    assert len(checkpoint.submitted_uuids) == NUM_RECORDS
+    checkpoint.close()
+    submissions = len(backend.routes("/annotations/batch"))
+
+    del backend.hooks[route]
+    controller.resume_job(path)
+
+    assert llm.calls == NUM_RECORDS
+    assert len(backend.routes("/annotations/batch")) == submissions
+    assert_job_complete(backend)
+
+
+def test_resume_resubmits_a_batch_sent_but_not_journaled(
+    backend, llm, controller, tmp_path, monkeypatch
+):
+    add_submitted = JobCheckpoint.add_submitted
+
+    def crash_once(self, uuid_list, annotation_uuid_list):
+        monkeypatch.setattr(JobCheckpoint, "add_submitted", add_submitted)
+        raise Crash()
+
+    monkeypatch.setattr(JobCheckpoint, "add_submitted", crash_once)
+    with pytest.raises(Crash):
+        run_job(backend, controller, tmp_path, max_concurrency=1)
+    path = only_checkpoint(tmp_path)
+    checkpoint = JobCheckpoint(path)
+    in_doubt = set(checkpoint.in_doubt_uuids)
+    checkpoint.close()
+    # the back-end has the first batch, the journal does not
+    assert len(in_doubt) == 5
+    assert in_doubt <= set(job_labels(backend))
+
+    controller.resume_job(path)
+
+    assert llm.calls == NUM_RECORDS
+    assert_job_complete(backend)
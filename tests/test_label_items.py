@@ -0,0 +1,79 @@
+from conftest import FakeResponse
+
+BATCH_ROUTE = "/verifications/labels/batch"
+
+
+def verify_list(*keys):
+    return [
+        {
+            "uuid": uuid,
+            "annotator_id": annotator,
+            "labels": [{"label_level": "record", "label_name": "sentiment"}],
+        }
+        for uuid, annotator in keys
+    ]
+
+
+def answer_batch(backend, answer):
+    """
+    Answer batch requests with `answer(verification_list)`.
+    """
+    backend.hooks[BATCH_ROUTE] = lambda payload: FakeResponse(
+        answer(payload["verification_list"])
+    )
+
+
+def per_item_requests(backend):
+    return [call for call in backend.calls if call[1].startswith("/verifications/r")]
+
+
+def test_results_are_matched_by_position(backend, connect):
+    answer_batch(backend, lambda items: [{"ok": i} for i, _ in enumerate(items)])
+    result = connect().set_verification_data(
+        verify_list(("r0", "a1"), ("r0", "a2"), ("r1", "a1"))
+    )
+    assert result == [{"ok": 0}, {"ok": 1}, {"ok": 2}]
+
+
+def test_short_response_is_matched_by_uuid_and_annotator(backend, connect):
+    # the back-end answers for the second and third item only, out of order
+    answer_batch(
+        backend,
+        lambda items: [
+            {"uuid": item["uuid"], "annotator_id": item["annotator_id"], "ok": True}
+            for item in items[1:][::-1]
+        ],
+    )
+    result = connect().set_verification_data(
+        verify_list(("r0", "a1"), ("r0", "a2"), ("r1", "a1"))
+    )
+
+    assert "error" in result[0] and result[0]["uuid"] == "r0"
+    assert result[1] == {"uuid": "r0", "annotator_id": "a2", "ok": True}
+    assert result[2] == {"uuid": "r1", "annotator_id": "a1", "ok": True}
+    # an accepted batch is never re-sent item by item
+    assert per_item_requests(backend) == []
+
+
+def test_results_without_annotator_do_not_match_a_shared_uuid(backend, connect):
+    answer_batch(backend, lambda items: [{"uuid": "r0"}, {"uuid": "r1"}])
+    result = connect().set_verification_data(
+        verify_list(("r0", "a1"), ("r0", "a2"), ("r1", "a1"))
+    )
+
+    assert "error" in result[0] and "error" in result[1]
+    assert result[2] == {"uuid": "r1"}
+    assert per_item_requests(backend) == []
+
+
+def test_missing_batch_endpoint_falls_back_to_per_item_requests(backend, connect):
+    backend.hooks["/verifications/r0/labels"] = lambda payload: FakeResponse(
+        {"uuid": payload["uuid"], "annotator_id": payload["annotator_id"]}
+    )
+    result = connect().set_verification_data(verify_list(("r0", "a1"), ("r0", "a2")))
+
+    assert result == [
+        {"uuid": "r0", "annotator_id": "a1"},
+        {"uuid": "r0", "annotator_id": "a2"},
+    ]
+    assert len(backend.routes(BATCH_ROUTE)) == 1
@@ -0,0 +1,114 @@
+import pytest
+
+from conftest import (
+    AGENT_UUID,
+    JOB_UUID,
+    FakeAuth,
+    FakeResponse,
+    expected_label,
+    job_labels,
+)
+
+from labeler_client.controller import Controller
+from labeler_client.subset import Subset
+
+
+@pytest.fixture
+def job(backend, connect, tmp_path):
+    backend.add_agent(AGENT_UUID, "Sentiment of: ${input}")
+    auth = FakeAuth()
+    controller = Controller(connect(), auth)
+
+    def run(num_records, **kwargs):
+        uuid_list = backend.add_records(num_records)
+        return controller.run_job(
+            AGENT_UUID,
+            Subset(controller._Controller__service, uuid_list),
+            "sentiment",
+            checkpoint_dir=str(tmp_path),
+            **kwargs
+        )
+
+    run.auth = auth
+    return run
+
+
+def test_job_annotates_submits_and_persists(backend, llm, job, tmp_path):
+    assert job(20, max_concurrency=4, submit_batch_size=5) == JOB_UUID
+
+    labels = job_labels(backend)
+    assert labels == {uuid: expected_label(backend, uuid) for uuid in labels}
+    assert len(labels) == 20
+    assert len(backend.routes("/annotations/batch")) == 4
+    assert sorted(backend.jobs[JOB_UUID]) == sorted(
+        "{}/{}".format(uuid, JOB_UUID) for uuid in labels
+    )
+    assert llm.calls == 20
+    # the checkpoint is removed once the job is persisted
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_submissions_start_while_llm_calls_are_running(backend, llm, events, job):
+    llm.delay = 0.01
+    backend.hooks["/annotations/batch"] = lambda payload: events.append("submit")
+    job(30, submit_batch_size=5)
+
+    assert events.count("llm") == 30
+    assert events.count("submit") == 6
+    last_call = len(events) - 1 - events[::-1].index("llm")
+    assert events.index("submit") < last_call
+
+
+def test_batched_prompts_are_answered_in_one_call(backend, llm, job):
+    job(12, batch_size=4, submit_batch_size=5)
+
+    assert llm.calls == 3
+    assert llm.batch_calls == 3
+    labels = job_labels(backend)
+    assert labels == {uuid: expected_label(backend, uuid) for uuid in labels}
+    assert len(labels) == 12
+    assert len(backend.jobs[JOB_UUID]) == 12
+
+
+def test_records_missing_from_a_batched_answer_are_asked_again(backend, llm, job):
+    # the answers skip the 2nd and 4th task of every batch
+    llm.skip_tasks = {2, 4}
+    job(8, batch_size=4, submit_batch_size=5)
+
+    assert llm.batch_calls == 2
+    assert llm.calls == 2 + 4
+    # only r1, r3 of the first batch and r5, r7 of the second are asked again
+    assert sorted(prompt.split()[-1] for prompt in llm.single_prompts) == [
+        "1",
+        "3",
+        "5",
+        "7",
+    ]
+    labels = job_labels(backend)
+    assert labels == {uuid: expected_label(backend, uuid) for uuid in labels}
+    assert len(labels) == 8
+
+
+def test_invalid_job_creates_no_token_or_checkpoint(
+    backend, llm, job, monkeypatch, tmp_path
+):
+    monkeypatch.delenv("OPENAI_API_KEY")
+    with pytest.raises(Exception, match="OPENAI_API_KEY is not set"):
+        job(5)
+
+    assert job.auth.tokens_created == 0
+    assert llm.calls == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_rejected_submission_fails_the_job_and_keeps_the_checkpoint(
+    backend, llm, job, tmp_path
+):
+    backend.hooks["/annotations/batch"] = lambda payload: FakeResponse(
+        {"detail": "unavailable"}, 503
+    )
+    with pytest.raises(Exception):
+        job(5, submit_batch_size=5)
+
+    assert JOB_UUID not in backend.jobs
+    assert len(list(tmp_path.iterdir())) == 1
@@ -0,0 +1,108 @@
+from conftest import FakeResponse
+
+from labeler_client.subset import Subset
+
+SEARCH = "/data/search"
+COMPOUND = "/data/search/compound"
+
+
+def answer_compound(backend, uuids):
+    """
+    Answer compound searches with `uuids`; returns the list of payload
+    queries received.
+    """
+    queries = []
+
+    def hook(payload):
+        queries.append(payload["query"])
+        return FakeResponse(uuids)
+
+    backend.hooks[COMPOUND] = hook
+    return queries
+
+
+def leaves(query):
+    if "operands" not in query:
+        return [query]
+    return [leaf for operand in query["operands"] for leaf in leaves(operand)]
+
+
+def test_search_is_sent_right_away_by_default(backend, connect):
+    backend.add_records(20)
+    service = connect()
+    subset = service.search(keyword="good", limit=100)
+
+    assert len(backend.routes(SEARCH)) == 1
+    assert len(subset.get_uuid_list()) == 10
+    assert len(backend.routes(SEARCH)) == 1
+
+
+def test_lazy_search_is_sent_on_first_use(backend, connect):
+    backend.add_records(20)
+    service = connect()
+    subset = service.search(keyword="good", limit=100, lazy=True)
+
+    assert backend.routes(SEARCH) == []
+    assert len(subset.get_uuid_list()) == 10
+
+
+def test_eager_results_are_combined_locally(backend, connect):
+    backend.add_records(20)
+    service = connect()
+    good = service.search(keyword="good", limit=100)
+    one = service.search(keyword="1", limit=100)
+
+    assert sorted((good & one).get_uuid_list()) == [
+        "r1",
+        "r11",
+        "r13",
+        "r15",
+        "r17",
+        "r19",
+    ]
+    assert backend.routes(COMPOUND) == []
+    assert len(backend.routes(SEARCH)) == 2
+
+
+def test_lazy_searches_are_sent_as_one_compound_query(backend, connect):
+    backend.add_records(20)
+    service = connect()
+    queries = answer_compound(backend, ["r1", "r3"])
+    good = service.search(keyword="good", limit=100, lazy=True)
+    one = service.search(keyword="1", limit=100, lazy=True)
+
+    assert (good - one).get_uuid_list() == ["r1", "r3"]
+    assert len(queries) == 1
+    assert all("search" in leaf for leaf in leaves(queries[0]))
+    assert backend.routes(SEARCH) == []
+
+
+def test_record_lists_are_not_sent_to_the_compound_query(backend, connect):
+    backend.add_records(20)
+    service = connect()
+    queries = answer_compound(backend, ["r1", "r11", "r13"])
+    good = service.search(keyword="good", limit=100, lazy=True)
+    one = service.search(keyword="1", limit=100, lazy=True)
+    known = Subset(service, ["r11", "r13", "r2"])
+
+    assert ((good & one) & known).get_uuid_list() == ["r11", "r13"]
+    assert len(queries) == 1
+    assert all("uuid_list" not in leaf for leaf in leaves(queries[0]))
+
+
+def test_without_compound_endpoint_searches_are_combined_locally(backend, connect):
+    backend.add_records(20)
+    service = connect()
+    good = service.search(keyword="good", limit=100, lazy=True)
+    one = service.search(keyword="1", limit=100, lazy=True)
+
+    assert sorted((good & one).get_uuid_list()) == [
+        "r1",
+        "r11",
+        "r13",
+        "r15",
+        "r17",
+        "r19",
+    ]
+    assert len(backend.routes(COMPOUND)) == 1
+    assert len(backend.routes(SEARCH)) == 2
@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+from labeler_client import llm_jobs
+from labeler_client.llm_jobs import RateLimiter
+
+
+class FakeClock:
+    """
+    Stands in for the `time` module of `llm_jobs`: `sleep` advances
+    `monotonic` instead of waiting.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_jobs, "time", fake)
+    return fake
+
+
+def test_requests_beyond_the_budget_wait_for_refill(clock):
+    limiter = RateLimiter(requests_per_minute=60)
+    for _ in range(60):
+        limiter.acquire()
+    assert clock.sleeps == []
+
+    limiter.acquire()
+    assert sum(clock.sleeps) == pytest.approx(1.0)
+
+
+def test_budget_refills_over_time(clock):
+    limiter = RateLimiter(requests_per_minute=60)
+    for _ in range(60):
+        limiter.acquire()
+    clock.now += 30
+    for _ in range(30):
+        limiter.acquire()
+    assert clock.sleeps == []
+
+
+def test_tokens_are_limited_separately(clock):
+    limiter = RateLimiter(requests_per_minute=1000, tokens_per_minute=600)
+    limiter.acquire(tokens=600)
+    assert clock.sleeps == []
+
+    limiter.acquire(tokens=300)
+    assert sum(clock.sleeps) == pytest.approx(30.0)
+
+
+def test_call_larger_than_the_bucket_takes_the_whole_bucket(clock):
+    limiter = RateLimiter(tokens_per_minute=600)
+    limiter.acquire(tokens=10_000)
+    assert clock.sleeps == []
+
+    limiter.acquire(tokens=60)
+    assert sum(clock.sleeps) == pytest.approx(6.0)
+
+
+def test_no_budget_never_waits(clock):
+    limiter = RateLimiter()
+    for _ in range(10_000):
+        limiter.acquire(tokens=10_000)
+    assert clock.sleeps == []
+
+
+def test_budget_is_shared_between_threads():
+    # real clock: 10 threads take the first 10 requests of a budget of 10
+    limiter = RateLimiter(requests_per_minute=10)
+    done = []
+    threads = [
+        threading.Thread(target=lambda: done.append(limiter.acquire()))
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len(done) == 10
+
+    # the 11th has to wait ~6s for a request to refill
+    late = threading.Thread(target=limiter.acquire, daemon=True)
+    late.start()
+    late.join(0.2)
+    assert late.is_alive()